@@ -0,0 +1,85 @@
+# benchmark_box_extraction.py
+"""
+เปรียบเทียบเวลาต่อเฟรมระหว่างการวน `for box in results[0].boxes` แบบเดิม
+กับ extract_zone_tracks (แปลง boxes.data เป็น NumPy ครั้งเดียว)
+
+    python benchmark_box_extraction.py --boxes 30 --device cuda
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+from ultralytics.engine.results import Boxes
+
+from camera_worker_process import extract_zone_tracks, map_vehicle_class
+from utils import build_zone_mask, get_bbox_center, is_point_in_any_polygon
+
+
+def legacy_loop(boxes, car_class_ids, zones):
+    tracks = []
+    if boxes is not None and boxes.id is not None:
+        for box in boxes:
+            if int(box.cls[0]) in car_class_ids:
+                x1, y1, x2, y2 = map(int, box.xyxy[0])
+                cx, cy = get_bbox_center([x1, y1, x2, y2])
+                if is_point_in_any_polygon((cx, cy), zones):
+                    tracks.append({
+                        'id': int(box.id[0]),
+                        'bbox': np.array([x1, y1, x2, y2]),
+                        'conf': float(box.conf[0]),
+                        'cls': map_vehicle_class(int(box.cls[0]))
+                    })
+    return tracks
+
+
+def make_boxes(n, width, height, device):
+    rng = np.random.default_rng(0)
+    x1 = rng.uniform(0, width - 200, n)
+    y1 = rng.uniform(0, height - 150, n)
+    data = np.column_stack((
+        x1, y1, x1 + rng.uniform(40, 200, n), y1 + rng.uniform(30, 150, n),
+        np.arange(1, n + 1), rng.uniform(0.1, 1.0, n), rng.choice([2, 5, 7], n)
+    )).astype(np.float32)
+    return Boxes(torch.from_numpy(data).to(device), (height, width))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-frame box extraction")
+    parser.add_argument("--boxes", type=int, default=30)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--device", type=str, default="cpu")
+    args = parser.parse_args()
+
+    zones = [
+        [[50, 50], [args.width // 2, 60], [args.width // 2, args.height - 60], [60, args.height - 50]],
+        [[args.width // 2 + 40, 80], [args.width - 60, 80], [args.width - 60, args.height - 80]],
+    ]
+    car_class_ids = [2, 5, 7]
+    zone_mask = build_zone_mask(zones, args.width, args.height)
+    boxes = make_boxes(args.boxes, args.width, args.height, args.device)
+
+    legacy = legacy_loop(boxes, car_class_ids, zones)
+    fast = extract_zone_tracks(boxes, car_class_ids, zone_mask)
+    print(f"Detections in zone: legacy={len(legacy)} vectorized={len(fast)}")
+
+    for name, fn in (
+        ("legacy per-box loop", lambda: legacy_loop(boxes, car_class_ids, zones)),
+        ("extract_zone_tracks", lambda: extract_zone_tracks(boxes, car_class_ids, zone_mask)),
+    ):
+        fn()
+        if args.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            fn()
+        if args.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        per_frame_ms = (time.perf_counter() - start) * 1000.0 / args.iterations
+        print(f"{name:<24} {per_frame_ms:8.3f} ms/frame ({args.boxes} boxes, device={args.device})")
+
+
+if __name__ == '__main__':
+    main()
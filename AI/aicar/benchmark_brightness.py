@@ -0,0 +1,99 @@
+# benchmark_brightness.py
+"""
+วัดเวลาต่อเฟรมของแต่ละวิธีปรับความสว่าง ที่ความกว้าง 1280 (ค่า target_inference_width ปัจจุบัน)
+
+    python benchmark_brightness.py                       # ใช้ภาพสังเคราะห์ (มืด / ปกติ / สว่าง)
+    python benchmark_brightness.py --video path/to.mp4   # ใช้เฟรมจริงจากวิดีโอ
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from brightness import BrightnessAdjuster
+from utils import adjust_brightness_clahe, adjust_brightness_histogram
+
+
+def synthetic_frames(width, height):
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 40, size=(height, width, 3), dtype=np.uint8)
+    gradient = np.tile(np.linspace(0, 60, width, dtype=np.uint8), (height, 1))[..., None]
+    base = cv2.add(noise, np.repeat(gradient, 3, axis=2))
+    return {
+        'dark': cv2.add(base, 10),
+        'normal': cv2.add(base, 90),
+        'bright': cv2.add(base, 180),
+    }
+
+
+def video_frames(path, width, max_frames=60):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        h, w = frame.shape[:2]
+        frames.append(cv2.resize(frame, (width, int(h * width / w))))
+    cap.release()
+    return {'video': frames[0]} if len(frames) == 1 else {f'video[{i}]': f for i, f in enumerate(frames[::max(1, len(frames) // 3)])}
+
+
+def legacy_clahe(frame, clipLimit=2.0, tileGridSize=(8, 8)):
+    # utils.adjust_brightness_clahe ก่อนแก้: สร้าง CLAHE ใหม่ทุกเฟรม
+    lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
+    l, a, b = cv2.split(lab)
+    clahe = cv2.createCLAHE(clipLimit=clipLimit, tileGridSize=tileGridSize)
+    return cv2.cvtColor(cv2.merge((clahe.apply(l), a, b)), cv2.COLOR_LAB2BGR)
+
+
+def time_per_frame(fn, frame, iterations):
+    fn(frame)  # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(frame)
+    return (time.perf_counter() - start) * 1000.0 / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark brightness adjustment methods")
+    parser.add_argument("--video", type=str, default=None)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    height = int(args.width * 9 / 16)
+    frames = video_frames(args.video, args.width) if args.video else synthetic_frames(args.width, height)
+
+    methods = {
+        'legacy clahe (new CLAHE/frame)': lambda f: legacy_clahe(f),
+        'utils clahe (cached CLAHE)': lambda f: adjust_brightness_clahe(f),
+        'legacy histogram a=1.0 b=0': lambda f: cv2.convertScaleAbs(f, alpha=1.0, beta=0),
+        'utils histogram a=1.0 b=0 (skip)': lambda f: adjust_brightness_histogram(f),
+        'convertScaleAbs a=1.3 b=20': lambda f: cv2.convertScaleAbs(f, alpha=1.3, beta=20),
+    }
+    adjusters = {
+        'adjuster clahe': BrightnessAdjuster('clahe'),
+        'adjuster histogram a=1.3 b=20': BrightnessAdjuster('histogram', alpha=1.3, beta=20),
+        'adjuster gamma': BrightnessAdjuster('gamma'),
+        'adjuster auto': BrightnessAdjuster('auto'),
+    }
+
+    print(f"Frame size: {args.width}x{height}, iterations: {args.iterations}")
+    print(f"{'method':<34}" + "".join(f"{name:>14}" for name in frames))
+    for name, fn in methods.items():
+        print(f"{name:<34}" + "".join(f"{time_per_frame(fn, f, args.iterations):>11.3f} ms" for f in frames.values()))
+    for name, adjuster in adjusters.items():
+        cells = []
+        for frame in frames.values():
+            adjuster._frames_since_eval = adjuster.reevaluate_every  # force re-selection per scene
+            ms = time_per_frame(adjuster.apply, frame, args.iterations)
+            cells.append(f"{ms:>7.3f} ms/{adjuster.active_method[:5]:<5}")
+        print(f"{name:<34}" + "".join(f"{c:>14}" for c in cells))
+    measure_ms = time_per_frame(BrightnessAdjuster('auto').measure, next(iter(frames.values())), args.iterations)
+    print(f"\nLuminance measurement (thumbnail histogram): {measure_ms:.3f} ms per evaluation")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+# brightness.py
+import math
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+
+class BrightnessAdjuster:
+    """
+    Per-camera brightness stage.
+
+    Keeps one CLAHE object for the lifetime of the worker and uses an 8-bit lookup table (cv2.LUT)
+    for gamma, so the per-frame cost is a single table lookup instead of float math.
+    The scene luminance is measured on a small thumbnail every `reevaluate_every` frames; while it is
+    already inside `target_range` (and contrast is sufficient) the frame is returned untouched.
+
+    method:
+        clahe:     local contrast on the L channel (BGR->LAB->BGR), for dark/uneven scenes.
+        histogram: alpha/beta scaling with cv2.convertScaleAbs (identity when alpha=1, beta=0 -> skipped).
+                   convertScaleAbs is already a single SIMD pass and beats cv2.LUT here.
+        gamma:     gamma LUT chosen from the measured mean so it lands near the middle of `target_range`.
+        auto:      picks clahe at night or when the scene is darker than `dark_threshold`,
+                   gamma when it is merely outside `target_range`, and nothing otherwise.
+    """
+
+    METHODS = ('clahe', 'histogram', 'gamma', 'auto')
+
+    def __init__(self, method='clahe', clip_limit=2.0, tile_grid_size=(8, 8), alpha=1.0, beta=0,
+                 target_range=(80, 170), min_contrast=40, dark_threshold=60, night_hours=None,
+                 reevaluate_every=30):
+        method = (method or 'clahe').lower()
+        if method not in self.METHODS:
+            raise ValueError(f"Unsupported brightness method: {method}")
+        self.method = method
+        self.alpha = float(alpha)
+        self.beta = float(beta)
+        self.target_low, self.target_high = target_range
+        self.min_contrast = min_contrast
+        self.dark_threshold = dark_threshold
+        self.night_hours = tuple(night_hours) if night_hours else None
+        self.reevaluate_every = max(1, int(reevaluate_every))
+
+        self._clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tuple(tile_grid_size))
+        self._lut_cache = {}
+        self._frames_since_eval = self.reevaluate_every
+        self._active_method = None
+        self._active_lut = None
+
+        self.last_mean = None
+        self.last_contrast = None
+
+    # --- measurement ---
+    def measure(self, frame):
+        """Returns (mean luminance, p95 - p5 spread) measured on a 160px-wide grayscale thumbnail."""
+        h, w = frame.shape[:2]
+        thumb_w = min(160, w)
+        thumb = cv2.resize(frame, (thumb_w, max(1, int(h * thumb_w / w))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY) if thumb.ndim == 3 else thumb
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+        cdf = np.cumsum(hist)
+        total = cdf[-1]
+        mean = float(np.dot(hist, np.arange(256)) / total)
+        p5 = int(np.searchsorted(cdf, total * 0.05))
+        p95 = int(np.searchsorted(cdf, total * 0.95))
+        return mean, p95 - p5
+
+    def _is_night(self):
+        if not self.night_hours:
+            return False
+        start, end = self.night_hours
+        hour = datetime.now().hour
+        return (start <= hour < end) if start <= end else (hour >= start or hour < end)
+
+    # --- LUTs ---
+    def _gamma_lut(self, mean):
+        target = (self.target_low + self.target_high) / 2.0
+        mean = min(max(mean, 1.0), 254.0)
+        gamma = math.log(target / 255.0) / math.log(mean / 255.0)
+        # quantize so the cache stays small and the LUT does not flicker frame to frame
+        gamma = round(min(max(gamma, 0.4), 2.5) * 20) / 20.0
+        if gamma == 1.0:
+            return None
+        key = ('gamma', gamma)
+        if key not in self._lut_cache:
+            self._lut_cache[key] = np.clip(np.rint(((np.arange(256) / 255.0) ** gamma) * 255.0), 0, 255).astype(np.uint8)
+        return self._lut_cache[key]
+
+    # --- selection ---
+    def _select(self, frame):
+        if self.method == 'histogram':
+            if self.alpha == 1.0 and self.beta == 0:
+                return None, None
+            return 'histogram', None
+
+        mean, contrast = self.measure(frame)
+        self.last_mean, self.last_contrast = mean, contrast
+        in_range = self.target_low <= mean <= self.target_high and contrast >= self.min_contrast
+
+        if self.method == 'clahe':
+            return ('clahe', None) if not in_range else (None, None)
+        if self.method == 'gamma':
+            lut = None if in_range else self._gamma_lut(mean)
+            return ('gamma', lut) if lut is not None else (None, None)
+
+        # auto
+        if self._is_night() or mean < self.dark_threshold:
+            return 'clahe', None
+        if not in_range:
+            lut = self._gamma_lut(mean)
+            if lut is not None:
+                return 'gamma', lut
+        return None, None
+
+    def _apply_clahe(self, frame):
+        if frame.ndim == 2:
+            return self._clahe.apply(frame)
+        lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
+        l, a, b = cv2.split(lab)
+        lab = cv2.merge((self._clahe.apply(l), a, b))
+        return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+    def apply(self, frame):
+        """Returns the adjusted frame (or the same object if no adjustment is needed)."""
+        if self._frames_since_eval >= self.reevaluate_every:
+            self._active_method, self._active_lut = self._select(frame)
+            self._frames_since_eval = 0
+        self._frames_since_eval += 1
+
+        if self._active_method is None:
+            return frame
+        if self._active_method == 'clahe':
+            return self._apply_clahe(frame)
+        if self._active_method == 'histogram':
+            return cv2.convertScaleAbs(frame, alpha=self.alpha, beta=self.beta)
+        return cv2.LUT(frame, self._active_lut)
+
+    @property
+    def active_method(self):
+        return self._active_method or 'none'
+
+
+def build_brightness_adjuster(config):
+    """Creates a BrightnessAdjuster from config.yaml, or None when brightness adjustment is disabled."""
+    if not config.get('enable_brightness_adjustment', False):
+        return None
+    settings = config.get('brightness_settings', {}) or {}
+    return BrightnessAdjuster(
+        method=config.get('brightness_method', 'clahe'),
+        clip_limit=settings.get('clahe_clip_limit', 2.0),
+        tile_grid_size=settings.get('clahe_tile_grid_size', [8, 8]),
+        alpha=settings.get('alpha', 1.0),
+        beta=settings.get('beta', 0),
+        target_range=(settings.get('target_min', 80), settings.get('target_max', 170)),
+        min_contrast=settings.get('min_contrast', 40),
+        dark_threshold=settings.get('dark_threshold', 60),
+        night_hours=settings.get('night_hours'),
+        reevaluate_every=settings.get('reevaluate_every_frames', 30)
+    )
@@ -6,6 +6,7 @@ import cv2
 import time
 import numpy as np
 import queue
+import socket
 import torch.serialization
 import torch.nn as nn
 import requests
@@ -32,9 +33,15 @@ from ultralytics.nn.modules.block import C2f, Bottleneck, SPPF, DFL
 from ultralytics.nn.modules.head import Detect, Segment, Pose
 
 # ### แก้ไข ###: Import ฟังก์ชันสำหรับหลายโซนจาก utils.py
-from utils import load_parking_zone, is_point_in_any_polygon, get_bbox_center, draw_parking_zones, write_mot_results
-from utils import adjust_brightness_clahe, adjust_brightness_histogram
+from utils import load_parking_zone, draw_parking_zones, build_zone_mask, points_in_mask
+from brightness import build_brightness_adjuster
 from car_tracker_manager import CarTrackerManager
+from mot_writer import MotResultWriter
+from video_recorder import VideoRecorder
+from latency import FrameTrace
+from frame_uplink import FrameUplink
+from config_watch import drain_control_queue
+from structured_log import WorkerLogging
 
 # Optional: Disable Ultralytics default plotting
 try:
@@ -44,6 +51,8 @@ except AttributeError:
 
 # --- ค่าคงที่และตัวแปร Global ---
 FASTAPI_BACKEND_URL = "http://127.0.0.1:8000/api/analytics/"
+# เมื่อไม่มีใครใช้ภาพ ยังวาด overlay ทุก N เฟรมเพื่อวัดต้นทุน (ใช้คำนวณ CPU ที่ประหยัดได้ใน telemetry)
+ANNOTATION_SAMPLE_EVERY = 500
 
 api_retry_queue = deque(maxlen=100)
 class_names = {
@@ -58,6 +67,41 @@ def map_vehicle_class(cls_id: int) -> int:
         return 2      # map เป็น car
     return cls_id
 
+# --- แปลงผล model.track ทั้งเฟรมเป็น NumPy array ครั้งเดียว (แทนการวนทีละ box) ---
+# คอลัมน์ของ array ที่ส่งต่อให้ CarTrackerManager / MotResultWriter
+TRACK_COLUMNS = ('x1', 'y1', 'x2', 'y2', 'id', 'conf', 'cls')
+
+def extract_zone_tracks(boxes, car_class_ids, zone_mask) -> np.ndarray:
+    """
+    Converts ultralytics `Boxes` from model.track into an (N, 7) float32 array laid out as TRACK_COLUMNS,
+    keeping only tracked boxes of `car_class_ids` whose center falls inside `zone_mask`.
+    Does one device->host copy of `boxes.data` instead of several tiny tensor reads per box.
+    Class ids are mapped with the same rule as map_vehicle_class (truck -> car).
+    """
+    if boxes is None or boxes.id is None or len(boxes) == 0:
+        return np.empty((0, len(TRACK_COLUMNS)), dtype=np.float32)
+
+    data = boxes.data
+    if hasattr(data, 'cpu'):
+        data = data.cpu().numpy()
+    data = np.asarray(data, dtype=np.float32)
+    # tracked boxes: x1, y1, x2, y2, id, conf, cls
+    xyxy = np.trunc(data[:, :4])
+    ids, confs, classes = data[:, 4], data[:, 5], data[:, 6].astype(np.int64)
+
+    keep = np.isin(classes, np.asarray(car_class_ids, dtype=np.int64))
+    centers_x = (xyxy[:, 0] + xyxy[:, 2]) / 2.0
+    centers_y = (xyxy[:, 1] + xyxy[:, 3]) / 2.0
+    keep &= points_in_mask(zone_mask, centers_x, centers_y)
+
+    mapped_classes = np.where(classes == 7, 2, classes)
+    tracks = np.empty((int(keep.sum()), len(TRACK_COLUMNS)), dtype=np.float32)
+    tracks[:, :4] = xyxy[keep]
+    tracks[:, 4] = ids[keep]
+    tracks[:, 5] = confs[keep]
+    tracks[:, 6] = mapped_classes[keep]
+    return tracks
+
 # --- ฟังก์ชันสำหรับส่งข้อมูลไปที่ API (เวอร์ชันปรับปรุง) ---
 async def send_data_to_api(camera_id: str, event_payload: dict, image_bytes: Optional[bytes], api_key: str):
     """ส่งข้อมูลแบบ multipart/form-data (JSON data + optional image file)"""
@@ -65,6 +109,9 @@ async def send_data_to_api(camera_id: str, event_payload: dict, image_bytes: Opt
     headers = {"X-API-Key": api_key} # ไม่ต้องมี Content-Type, httpx จะจัดการให้
     
     # 1. เตรียมส่วนข้อมูล JSON ที่จะส่ง
+    # ประทับเวลาส่งล่าสุด เพื่อให้ backend วัด latency ช่วง upload ได้ (รวมกรณี retry)
+    if isinstance(event_payload.get('trace'), dict):
+        event_payload['trace']['sent_ts'] = time.time()
     # แปลง dict เป็น JSON string แล้วใส่ใน form field ชื่อ 'data'
     data_to_send = {'data': json.dumps(event_payload, default=str)} # ใช้ default=str เผื่อมี datetime object
 
@@ -103,16 +150,16 @@ async def send_data_to_api(camera_id: str, event_payload: dict, image_bytes: Opt
 
     except (httpx.RequestError, httpx.TimeoutException) as e:
         current_logger.warning(f"[{camera_id}] Could not send data (multipart): {e}. Adding to retry queue.")
-        # การทำ Retry Queue กับ multipart จะซับซ้อนขึ้น อาจจะต้องเก็บ image_bytes ไว้ด้วย
-        # api_retry_queue.append({'payload': event_payload, 'image_bytes': image_bytes, 'api_key': api_key})
+        # caller เป็นคนใส่ลง api_retry_queue เอง (ต้องเก็บ car_id ไว้จับคู่ db_record_id ตอนส่งซ้ำแบบ batch)
         return False, None
     except Exception as e:
         current_logger.exception(f"[{camera_id}] Unexpected error in send_data_to_api (multipart): {e}")
         return False, None
     
-async def send_frame_to_api(camera_id: str, frame: np.ndarray, session: httpx.AsyncClient):
+async def send_frame_to_api(camera_id: str, frame: np.ndarray, session: httpx.AsyncClient, trace: Optional[FrameTrace] = None):
     """
     ส่งเฟรมภาพ (JPEG) ไปยัง FastAPI server ผ่าน HTTP POST
+    ถ้ามี trace จะแนบเวลา capture และเวลาของแต่ละช่วงไปใน header (X-Capture-Ts / X-Trace-Hops)
     """
     try:
         # 1. แปลงเฟรมภาพเป็น JPEG
@@ -126,6 +173,10 @@ async def send_frame_to_api(camera_id: str, frame: np.ndarray, session: httpx.As
         # 2. กำหนด URL และ Headers
         api_url = f"http://127.0.0.1:8000/api/frames/{camera_id}"
         headers = {'Content-Type': 'image/jpeg'}
+        if trace is not None:
+            trace.mark('encode')
+            headers['X-Capture-Ts'] = f"{trace.capture_wall:.6f}"
+            headers['X-Trace-Hops'] = json.dumps(trace.hops_ms, separators=(',', ':'))
 
         # 3. ส่งข้อมูล
         response = await session.post(api_url, content=jpeg_bytes, headers=headers, timeout=1.0)
@@ -165,8 +216,228 @@ async def send_update_to_api(record_id: int, update_payload: dict, api_key: str)
         current_logger.exception(f"Unexpected error in send_update_to_api (PATCH) for record {record_id}: {e}")
         return False    
 
+# --- ส่งข้อมูลที่ค้างใน retry queue แบบ batch ---
+async def send_batch_to_api(camera_id: str, payloads: list, images: list, api_key: str) -> Optional[list]:
+    """
+    POST /api/analytics/batch ครั้งเดียวสำหรับหลาย event
+    ถ้ามีรูปจะส่งเป็น multipart (field 'events' เป็น JSON lines + ไฟล์ 'images' ที่อ้างด้วย image_ref)
+    ไม่มีรูปจะส่งเป็น application/x-ndjson
+    คืน list ของ record id ตามลำดับ payloads หรือ None ถ้าส่งไม่สำเร็จ
+    """
+    current_logger = logging.getLogger(f"camera_worker_process.{camera_id}")
+    lines, files = [], []
+    for i, (payload, image_bytes) in enumerate(zip(payloads, images)):
+        if isinstance(payload.get('trace'), dict):
+            payload['trace']['sent_ts'] = time.time()
+        if image_bytes:
+            image_name = f"event_{i}.jpg"
+            payload = {**payload, 'image_ref': image_name}
+            files.append(('images', (image_name, image_bytes, 'image/jpeg')))
+        lines.append(json.dumps(payload, default=str))
+    events_text = "\n".join(lines)
+
+    headers = {"X-API-Key": api_key}
+    try:
+        async with httpx.AsyncClient(follow_redirects=True) as client:
+            if files:
+                response = await client.post(f"{FASTAPI_BACKEND_URL}batch", data={'events': events_text}, files=files, headers=headers, timeout=60)
+            else:
+                headers["Content-Type"] = "application/x-ndjson"
+                response = await client.post(f"{FASTAPI_BACKEND_URL}batch", content=events_text.encode('utf-8'), headers=headers, timeout=60)
+        if response.status_code >= 400:
+            current_logger.error(f"[{camera_id}] Batch ingest returned {response.status_code}: {response.text}")
+            return None
+        ids = response.json().get('ids', [])
+        current_logger.info(f"[{camera_id}] Successfully sent {len(ids)} queued events (batch).")
+        return ids
+    except (httpx.RequestError, httpx.TimeoutException) as e:
+        current_logger.warning(f"[{camera_id}] Could not send batch of {len(payloads)} events: {e}")
+        return None
+    except Exception as e:
+        current_logger.exception(f"[{camera_id}] Unexpected error in send_batch_to_api: {e}")
+        return None
+
+async def send_bulk_update_to_api(camera_id: str, updates: list, api_key: str) -> bool:
+    """PATCH /api/analytics/batch สำหรับหลาย record (updates: [{'record_id', 'exit_time', 'duration_minutes'}])"""
+    current_logger = logging.getLogger(f"camera_worker_process.{camera_id}")
+    headers = {"X-API-Key": api_key, "Content-Type": "application/json"}
+    try:
+        async with httpx.AsyncClient() as client:
+            response = await client.patch(f"{FASTAPI_BACKEND_URL}batch", json=updates, headers=headers, timeout=30)
+        if response.status_code >= 400:
+            current_logger.error(f"[{camera_id}] Bulk update returned {response.status_code}: {response.text}")
+            return False
+        result = response.json()
+        if result.get('not_found'):
+            current_logger.warning(f"[{camera_id}] Bulk update: records not found {result['not_found']} (dropped).")
+        current_logger.info(f"[{camera_id}] Successfully updated {len(result.get('updated', []))} records (bulk PATCH).")
+        return True
+    except (httpx.RequestError, httpx.TimeoutException) as e:
+        current_logger.warning(f"[{camera_id}] Could not send bulk update of {len(updates)} records: {e}")
+        return False
+    except Exception as e:
+        current_logger.exception(f"[{camera_id}] Unexpected error in send_bulk_update_to_api: {e}")
+        return False
+
+def start_post_queued(car_id) -> bool:
+    """POST ของ violation ของรถคันนี้ยังค้างอยู่ใน api_retry_queue (ยังไม่รู้ db_record_id)"""
+    return car_id is not None and any(
+        item.get('type', 'post') == 'post' and item.get('car_id') == car_id for item in api_retry_queue
+    )
+
+def queue_exit_for_car(car_id, update_payload: dict, api_key: str):
+    """
+    รถออกก่อนที่ POST ของ violation จะส่งสำเร็จ: เก็บ PATCH exit time ไว้ในคิวโดยอ้างด้วย car_id
+    flush_retry_queue จะเติม record_id ให้เมื่อ POST นั้นได้ id กลับมา (record จะไม่ค้างเป็น ongoing)
+    """
+    api_retry_queue.append({'type': 'patch', 'record_id': None, 'car_id': car_id, 'payload': update_payload, 'api_key': api_key})
+
+async def flush_retry_queue(camera_id: str, car_tracker_manager, api_key: str, max_items: int = 50):
+    """
+    ส่งรายการใน api_retry_queue สูงสุด max_items รายการ: POST รวมเป็น batch เดียว, PATCH รวมเป็น bulk update เดียว
+    id ที่ได้คืนจะถูกผูกกับ car_id (สำหรับ violation ที่ยังจอดอยู่) เพื่อใช้ PATCH ตอนรถออก
+    และเติมให้ PATCH exit time ที่รอ id ของรถคันเดียวกันอยู่ในคิว
+    รายการที่ส่งไม่สำเร็จจะถูกใส่กลับหัวคิวตามลำดับเดิม (เท่าที่คิวยังมีที่ว่าง)
+    """
+    current_logger = logging.getLogger(f"camera_worker_process.{camera_id}")
+    items = [api_retry_queue.popleft() for _ in range(min(max_items, len(api_retry_queue)))]
+    posts = [item for item in items if item.get('type', 'post') == 'post']
+    patches = [item for item in items if item.get('type') == 'patch']
+    failed = []
+
+    if posts:
+        ids = await send_batch_to_api(
+            camera_id, [item['payload'] for item in posts], [item.get('image_bytes') for item in posts],
+            posts[0].get('api_key', api_key)
+        )
+        if ids is None or len(ids) != len(posts):
+            failed.extend(posts)
+        else:
+            resolved = {}
+            for item, record_id in zip(posts, ids):
+                if item.get('car_id') is not None:
+                    car_tracker_manager.set_db_record_id(item['car_id'], record_id)
+                    resolved[item['car_id']] = record_id
+            for item in [*patches, *api_retry_queue]:
+                if item.get('type') == 'patch' and item.get('record_id') is None and item.get('car_id') in resolved:
+                    item['record_id'] = resolved[item['car_id']]
+
+    if patches:
+        ready = [item for item in patches if item.get('record_id') is not None]
+        for item in patches:
+            if item.get('record_id') is not None:
+                continue
+            if any(post.get('car_id') == item.get('car_id') for post in failed) or start_post_queued(item.get('car_id')):
+                failed.append(item)   # POST ของรถคันนี้ยังไม่ได้ id: รอรอบถัดไป
+            else:
+                current_logger.warning(f"[{camera_id}] Dropping exit update for car {item.get('car_id')}: its violation record was never created.")
+        if ready:
+            updates = [{'record_id': item['record_id'], **item['payload']} for item in ready]
+            if not await send_bulk_update_to_api(camera_id, updates, ready[0].get('api_key', api_key)):
+                failed.extend(ready)
+
+    # deque(maxlen) ที่เต็มจะตัดรายการฝั่งขวา (event ใหม่สุด) ทิ้งเมื่อ extendleft: ใส่กลับเท่าที่มีที่ว่าง
+    # โดยเก็บรายการที่ใหม่กว่าไว้ก่อน
+    failed.sort(key=items.index)
+    space = api_retry_queue.maxlen - len(api_retry_queue)
+    if len(failed) > space:
+        dropped = len(failed) - space
+        current_logger.warning(f"[{camera_id}] Retry queue full: dropping {dropped} oldest unsent items.")
+        failed = failed[dropped:]
+    api_retry_queue.extendleft(reversed(failed))
+
+
+def draw_annotations(resized_frame, car_tracker_manager, scaled_parking_zones, frame_idx, cam_name, draw_bounding_box,
+                     current_parked_cars_count, total_parking_sessions_display):
+    """วาดโซน, กรอบ/สถานะรถ และตัวนับลงบน resized_frame (in-place) สำหรับ dashboard / จอแสดงผล / วิดีโอ"""
+    draw_parking_zones(resized_frame, scaled_parking_zones)
+    for track_id, car_info in car_tracker_manager.tracked_cars.items():
+        if 'current_bbox' in car_info and car_info['current_bbox'] is not None:
+            x1, y1, x2, y2 = map(int, car_info['current_bbox'])
+            status_info = car_tracker_manager.get_car_status(track_id, frame_idx)
+            status = status_info['status']
+            time_parked_str = status_info['time_parked_str']
+            text_color, background_color, draw_box_color = (255, 255, 255), (0, 128, 0), (0, 255, 0)
+            if status == 'PARKED': background_color, draw_box_color = (0, 128, 0), (0, 255, 0)
+            elif status == 'VIOLATION': background_color, draw_box_color = (0, 0, 200), (0, 0, 255)
+            elif status == 'OUT_OF_ZONE': background_color, draw_box_color = (128, 0, 0), (255, 0, 0)
+            elif status == 'MOVING_IN_ZONE': background_color, draw_box_color = (150, 150, 0), (255, 255, 0)
+            else: background_color, draw_box_color = (50, 50, 50), (128, 128, 128)
+            # สร้าง Dictionary สำหรับแปลง Class ID เป็นชื่อ
+            class_names = {
+                2: 'car',
+                7: 'truck',
+            }
+
+            # ดึง class ID จากข้อมูล track
+            cls = car_info['cls']
+
+            # แปลง class ID เป็นชื่อคลาส ถ้ามีใน dictionary
+            class_label = class_names.get(cls, 'unknown')
+
+            full_label_text = f"ID:{track_id} {class_label} {status}"
+            if time_parked_str: full_label_text += f" ({time_parked_str})"
+            font, font_scale, font_thickness = cv2.FONT_HERSHEY_SIMPLEX, 0.3, 1
+            (text_width, text_height), baseline = cv2.getTextSize(full_label_text, font, font_scale, font_thickness)
+
+            padding_x = 2
+            padding_y = 1
+            margin_from_bbox = 4
+
+            rect_x1 = x1
+            rect_x2 = rect_x1 + text_width + padding_x * 2
+
+            frame_width = resized_frame.shape[1]
+            if rect_x2 > frame_width:
+                rect_x2 = x2 
+                rect_x1 = rect_x2 - text_width - padding_x * 2
+
+            rect_y1 = y2 + margin_from_bbox
+            rect_y2 = rect_y1 + text_height + padding_y * 2 + baseline
+
+            if rect_y2 > resized_frame.shape[0]:
+                rect_y2 = y1 - margin_from_bbox
+                rect_y1 = rect_y2 - (text_height + padding_y * 2 + baseline)
+
+            if draw_bounding_box:
+                cv2.rectangle(resized_frame, (x1, y1), (x2, y2), draw_box_color, 2)
+
+            if rect_x2 > rect_x1 and rect_y2 > rect_y1:
+                cv2.rectangle(resized_frame, (rect_x1, rect_y1), (rect_x2, rect_y2), background_color, -1)
+                cv2.putText(resized_frame, full_label_text, (rect_x1 + padding_x, rect_y1 + text_height + padding_y), font, font_scale, text_color, font_thickness, cv2.LINE_AA)
+
+    frame_height, frame_width = resized_frame.shape[:2]
+    font, small_font_scale, small_font_thickness = cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1
+    text_total_sessions = f"Total Parking Sessions: {total_parking_sessions_display}"
+    (w_total, h_total), _ = cv2.getTextSize(text_total_sessions, font, small_font_scale, small_font_thickness)
+    pos_total_y = frame_height - 10
+    pos_total_x = frame_width - w_total - 10
+    cv2.putText(resized_frame, text_total_sessions, (pos_total_x, pos_total_y), font, small_font_scale, (255, 255, 255), small_font_thickness)
+    text_current_parked = f"Current Parked: {current_parked_cars_count}"
+    (w_parked, _), _ = cv2.getTextSize(text_current_parked, font, small_font_scale, small_font_thickness)
+    pos_parked_y = pos_total_y - h_total - 5
+    pos_parked_x = frame_width - w_parked - 10
+    cv2.putText(resized_frame, text_current_parked, (pos_parked_x, pos_parked_y), font, small_font_scale, (255, 255, 255), small_font_thickness)
+    text_cam_name = f"{cam_name}"
+    (w_cam, h_cam), _ = cv2.getTextSize(text_cam_name, font, small_font_scale, small_font_thickness)
+    pos_cam_y = pos_parked_y - h_cam - 5
+    pos_cam_x = frame_width - w_cam - 10
+    cv2.putText(resized_frame, text_cam_name, (pos_cam_x, pos_cam_y), font, small_font_scale, (255, 255, 0), small_font_thickness)
+
+def scale_parking_zones(parking_zones, scale_x, scale_y):
+    """พิกัด ROI (ภาพต้นฉบับ) -> พิกัดภาพที่ใช้ infer"""
+    return [[[int(p[0] * scale_x), int(p[1] * scale_y)] for p in polygon] for polygon in parking_zones]
+
+def tracker_settings(cam_cfg, config):
+    """(parking_time_limit_minutes, movement_threshold_px, movement_frame_window): ค่าของกล้องก่อน แล้วค่ากลาง"""
+    return (
+        cam_cfg.get('parking_time_limit_minutes', config.get('parking_time_limit_minutes', 15)),
+        cam_cfg.get('movement_threshold_px', config.get('movement_threshold_px', 5)),
+        cam_cfg.get('movement_frame_window', config.get('movement_frame_window', 30)),
+    )
+
 # --- ฟังก์ชัน Worker หลัก (เวอร์ชันปรับปรุง) ---
-async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_display_flag):
+async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_display_flag, control_queue=None):
     # --- ส่วนตั้งค่าเริ่มต้น ---
     cam_name = cam_cfg['name']
     source_path = str(cam_cfg['source_path'])
@@ -174,6 +445,8 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
     branch = cam_cfg.get('branch', 'unknown_branch_name')
     branch_id = cam_cfg.get('branch_id', 'unknown_branch')
     camera_id = cam_cfg.get('camera_id', cam_name)
+    # log ของ process นี้: stdout (backend ส่งต่อไปยัง log console) + ไฟล์ JSON lines แบบหมุนไฟล์ ผ่าน queue (ไม่ block ลูปเฟรม)
+    worker_logging = WorkerLogging(camera_id, config.get('logging'))
     logger = logging.getLogger(f"camera_worker_process.{camera_id}")
     logger.info(f"[{cam_name}] Worker started.")
     api_key = config.get('api_key', 'default_key_if_not_in_config')
@@ -218,44 +491,106 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
     scale_x = target_inference_width / original_video_width if original_video_width > 0 else 1
     scale_y = target_inference_height / original_video_height if original_video_height > 0 else 1
     
-    scaled_parking_zones = []
-    for polygon in parking_zones_original:
-        scaled_polygon = [[int(p[0] * scale_x), int(p[1] * scale_y)] for p in polygon]
-        scaled_parking_zones.append(scaled_polygon)
+    scaled_parking_zones = scale_parking_zones(parking_zones_original, scale_x, scale_y)
+    zone_mask = build_zone_mask(scaled_parking_zones, target_inference_width, target_inference_height)
     
     fps = cap.get(cv2.CAP_PROP_FPS)
     if fps <= 0: fps = 30.0
 
-    parking_time_limit_minutes = cam_cfg.get('parking_time_limit_minutes', config.get('parking_time_limit_minutes', 15))
     # warning_time_limit_minutes = cam_cfg.get('warning_time_limit_minutes', config.get('warning_time_limit_minutes'))
     # if warning_time_limit_minutes is None:
     #     warning_time_limit_minutes = parking_time_limit_minutes - 2 if isinstance(parking_time_limit_minutes, int) and parking_time_limit_minutes > 2 else 13
 
+    parking_time_limit_minutes, movement_threshold_px, movement_frame_window = tracker_settings(cam_cfg, config)
     car_tracker_manager = CarTrackerManager(
         scaled_parking_zones,
         parking_time_limit_minutes,
-        cam_cfg.get('movement_threshold_px', config.get('movement_threshold_px', 5)),
-        cam_cfg.get('movement_frame_window', config.get('movement_frame_window', 30)),
+        movement_threshold_px,
+        movement_frame_window,
         # warning_time_limit_minutes,
         fps,
         config
     )
     
-    video_writer = None
+    video_recorder = None
     if config.get('save_video', False):
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        output_video_path = cam_save_dir / f"output_{Path(source_path).stem}.mp4"
-        video_writer = cv2.VideoWriter(str(output_video_path), fourcc, fps, (target_inference_width, target_inference_height))
+        recording_settings = config.get('video_recording', {}) or {}
+        video_recorder = VideoRecorder(
+            cam_save_dir / "videos",
+            f"output_{Path(source_path).stem}" if not source_path.startswith(('rtsp://', 'http://', 'https://')) else f"output_{cam_name}",
+            fps,
+            (target_inference_width, target_inference_height),
+            mode=recording_settings.get('mode', 'continuous'),
+            queue_size=recording_settings.get('queue_size', 64),
+            queue_policy=recording_settings.get('queue_policy', 'drop'),
+            segment_minutes=recording_settings.get('segment_minutes', 10),
+            pre_roll_seconds=recording_settings.get('pre_roll_seconds', 10),
+            post_roll_seconds=recording_settings.get('post_roll_seconds', 20)
+        )
     
-    mot_save_path = cam_save_dir / "mot_results" / "mot.txt" if config.get('save_mot_results', False) else None
-    if mot_save_path:
-        mot_save_path.parent.mkdir(parents=True, exist_ok=True)
+    brightness_adjuster = build_brightness_adjuster(config)
+
+    mot_writer = None
+    if config.get('save_mot_results', False):
+        mot_settings = config.get('mot_settings', {}) or {}
+        mot_writer = MotResultWriter(
+            cam_save_dir / "mot_results" / "mot.txt",
+            flush_max_lines=mot_settings.get('flush_max_lines', 500),
+            flush_interval_s=mot_settings.get('flush_interval_seconds', 2.0),
+            rotate_max_bytes=int(mot_settings.get('rotate_max_mb', 0) * 1024 * 1024),
+            rotate_hourly=mot_settings.get('rotate_hourly', False),
+            save_npy=mot_settings.get('save_npy', False)
+        )
         
+    # เฟรมสำหรับ dashboard: ส่งผ่าน WebSocket ถาวรตาม demand ของผู้ชม (ปิดได้ -> กลับไปใช้ POST ทีละเฟรม)
+    uplink_settings = config.get('frame_uplink', {}) or {}
+    frame_uplink = None
+    if uplink_settings.get('enabled', True):
+        frame_uplink = FrameUplink(
+            uplink_settings.get('url', 'ws://127.0.0.1:8000/api/ws/ingest'),
+            camera_id,
+            api_key,
+            jpeg_quality=uplink_settings.get('jpeg_quality', 80),
+            reconnect_seconds=uplink_settings.get('reconnect_seconds', 2.0),
+            thumbnail_fps=uplink_settings.get('thumbnail_fps', 1.0),
+            thumbnail_width=uplink_settings.get('thumbnail_width', 320),
+            thumbnail_quality=uplink_settings.get('thumbnail_quality', 60)
+        )
+    telemetry_interval_s = uplink_settings.get('telemetry_interval_seconds', 5.0)
+    next_telemetry_at = time.monotonic() + telemetry_interval_s
+    worker_fps = None
+    annotate_ms_avg = None
+
     frame_idx = 0
     start_time = time.time()
     async with httpx.AsyncClient() as session:
         # --- ลูปหลักในการประมวลผล ---
         while True:
+            # config.yaml / ไฟล์ ROI เปลี่ยน: main_monitor ส่งค่าใหม่มาให้ใช้ต่อทันที (ไม่ต้องโหลดโมเดลใหม่ รถที่ track อยู่ไม่หาย)
+            if control_queue is not None:
+                stop_requested, update = drain_control_queue(control_queue)
+                if stop_requested:
+                    logger.info(f"[{cam_name}] Stop requested by monitor.")
+                    break
+                if update is not None:
+                    cam_cfg, config = update
+                    new_zones = load_parking_zone(Path(cam_cfg['parking_zone_file']))
+                    if new_zones:
+                        scaled_parking_zones = scale_parking_zones(new_zones, scale_x, scale_y)
+                        zone_mask = build_zone_mask(scaled_parking_zones, target_inference_width, target_inference_height)
+                    else:
+                        logger.error(f"[{cam_name}] ROI file '{cam_cfg['parking_zone_file']}' not found or invalid. Keeping current zones.")
+                    car_tracker_manager.configure(scaled_parking_zones, *tracker_settings(cam_cfg, config), config)
+                    cam_name = cam_cfg['name']
+                    branch = cam_cfg.get('branch', 'unknown_branch_name')
+                    branch_id = cam_cfg.get('branch_id', 'unknown_branch')
+                    api_key = config.get('api_key', 'default_key_if_not_in_config')
+                    frames_to_skip = config.get('performance_settings', {}).get('frames_to_skip', 1)
+                    draw_bounding_box = config.get('performance_settings', {}).get('draw_bounding_box', True)
+                    brightness_adjuster = build_brightness_adjuster(config)
+                    worker_logging.apply(config.get('logging'))
+                    logger.info(f"[{cam_name}] Configuration reloaded ({len(scaled_parking_zones)} zones).")
+
             ret, frame = cap.read()
             
             # ### แก้ไข ###: ตรรกะการจัดการเมื่อวิดีโอจบ หรือกล้องหลุด
@@ -273,6 +608,11 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
                     continue
 
             frame_idx += 1
+            # หน้าแก้ไข ROI ขอภาพดิบขนาดเต็มผ่าน backend: ตอบด้วยเฟรมที่เพิ่งอ่านได้ (ยังไม่ย่อ / ไม่มี overlay)
+            if frame_uplink is not None and frame_uplink.snapshot_requested:
+                frame_uplink.offer_snapshot(frame)
+            # ประทับเวลา capture (monotonic + wall clock) ให้เฟรมนี้ เพื่อวัด latency ตลอดเส้นทาง
+            trace = FrameTrace(frame_idx)
             
             if frames_to_skip > 1 and (frame_idx % frames_to_skip != 0):
                 if show_display_flag and frame is not None:
@@ -284,39 +624,32 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
 
             resized_frame = cv2.resize(frame, (target_inference_width, target_inference_height))
             
-            if config.get('enable_brightness_adjustment', False):
-                if config.get('brightness_method', 'clahe').lower() == 'clahe':
-                    resized_frame = adjust_brightness_clahe(resized_frame)
-                elif config.get('brightness_method', 'clahe').lower() == 'histogram':
-                    resized_frame = adjust_brightness_histogram(resized_frame)
+            if brightness_adjuster:
+                resized_frame = brightness_adjuster.apply(resized_frame)
 
             results = model.track(resized_frame, persist=True, show=False, conf=config['detection_confidence_threshold'], classes=config['car_class_id'], tracker=config.get('tracker_config_file_default', "bytetrack.yaml"), verbose=False,
                                 agnostic_nms=config.get('agnostic_nms', False),
                                 max_det=config.get('max_det', 300),
                                 augment=config.get('augment', False))
+            trace.mark('inference')
 
-            current_frame_tracks_for_manager = []
-            if results and results[0].boxes is not None and results[0].boxes.id is not None:
-                for box in results[0].boxes:
-                    if int(box.cls[0]) in config['car_class_id']:
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        bbox_center_x, bbox_center_y = get_bbox_center([x1, y1, x2, y2])
-                        
-                        if is_point_in_any_polygon((bbox_center_x, bbox_center_y), scaled_parking_zones):
-                            current_frame_tracks_for_manager.append({
-                                'id': int(box.id[0]),
-                                'bbox': np.array([x1, y1, x2, y2]),
-                                'conf': float(box.conf[0]),
-                                'cls': map_vehicle_class(int(box.cls[0]))  
-                            })
+            # (N, 7) array ตาม TRACK_COLUMNS: กรอง class, แมป truck->car และเช็คโซนแบบ vectorized
+            current_frame_tracks_for_manager = extract_zone_tracks(
+                results[0].boxes if results else None, config['car_class_id'], zone_mask
+            )
 
             # <<< แก้ไข: เพิ่ม original_frame=frame เพื่อส่งเฟรมต้นฉบับเข้าไปด้วย
             alerts = car_tracker_manager.update(current_frame_tracks_for_manager, frame_idx, resized_frame, original_frame=frame)
+            trace.mark('tracking')
             
             for alert_msg in alerts:
                 logger.info(f"ALERT [{cam_name}]: {alert_msg}")
+            if alerts and video_recorder:
+                video_recorder.trigger('violation')
 
             parking_data_to_send = car_tracker_manager.get_parking_events_for_api()
+            if parking_data_to_send:
+                trace.mark('event')
             for event in parking_data_to_send:
                 # แยก image_bytes ออกมาจาก payload หลัก
                 image_bytes_to_send = event.pop('image_bytes', None)
@@ -342,7 +675,15 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
                 event.setdefault('total_parking_sessions', total_parking_sessions)
 
                 # --- ตรรกะแยก POST กับ PATCH ---
-                if event_type == 'parking_violation_started' or event_type == 'parking_session_completed':
+                if event_type in ('parking_session_completed', 'parking_violation_ended') and event.get('db_record_id') is None \
+                        and start_post_queued(event.get('car_id')):
+                    # POST ของ violation ยังค้างในคิว (tracker จึงไม่รู้ db_record_id): ปิด record เดิมเมื่อได้ id แทนการสร้างซ้ำ
+                    queue_exit_for_car(event['car_id'], {
+                        "exit_time": event['exit_time'],
+                        "duration_minutes": event['duration_minutes']
+                    }, api_key)
+
+                elif event_type == 'parking_violation_started' or event_type == 'parking_session_completed':
                     # Event สำหรับ "สร้าง" record ใหม่
                     payload_to_send = {
                         "parking_violation": {
@@ -351,7 +692,8 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
                             "branch_id": branch_id,
                             "camera_id": camera_id,
                             **event
-                        }
+                        },
+                        "trace": trace.to_payload()
                     }
 
                     # Debug: log keys (ระวังอย่า print image bytes)
@@ -362,6 +704,12 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
                         pass
 
                     success, response_data = await send_data_to_api(camera_id, payload_to_send, image_bytes_to_send, api_key)
+                    if not success and response_data is None:
+                        # ส่งไม่ถึง backend: เก็บไว้ส่งซ้ำแบบ batch (car_id ใช้ผูก db_record_id ที่ได้คืนมา)
+                        api_retry_queue.append({
+                            'type': 'post', 'payload': payload_to_send, 'image_bytes': image_bytes_to_send, 'api_key': api_key,
+                            'car_id': event.get('car_id') if event_type == 'parking_violation_started' else None
+                        })
                     
                     # ถ้าเป็นการเริ่ม violation และส่งสำเร็จ ให้เก็บ DB ID กลับไป
                     if success and response_data and isinstance(response_data, dict) and response_data.get('id') and event_type == 'parking_violation_started':
@@ -380,98 +728,52 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
                         await send_update_to_api(record_id, update_payload, api_key)
 
             if frame_idx % 150 == 0 and api_retry_queue:
-                logger.info(f"[{cam_name}] Found {len(api_retry_queue)} items in retry queue. Resending one.")
-                item_to_retry = api_retry_queue.popleft()
-                # item_to_retry structure may differ; be defensive
+                logger.info(f"[{cam_name}] Found {len(api_retry_queue)} items in retry queue. Resending as batch.")
                 try:
-                    payload = item_to_retry.get('payload') or item_to_retry.get('data') or item_to_retry.get('event_payload')
-                    image = item_to_retry.get('image_bytes', None)
-                    api_key_retry = item_to_retry.get('api_key', api_key)
-                    success, _ = await send_data_to_api(camera_id, payload, image, api_key_retry)
-                    if not success:
-                        api_retry_queue.appendleft(item_to_retry)
+                    await flush_retry_queue(camera_id, car_tracker_manager, api_key)
                 except Exception as e:
-                    logger.exception(f"[{cam_name}] Error while retrying queued item: {e}")
-
-            if mot_save_path:
-                write_mot_results(mot_save_path, frame_idx, current_frame_tracks_for_manager)
-
-            draw_parking_zones(resized_frame, scaled_parking_zones)
-            for track_id, car_info in car_tracker_manager.tracked_cars.items():
-                if 'current_bbox' in car_info and car_info['current_bbox'] is not None:
-                    x1, y1, x2, y2 = map(int, car_info['current_bbox'])
-                    status_info = car_tracker_manager.get_car_status(track_id, frame_idx)
-                    status = status_info['status']
-                    time_parked_str = status_info['time_parked_str']
-                    text_color, background_color, draw_box_color = (255, 255, 255), (0, 128, 0), (0, 255, 0)
-                    if status == 'PARKED': background_color, draw_box_color = (0, 128, 0), (0, 255, 0)
-                    elif status == 'VIOLATION': background_color, draw_box_color = (0, 0, 200), (0, 0, 255)
-                    elif status == 'OUT_OF_ZONE': background_color, draw_box_color = (128, 0, 0), (255, 0, 0)
-                    elif status == 'MOVING_IN_ZONE': background_color, draw_box_color = (150, 150, 0), (255, 255, 0)
-                    else: background_color, draw_box_color = (50, 50, 50), (128, 128, 128)
-                    # สร้าง Dictionary สำหรับแปลง Class ID เป็นชื่อ
-                    class_names = {
-                        2: 'car',
-                        7: 'truck',
-                    }
+                    logger.exception(f"[{cam_name}] Error while retrying queued items: {e}")
 
-                    # ดึง class ID จากข้อมูล track
-                    cls = car_info['cls']
+            if mot_writer:
+                mot_writer.write(frame_idx, current_frame_tracks_for_manager)
 
-                    # แปลง class ID เป็นชื่อคลาส ถ้ามีใน dictionary
-                    class_label = class_names.get(cls, 'unknown')
-
-                    full_label_text = f"ID:{track_id} {class_label} {status}"
-                    if time_parked_str: full_label_text += f" ({time_parked_str})"
-                    font, font_scale, font_thickness = cv2.FONT_HERSHEY_SIMPLEX, 0.3, 1
-                    (text_width, text_height), baseline = cv2.getTextSize(full_label_text, font, font_scale, font_thickness)
-                    
-                    padding_x = 2
-                    padding_y = 1
-                    margin_from_bbox = 4
-                    
-                    rect_x1 = x1
-                    rect_x2 = rect_x1 + text_width + padding_x * 2
-
-                    frame_width = resized_frame.shape[1]
-                    if rect_x2 > frame_width:
-                        rect_x2 = x2 
-                        rect_x1 = rect_x2 - text_width - padding_x * 2
-
-                    rect_y1 = y2 + margin_from_bbox
-                    rect_y2 = rect_y1 + text_height + padding_y * 2 + baseline
-                    
-                    if rect_y2 > resized_frame.shape[0]:
-                        rect_y2 = y1 - margin_from_bbox
-                        rect_y1 = rect_y2 - (text_height + padding_y * 2 + baseline)
-
-                    if draw_bounding_box:
-                        cv2.rectangle(resized_frame, (x1, y1), (x2, y2), draw_box_color, 2)
-
-                    if rect_x2 > rect_x1 and rect_y2 > rect_y1:
-                        cv2.rectangle(resized_frame, (rect_x1, rect_y1), (rect_x2, rect_y2), background_color, -1)
-                        cv2.putText(resized_frame, full_label_text, (rect_x1 + padding_x, rect_y1 + text_height + padding_y), font, font_scale, text_color, font_thickness, cv2.LINE_AA)
-            
             current_parked_cars_count = len(car_tracker_manager.get_current_parking_cars())
             total_parking_sessions_display = car_tracker_manager.get_parking_count()
-            frame_height, frame_width = resized_frame.shape[:2]
-            font, small_font_scale, small_font_thickness = cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1
-            text_total_sessions = f"Total Parking Sessions: {total_parking_sessions_display}"
-            (w_total, h_total), _ = cv2.getTextSize(text_total_sessions, font, small_font_scale, small_font_thickness)
-            pos_total_y = frame_height - 10
-            pos_total_x = frame_width - w_total - 10
-            cv2.putText(resized_frame, text_total_sessions, (pos_total_x, pos_total_y), font, small_font_scale, (255, 255, 255), small_font_thickness)
-            text_current_parked = f"Current Parked: {current_parked_cars_count}"
-            (w_parked, _), _ = cv2.getTextSize(text_current_parked, font, small_font_scale, small_font_thickness)
-            pos_parked_y = pos_total_y - h_total - 5
-            pos_parked_x = frame_width - w_parked - 10
-            cv2.putText(resized_frame, text_current_parked, (pos_parked_x, pos_parked_y), font, small_font_scale, (255, 255, 255), small_font_thickness)
-            text_cam_name = f"{cam_name}"
-            (w_cam, h_cam), _ = cv2.getTextSize(text_cam_name, font, small_font_scale, small_font_thickness)
-            pos_cam_y = pos_parked_y - h_cam - 5
-            pos_cam_x = frame_width - w_cam - 10
-            cv2.putText(resized_frame, text_cam_name, (pos_cam_x, pos_cam_y), font, small_font_scale, (255, 255, 0), small_font_thickness)
-            await send_frame_to_api(camera_id, resized_frame, session)      
+
+            # วาด overlay / encode / ส่งเฟรม เฉพาะเมื่อมีคนใช้ภาพ (ผู้ชมบน dashboard, จอแสดงผล หรือบันทึกวิดีโอ)
+            # ยังวาดทุก ANNOTATION_SAMPLE_EVERY เฟรมเพื่อประมาณ CPU ที่ประหยัดได้
+            publish_frame = frame_uplink is None or frame_uplink.frame_due()
+            annotate = (publish_frame or show_display_flag or video_recorder is not None
+                        or annotate_ms_avg is None or frame_idx % ANNOTATION_SAMPLE_EVERY == 0)
+            if annotate:
+                annotate_started = time.perf_counter()
+                draw_annotations(resized_frame, car_tracker_manager, scaled_parking_zones, frame_idx, cam_name, draw_bounding_box,
+                                 current_parked_cars_count, total_parking_sessions_display)
+                annotate_ms = (time.perf_counter() - annotate_started) * 1000.0
+                annotate_ms_avg = annotate_ms if annotate_ms_avg is None else 0.9 * annotate_ms_avg + 0.1 * annotate_ms
+                trace.mark('annotate')
+            if frame_uplink is not None:
+                if publish_frame:
+                    frame_uplink.offer(resized_frame, trace)
+                else:
+                    frame_uplink.skip(resized_frame, 0.0 if annotate else annotate_ms_avg)
+                if time.monotonic() >= next_telemetry_at:
+                    next_telemetry_at = time.monotonic() + telemetry_interval_s
+                    frame_uplink.send_telemetry({
+                        'type': 'telemetry',
+                        'branch_id': branch_id,
+                        'frame_idx': frame_idx,
+                        'worker_fps': round(worker_fps, 2) if worker_fps else None,
+                        'current_parked': current_parked_cars_count,
+                        'total_parking_sessions': total_parking_sessions_display,
+                        'retry_queue': len(api_retry_queue),
+                        'host': socket.gethostname(),
+                        'process_cpu_s': round(time.process_time(), 3),
+                        'annotate_ms_avg': round(annotate_ms_avg, 3) if annotate_ms_avg is not None else None,
+                        **frame_uplink.stats(),
+                    })
+            else:
+                await send_frame_to_api(camera_id, resized_frame, session, trace)
             end_time = time.time()
             if frame_idx > 1 and frame_idx % (fps * 2) == 0:
                 elapsed_time = end_time - start_time
@@ -487,8 +789,8 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
                 except queue.Full:
                     logger.warning(f"[{cam_name}] Display queue is full.")
             
-            if video_writer and video_writer.isOpened():
-                video_writer.write(resized_frame)
+            if video_recorder:
+                video_recorder.write(resized_frame)
             
         # --- ส่วนท้ายนี้จะถูกเรียกใช้เมื่อออกจากลูป while True (เช่น วิดีโอจบ) ---
         logger.info(f"[{cam_name}] Video stream ended. Finalizing remaining tracked cars...")
@@ -526,7 +828,14 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
                 event.setdefault('total_parking_sessions', total_parking_sessions)
 
                 # --- ตรรกะแยก POST กับ PATCH ---
-                if event_type == 'parking_violation_ended':
+                if event_type in ('parking_session_completed', 'parking_violation_ended') and event.get('db_record_id') is None \
+                        and start_post_queued(event.get('car_id')):
+                    queue_exit_for_car(event['car_id'], {
+                        "exit_time": event['exit_time'],
+                        "duration_minutes": event['duration_minutes']
+                    }, api_key)
+
+                elif event_type == 'parking_violation_ended':
                     # Event สำหรับ "อัปเดต" record ที่มีอยู่
                     record_id = event.get('db_record_id')
                     if record_id is None:
@@ -559,11 +868,25 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
 
             logger.info(f"[{cam_name}] Finished sending final events.")
 
+        # ส่งรายการที่ยังค้างใน retry queue เป็นครั้งสุดท้าย
+        while api_retry_queue:
+            remaining = len(api_retry_queue)
+            await flush_retry_queue(camera_id, car_tracker_manager, api_key)
+            if len(api_retry_queue) >= remaining:
+                logger.warning(f"[{cam_name}] {remaining} queued items could not be sent before shutdown.")
+                break
+
 
     # 4. ปล่อยทรัพยากร
     cap.release()
-    if video_writer:
-        video_writer.release()
+    if frame_uplink:
+        frame_uplink.close()
+    if video_recorder:
+        video_recorder.close()
+        if video_recorder.dropped_frames:
+            logger.warning(f"[{cam_name}] Video recorder dropped {video_recorder.dropped_frames} frames (queue full).")
+    if mot_writer:
+        mot_writer.close()
     
     # 5. ส่งสถิติสรุปสุดท้ายไปยัง process หลัก (ถ้ายังต้องการ)
     # หมายเหตุ: finalize_all_sessions ได้เก็บสถิติไว้ในตัวแล้ว
@@ -571,10 +894,11 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
     stats_queue.put((cam_name, final_stats_data))
 
     logger.info(f"[{cam_name}] Worker has stopped.")
+    worker_logging.close()
 
 # --- Wrapper function for multiprocessing.Process (โค้ดเดิม) ---
-def camera_worker(cam_cfg, config, display_queue, stats_queue, show_display_flag):
+def camera_worker(cam_cfg, config, display_queue, stats_queue, show_display_flag, control_queue=None):
     try:
-        asyncio.run(camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_display_flag))
+        asyncio.run(camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_display_flag, control_queue))
     except Exception as e:
         logger.critical(f"Critical error in camera_worker for {cam_cfg.get('name', 'N/A')}. Process will exit. Error: {e}", exc_info=True)
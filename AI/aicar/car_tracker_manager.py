@@ -8,60 +8,85 @@ import json
 from datetime import datetime, timedelta
 import cv2      # ### เพิ่ม ###: สำหรับการจัดการรูปภาพ (Image Processing)
 import base64   # ### เพิ่ม ###: สำหรับการเข้ารหัสรูปภาพเป็น Base64
+import logging
+
+# log ใน update() เกิดได้หลายร้อยครั้งต่อวินาที: ใช้ logger (lazy %-format, จำกัดอัตราต่อ key ใน structured_log) แทน print
+logger = logging.getLogger(__name__)
+
+def _iter_tracks(current_tracks):
+    """
+    Yields (track_id, bbox, cls) from either a list of dicts {'id', 'bbox', 'cls'}
+    or an (N, 7) array laid out as x1, y1, x2, y2, id, conf, cls (camera_worker_process.TRACK_COLUMNS).
+    """
+    if isinstance(current_tracks, np.ndarray):
+        for row in current_tracks:
+            yield int(row[4]), row[:4], int(row[6])
+    else:
+        for t in current_tracks:
+            yield t['id'], t['bbox'], t.get('cls', None)
 
 class CarTrackerManager:
     # ### แก้ไข ###: เปลี่ยนชื่อ parameter จาก parking_zone_polygon เป็น parking_zones
     def __init__(self, parking_zones, parking_time_limit_minutes, movement_threshold_px, movement_frame_window,fps, config):
+        self.fps = fps
+        self.movement_frame_window = movement_frame_window
+        self.configure(parking_zones, parking_time_limit_minutes, movement_threshold_px, movement_frame_window, config)
+
+        self.tracked_cars = {} 
+        self.parking_sessions_count = 0 
+        self.parking_statistics = []
+        self.api_events_queue = []
+        self.active_parking = {}
+
+    def configure(self, parking_zones, parking_time_limit_minutes, movement_threshold_px, movement_frame_window, config):
+        """
+        ตั้งค่าโซนและพารามิเตอร์ (เรียกซ้ำได้ระหว่างทำงานเมื่อ config / ROI เปลี่ยน: รถที่ track อยู่และ session ที่จอดอยู่ไม่หาย)
+        """
         # ### แก้ไข ###: เก็บเป็นลิสต์ของโซน
         self.parking_zones = [np.array(zone) for zone in parking_zones]
         
         self.movement_threshold_px = movement_threshold_px
+        if movement_frame_window != self.movement_frame_window:
+            # ประวัติตำแหน่งของรถที่ track อยู่ใช้ความยาวใหม่ (เก็บค่าล่าสุดไว้)
+            for car in getattr(self, 'tracked_cars', {}).values():
+                if 'center_history' in car:
+                    car['center_history'] = deque(car['center_history'], maxlen=movement_frame_window)
         self.movement_frame_window = movement_frame_window
-        self.fps = fps
         self.grace_period_frames_exit = int(config.get('grace_period_frames_exit', 5)) 
 
         # ### เพิ่ม ###: โหลดค่าสำหรับช่วงเวลายืนยันการจอด
         parking_time_threshold_seconds = config.get('parking_time_threshold_seconds', 3) # Default 3 วินาทีถ้าไม่มีใน config
         self.parking_confirm_frames = int(parking_time_threshold_seconds * self.fps)
-        print(f"[Info] Parking confirmation time set to {parking_time_threshold_seconds} seconds ({self.parking_confirm_frames} frames).")
+        logger.info("Parking confirmation time set to %s seconds (%d frames).", parking_time_threshold_seconds, self.parking_confirm_frames)
 
         # ### เพิ่ม ###: โหลดค่าสำหรับป้องกัน ID สลับ (ID Stealing)
         self.id_switch_threshold_px = self.movement_threshold_px * 2.0 
-        print(f"[Info] ID Switch teleport threshold set to {self.id_switch_threshold_px:.2f} pixels.")
+        logger.info("ID Switch teleport threshold set to %.2f pixels.", self.id_switch_threshold_px)
 
         # ### เพิ่ม ###: โหลดค่า timeout พิเศษสำหรับรถที่จอดแล้ว
         self.parked_car_timeout_seconds = config.get('parked_car_timeout_seconds', 300) # Default 5 minutes
-        print(f"[Info] Timeout for parked cars set to {self.parked_car_timeout_seconds} seconds.")
+        logger.info("Timeout for parked cars set to %s seconds.", self.parked_car_timeout_seconds)
 
         # ตรรกะสำหรับโหมดทดสอบ (Debug Mode)
         debug_cfg = config.get('debug_settings', {})
         self.debug_mode_enabled = debug_cfg.get('enabled', False)
 
         if self.debug_mode_enabled:
-            print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-            print("!!!      DEBUG MODE IS ENABLED         !!!")
-            print("!!! Using shorter mock time limits.    !!!")
-            print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
+            logger.warning("DEBUG MODE IS ENABLED: using shorter mock time limits.")
             mock_violation_minutes = debug_cfg.get('mock_violation_minutes', 1)
             mock_warning_minutes = debug_cfg.get('mock_warning_minutes', 0.5)
             
             self.parking_time_limit_seconds = mock_violation_minutes * 60
             self.warning_time_limit_seconds = mock_warning_minutes * 60
             
-            print(f"DEBUG: Violation time set to -> {self.parking_time_limit_seconds} seconds ({mock_violation_minutes} min)")
-            print(f"DEBUG: Warning time set to -> {self.warning_time_limit_seconds} seconds ({mock_warning_minutes} min)")
+            logger.warning("DEBUG: Violation time set to -> %s seconds (%s min)", self.parking_time_limit_seconds, mock_violation_minutes)
+            logger.warning("DEBUG: Warning time set to -> %s seconds (%s min)", self.warning_time_limit_seconds, mock_warning_minutes)
         else:
             self.parking_time_limit_seconds = parking_time_limit_minutes * 60
             # self.warning_time_limit_seconds = warning_time_limit_minutes * 60
 
-        self.tracked_cars = {} 
-        self.parking_sessions_count = 0 
-        self.parking_statistics = []
-        self.api_events_queue = []
-        self.active_parking = {}
-
     def reset(self):
-        print("Resetting CarTrackerManager state...")
+        logger.info("Resetting CarTrackerManager state...")
         self.tracked_cars.clear()
         self.parking_statistics.clear()
         self.api_events_queue.clear()
@@ -70,6 +95,10 @@ class CarTrackerManager:
         return datetime.utcnow()
 
     def update(self, current_tracks, current_frame_idx, resized_frame, original_frame=None):
+        """
+        current_tracks: list of dicts {'id', 'bbox', 'cls'} or an (N, 7) array
+                        [x1, y1, x2, y2, id, conf, cls] as produced by extract_zone_tracks.
+        """
         # --- helper functions (local) ---
         def euclidean_distance(p1, p2):
             return ((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2) ** 0.5
@@ -95,15 +124,13 @@ class CarTrackerManager:
         stillness_grace_frames = getattr(self, 'stillness_grace_period_frames', getattr(self, 'stillness_grace_period_frames', 15))
         # --- end thresholds ---
 
-        detected_ids_in_frame = {t['id'] for t in current_tracks}
+        tracks = list(_iter_tracks(current_tracks))
+        detected_ids_in_frame = {tid for tid, _, _ in tracks}
         alerts = []
 
         # --- 1) อัปเดต tracks ที่มี id เดิม (ปรับ bbox + history) และเก็บ list ของ candidates ใหม่ที่ยังไม่รู้จัก ---
         new_candidates = []  # เก็บ detections ที่ยังไม่ match กับ tracked_cars (จะพยายาม re-associate ต่อ)
-        for t in current_tracks:
-            tid = t['id']
-            bbox = t['bbox']  # assumed [x1,y1,x2,y2]
-            cls = t.get('cls', None)
+        for tid, bbox, cls in tracks:  # bbox: [x1,y1,x2,y2]
             cx, cy = get_bbox_center(bbox)
 
             if tid in self.tracked_cars:
@@ -183,7 +210,8 @@ class CarTrackerManager:
                 lost_tracks_pool[best_id]['matched'] = True
                 old_id = best_id
                 new_temp_id = cand['temp_id']
-                print(f"[DEBUG] Re-associating temp ID {new_temp_id} -> old ID {old_id} (score={best_score:.3f})")
+                logger.debug("Re-associating temp ID %s -> old ID %s (score=%.3f)", new_temp_id, old_id, best_score,
+                             extra={'key': 'tracker.reassociate', 'frame_idx': current_frame_idx, 'track_id': old_id})
                 # merge/update existing tracked car info
                 car_info = self.tracked_cars[old_id]
 
@@ -228,7 +256,8 @@ class CarTrackerManager:
                     'violation_image_base64': None,
                     'lock_in_parking': False
                 }
-                print(f"[DEBUG] Created new tracked car ID {new_id} (no re-association)")
+                logger.debug("Created new tracked car ID %s (no re-association)", new_id,
+                             extra={'key': 'tracker.new_track', 'frame_idx': current_frame_idx, 'track_id': new_id})
 
         # --- 3) อัปเดตสถานะทั้งหมด (parking logic + remove expired) ---
         ids_to_remove = []
@@ -241,7 +270,8 @@ class CarTrackerManager:
                 timeout_seconds = (self.parked_car_timeout_seconds if is_parked else 5.0)
 
                 if seconds_disappeared > timeout_seconds:
-                    print(f"[Info] Removing track ID {track_id} (disappeared {seconds_disappeared:.2f}s).")
+                    logger.debug("Removing track ID %s (disappeared %.2fs).", track_id, seconds_disappeared,
+                                 extra={'key': 'tracker.remove_track', 'frame_idx': current_frame_idx, 'track_id': track_id})
                     if car_info.get('is_parking'):
                         self._end_parking_session(track_id, current_frame_idx, "ended_disappeared")
                     ids_to_remove.append(track_id)
@@ -273,7 +303,8 @@ class CarTrackerManager:
                             car_info['status'] = 'PARKED'
                             car_info['lock_in_parking'] = True
                             car_info['still_moved_grace_frames'] = 0
-                            print(f"[{current_frame_idx}] Car ID {track_id} CONFIRMED PARKED.")
+                            logger.info("Car ID %s CONFIRMED PARKED.", track_id,
+                                        extra={'key': 'tracker.parked', 'frame_idx': current_frame_idx, 'track_id': track_id})
                 
                 else:
                     car_info['still_start_frame_idx'] = None
@@ -294,11 +325,13 @@ class CarTrackerManager:
                         if car_info.get('lock_in_parking', False):
                             car_info['still_moved_grace_frames'] = car_info.get('still_moved_grace_frames', 0) + 1
                             if car_info['still_moved_grace_frames'] >= stillness_grace_frames:
-                                print(f"[Info] Parked Car ID {track_id} moved too long -> ending session.")
+                                logger.info("Parked Car ID %s moved too long -> ending session.", track_id,
+                                            extra={'key': 'tracker.moved', 'frame_idx': current_frame_idx, 'track_id': track_id})
                                 self._end_parking_session(track_id, current_frame_idx, "ended_moved_after_grace")
                         else:
                             # ถ้ายังไม่ได้ lock-in (เพิ่ง confirm) -> เร็ว ๆ นี้ให้จบเลย
-                            print(f"[Info] Car ID {track_id} moved while parking (not lock-in) -> ending session.")
+                            logger.info("Car ID %s moved while parking (not lock-in) -> ending session.", track_id,
+                                        extra={'key': 'tracker.moved', 'frame_idx': current_frame_idx, 'track_id': track_id})
                             self._end_parking_session(track_id, current_frame_idx, "ended_moved")
                     else:
                         # still ยังคงเป็น parked -> reset grace counter
@@ -360,13 +393,17 @@ class CarTrackerManager:
                                                         'image_mime': 'image/jpeg',
                                                         'image_filename': f"car_violation_{track_id}_{current_frame_idx}.jpg"
                                                     })
-                                                    print(f"[Enqueue] Violation START event for Car ID {track_id}")
+                                                    logger.info("Violation START event enqueued for Car ID %s", track_id,
+                                                                extra={'key': 'tracker.violation_start', 'frame_idx': current_frame_idx, 'track_id': track_id})
                                                 else:
-                                                    print(f"[Error] imencode failed for Car ID {track_id}")
+                                                    logger.error("imencode failed for Car ID %s", track_id,
+                                                                 extra={'frame_idx': current_frame_idx, 'track_id': track_id})
                                             else:
-                                                print(f"[Warning] Cropped ROI too small/invalid for Car ID {track_id}")
+                                                logger.warning("Cropped ROI too small/invalid for Car ID %s", track_id,
+                                                               extra={'frame_idx': current_frame_idx, 'track_id': track_id})
                                         except Exception as e:
-                                            print(f"[ERROR] Capturing scaled crop failed for car ID {track_id}: {e}")
+                                            logger.error("Capturing scaled crop failed for car ID %s: %s", track_id, e,
+                                                         extra={'frame_idx': current_frame_idx, 'track_id': track_id})
 
 
         # --- 4) cleanup: remove expired tracks from memory ---
@@ -429,7 +466,7 @@ class CarTrackerManager:
         if output_dir:
             output_file_path = output_dir / "parking_sessions_summary.json"
         else:
-            print("Warning: output_dir is None. Cannot save parking sessions to file.")
+            logger.warning("output_dir is None. Cannot save parking sessions to file.")
             return
         
         for track_id, car_info in list(self.tracked_cars.items()):
@@ -455,7 +492,8 @@ class CarTrackerManager:
                     'duration_min': parking_duration_s / 60.0,
                     'final_status': status_on_shutdown
                 })
-                print(f"[Parking Ended - App Shutdown] Car ID {track_id}, Session ID {car_info['parking_session_id']}: Parked for {parking_duration_s:.2f} seconds.")
+                logger.info("[Parking Ended - App Shutdown] Car ID %s, Session ID %s: Parked for %.2f seconds.",
+                            track_id, car_info['parking_session_id'], parking_duration_s, extra={'track_id': track_id})
                 
                 current_parked_count = len([c_id for c_id, c in self.tracked_cars.items() if c_id != track_id and c['is_parking'] and c['status'] in ['PARKED', 'WARNING_PARKED', 'VIOLATION']])
                 
@@ -473,9 +511,9 @@ class CarTrackerManager:
         try:
             with open(output_file_path, 'w', encoding='utf-8') as f:
                 json.dump(self.parking_statistics, f, indent=4, default=str)
-            print(f"All parking sessions saved to {output_file_path}")
+            logger.info("All parking sessions saved to %s", output_file_path)
         except Exception as e:
-            print(f"Error saving parking statistics: {e}")
+            logger.error("Error saving parking statistics: %s", e)
 
     def get_final_parking_statistics(self, total_frames):
         all_sessions_for_summary = list(self.parking_statistics) 
@@ -521,7 +559,7 @@ class CarTrackerManager:
         """
         if track_id in self.tracked_cars:
             self.tracked_cars[track_id]['db_record_id'] = db_id
-            print(f"[Info] Stored DB Record ID {db_id} for Car ID {track_id}.")
+            logger.debug("Stored DB Record ID %s for Car ID %s.", db_id, track_id, extra={'key': 'tracker.db_record', 'track_id': track_id})
     def _end_parking_session(self, track_id, current_frame_idx, reason: str):
         car_info = self.tracked_cars[track_id]
         parking_duration_frames = current_frame_idx - car_info['parking_start_frame_idx']
@@ -535,7 +573,8 @@ class CarTrackerManager:
                 'exit_time': datetime.utcnow(),
                 'duration_minutes': round(parking_duration_min, 2)
             })
-            print(f"[{reason}] Car ID {track_id} (DB ID: {car_info['db_record_id']}) session ended.")
+            logger.info("[%s] Car ID %s (DB ID: %s) session ended.", reason, track_id, car_info['db_record_id'],
+                        extra={'key': 'tracker.session_end', 'frame_idx': current_frame_idx, 'track_id': track_id})
         else:
             # คำนวณค่าที่ขาดไป
             current_parked_count = len([
@@ -555,7 +594,8 @@ class CarTrackerManager:
                 'current_park': current_parked_count,
                 'total_parking_sessions': self.parking_sessions_count 
             })
-            print(f"[{reason}] Car ID {track_id} (Normal) session ended.")
+            logger.info("[%s] Car ID %s (Normal) session ended.", reason, track_id,
+                        extra={'key': 'tracker.session_end', 'frame_idx': current_frame_idx, 'track_id': track_id})
 
         car_info.update(is_parking=False, parking_start_frame_idx=None, parking_start_time=None,
                         parking_session_id=None, has_left_zone=True, status='OUT_OF_ZONE',
@@ -566,7 +606,7 @@ class CarTrackerManager:
         """
         Called at the end of a video file to close out any remaining active parking sessions.
         """
-        print(f"[Info] Finalizing all active parking sessions at frame {final_frame_idx}...")
+        logger.info("Finalizing all active parking sessions at frame %s...", final_frame_idx)
         active_car_ids = list(self.tracked_cars.keys())
 
         for track_id in active_car_ids:
@@ -583,7 +623,8 @@ class CarTrackerManager:
                         'exit_time': datetime.utcnow(),
                         'duration_minutes': round(parking_duration_min, 2)
                     })
-                    print(f"[Violation Ended - Shutdown] Car ID {track_id} (DB ID: {car_info['db_record_id']}).")
+                    logger.info("[Violation Ended - Shutdown] Car ID %s (DB ID: %s).", track_id, car_info['db_record_id'],
+                                extra={'frame_idx': final_frame_idx, 'track_id': track_id})
                 else:
                     # คำนวณค่าที่ขาดไป
                     current_parked_count = len([
@@ -0,0 +1,129 @@
+# config_watch.py
+import os
+import queue
+import time
+
+from utils import load_config
+
+# Settings that are only read when a worker starts (model, tracker, writers, uplink). Changing any of
+# them restarts the affected workers; everything else is pushed to the running worker in place.
+RESTART_KEYS = ('yolo_model', 'reid_model', 'boxmot_config_path', 'device', 'half_precision',
+                'tracking_method', 'per_class_tracking', 'tracker_config_file_default', 'output_dir',
+                'save_video', 'video_recording', 'save_mot_results', 'mot_settings', 'frame_uplink')
+# Zone masks and tracked boxes are in inference pixels, so a new inference width needs a fresh tracker.
+RESTART_PERFORMANCE_KEYS = ('target_inference_width',)
+CAMERA_RESTART_KEYS = ('source_path',)
+
+
+def camera_key(cam_cfg):
+    return cam_cfg.get('camera_id', cam_cfg['name'])
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return st.st_mtime_ns, st.st_ino, st.st_size
+
+
+def _needs_restart(old_config, new_config, old_cam, new_cam):
+    if any(old_config.get(k) != new_config.get(k) for k in RESTART_KEYS):
+        return True
+    old_perf = old_config.get('performance_settings', {}) or {}
+    new_perf = new_config.get('performance_settings', {}) or {}
+    if any(old_perf.get(k) != new_perf.get(k) for k in RESTART_PERFORMANCE_KEYS):
+        return True
+    return any(old_cam.get(k) != new_cam.get(k) for k in CAMERA_RESTART_KEYS)
+
+
+def plan_reload(old_config, new_config, roi_changed=()):
+    """
+    Compares two configs camera by camera. Returns {camera_key: (action, cam_cfg)} for cameras that
+    need something, where action is one of:
+        start        camera added
+        stop         camera removed
+        restart      a start-up setting or the source changed
+        reconfigure  anything else (thresholds, tracker parameters, ROI file or its contents)
+    """
+    old_cams = {camera_key(c): c for c in old_config.get('video_sources', []) or []}
+    new_cams = {camera_key(c): c for c in new_config.get('video_sources', []) or []}
+    global_changed = {k for k in set(old_config) | set(new_config)
+                      if k != 'video_sources' and old_config.get(k) != new_config.get(k)}
+
+    plan = {}
+    for key, cam_cfg in new_cams.items():
+        old_cam = old_cams.get(key)
+        if old_cam is None:
+            plan[key] = ('start', cam_cfg)
+        elif _needs_restart(old_config, new_config, old_cam, cam_cfg):
+            plan[key] = ('restart', cam_cfg)
+        elif global_changed or old_cam != cam_cfg or key in roi_changed:
+            plan[key] = ('reconfigure', cam_cfg)
+    for key, cam_cfg in old_cams.items():
+        if key not in new_cams:
+            plan[key] = ('stop', cam_cfg)
+    return plan
+
+
+class ConfigWatcher:
+    """
+    Polls config.yaml and the ROI files it references for changes.
+
+    Change detection uses (mtime_ns, inode, size). The backend saves both kinds of file with
+    write-then-rename, so every save is seen, and a half-written file is never read. A config that
+    fails to parse (e.g. edited by hand) is reported once and skipped until the file changes again.
+    poll() is cheap and rate-limited to one stat round every `interval_s` seconds; interval_s <= 0
+    disables the watcher.
+    """
+
+    def __init__(self, config_path, config, interval_s=2.0):
+        self.config_path = config_path
+        self.config = config
+        self.interval_s = float(interval_s or 0)
+        self._next_check = time.monotonic() + self.interval_s
+        self._config_signature = _signature(config_path)
+        self._roi_signatures = self._roi_signatures_of(config)
+
+    @staticmethod
+    def _roi_signatures_of(config):
+        return {camera_key(c): _signature(c.get('parking_zone_file')) for c in config.get('video_sources', []) or []}
+
+    def poll(self):
+        """Returns plan_reload() output for what changed since the last poll, or None."""
+        if self.interval_s <= 0 or time.monotonic() < self._next_check:
+            return None
+        self._next_check = time.monotonic() + self.interval_s
+
+        config = self.config
+        config_signature = _signature(self.config_path)
+        if config_signature != self._config_signature:
+            self._config_signature = config_signature
+            try:
+                config = load_config(self.config_path) or {}
+            except Exception as e:
+                print(f"[ConfigWatch] Ignoring unreadable config {self.config_path}: {e}")
+                return None
+
+        roi_signatures = self._roi_signatures_of(config)
+        roi_changed = {k for k, s in roi_signatures.items() if s != self._roi_signatures.get(k)}
+        plan = plan_reload(self.config, config, roi_changed) if config is not self.config or roi_changed else {}
+        self.config, self._roi_signatures = config, roi_signatures
+        return plan or None
+
+
+def drain_control_queue(control_queue):
+    """
+    Reads every pending control message of a worker without blocking.
+    Returns (stop_requested, latest (cam_cfg, config) update or None).
+    """
+    stop_requested, update = False, None
+    while True:
+        try:
+            message = control_queue.get_nowait()
+        except queue.Empty:
+            return stop_requested, update
+        if message.get('type') == 'stop':
+            stop_requested = True
+        elif message.get('type') == 'reconfigure':
+            update = message['cam_cfg'], message['config']
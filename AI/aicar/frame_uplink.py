@@ -0,0 +1,234 @@
+# frame_uplink.py
+import asyncio
+import json
+import logging
+import struct
+import threading
+import time
+
+import cv2
+import websockets
+
+logger = logging.getLogger(__name__)
+
+
+class FrameUplink:
+    """
+    Long-lived WebSocket from a camera worker to the backend (/api/ws/ingest/{camera_id}).
+
+    Replaces one HTTP POST per frame. The connection runs on its own event loop in a daemon
+    thread, so a slow or unreachable backend never blocks the frame loop. Flow control:
+        demand:  the backend sends {"type": "demand", "viewers": n, "level": ...} whenever the
+                 viewers of this camera change. Levels:
+                     none       nobody watches: frame_due() is False, the worker skips
+                                annotation, encoding and sending (see skip()).
+                     thumbnail  every viewer has the panel hidden / the tab in the background:
+                                a downscaled keep-alive frame every 1 / thumbnail_fps seconds.
+                     live       at least one visible viewer: every processed frame.
+        latest:  only the newest offered frame is kept (a single slot); a frame that is replaced
+                 before it could be sent is counted in `frames_dropped` instead of queueing.
+
+    CPU saved by skipped frames is estimated from a moving average of the encode time; while
+    nothing is published one frame in `sample_every` is still encoded (not sent) to keep the
+    average current. The worker adds its own annotation cost through skip().
+
+    Frame messages are binary: 4-byte big-endian header length, JSON header (demand level,
+    capture_ts and hops_ms of the FrameTrace), then the JPEG bytes. Telemetry is a JSON text message; only the
+    latest value is kept until it is sent.
+    """
+
+    LEVELS = ('none', 'thumbnail', 'live')
+
+    def __init__(self, url, camera_id, api_key, jpeg_quality=80, reconnect_seconds=2.0,
+                 thumbnail_fps=1.0, thumbnail_width=320, thumbnail_quality=60, sample_every=500):
+        self.url = f"{url.rstrip('/')}/{camera_id}"
+        self.camera_id = camera_id
+        self.api_key = api_key
+        self.jpeg_quality = int(jpeg_quality)
+        self.reconnect_seconds = float(reconnect_seconds)
+        self.thumbnail_interval_s = 1.0 / thumbnail_fps if thumbnail_fps > 0 else 1.0
+        self.thumbnail_width = int(thumbnail_width)
+        self.thumbnail_quality = int(thumbnail_quality)
+        self.sample_every = max(1, int(sample_every))
+
+        self.connected = False
+        self.viewers = 0
+        self.level = 'none'
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.frames_skipped = 0
+        self.encode_ms_avg = None
+        self.cpu_saved_ms = 0.0
+        self._next_thumbnail_at = 0.0
+        self.snapshot_requested = False
+
+        self._lock = threading.Lock()
+        self._frame = None
+        self._snapshot = None
+        self._telemetry = None
+        self._loop = None
+        self._wakeup = None
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name=f"frame-uplink-{camera_id}", daemon=True)
+        self._thread.start()
+
+    def frame_due(self):
+        """True if the current frame should be annotated, encoded and offered."""
+        if not self.connected or self.level == 'none':
+            return False
+        if self.level == 'thumbnail':
+            return time.monotonic() >= self._next_thumbnail_at
+        return True
+
+    def _encode(self, frame, quality):
+        started = time.perf_counter()
+        ok, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        self.encode_ms_avg = elapsed_ms if self.encode_ms_avg is None else 0.9 * self.encode_ms_avg + 0.1 * elapsed_ms
+        return buffer.tobytes() if ok else None
+
+    def offer(self, frame, trace=None):
+        """Encodes and queues `frame` for the current demand level. Returns True if the frame was queued."""
+        if not self.frame_due():
+            return False
+        quality = self.jpeg_quality
+        if self.level == 'thumbnail':
+            self._next_thumbnail_at = time.monotonic() + self.thumbnail_interval_s
+            height, width = frame.shape[:2]
+            if width > self.thumbnail_width:
+                frame = cv2.resize(frame, (self.thumbnail_width, max(1, height * self.thumbnail_width // width)),
+                                   interpolation=cv2.INTER_AREA)
+            quality = self.thumbnail_quality
+        jpeg = self._encode(frame, quality)
+        if jpeg is None:
+            logger.warning(f"[{self.camera_id}] Failed to encode frame to JPEG.")
+            return False
+        header = {'level': self.level}
+        if trace is not None:
+            trace.mark('encode')
+            header.update(capture_ts=trace.capture_wall, hops_ms=trace.hops_ms)
+        header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        message = struct.pack('>I', len(header_bytes)) + header_bytes + jpeg
+        with self._lock:
+            if self._frame is not None:
+                self.frames_dropped += 1
+            self._frame = message
+        self._wake()
+        return True
+
+    def offer_snapshot(self, frame):
+        """Answers a pending snapshot request with `frame` (the unannotated capture)."""
+        self.snapshot_requested = False
+        ok, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 95])
+        if not ok:
+            return
+        header_bytes = json.dumps({'kind': 'snapshot'}).encode('utf-8')
+        with self._lock:
+            self._snapshot = struct.pack('>I', len(header_bytes)) + header_bytes + buffer.tobytes()
+        self._wake()
+
+    def skip(self, frame, annotate_ms=0.0):
+        """Records a frame that was not published and the CPU time (encode + `annotate_ms`) not spent on it."""
+        self.frames_skipped += 1
+        if self.encode_ms_avg is None or self.frames_skipped % self.sample_every == 0:
+            self._encode(frame, self.jpeg_quality)
+            return
+        self.cpu_saved_ms += self.encode_ms_avg + (annotate_ms or 0.0)
+
+    def stats(self):
+        return {
+            'demand': self.level,
+            'viewers': self.viewers,
+            'frames_sent': self.frames_sent,
+            'frames_dropped': self.frames_dropped,
+            'frames_skipped': self.frames_skipped,
+            'encode_ms_avg': round(self.encode_ms_avg, 3) if self.encode_ms_avg is not None else None,
+            'cpu_saved_ms': round(self.cpu_saved_ms, 1),
+        }
+
+    def send_telemetry(self, data):
+        with self._lock:
+            self._telemetry = json.dumps(data, separators=(',', ':'), default=str)
+        self._wake()
+
+    def close(self, timeout=2.0):
+        self._closed = True
+        self._wake()
+        self._thread.join(timeout)
+
+    def _wake(self):
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            pass  # loop already closed
+
+    def _run(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        while not self._closed:
+            try:
+                async with websockets.connect(self.url, additional_headers={'X-API-Key': self.api_key},
+                                              open_timeout=5, max_queue=4) as ws:
+                    self.connected = True
+                    logger.info(f"[{self.camera_id}] Frame uplink connected to {self.url}")
+                    await self._session(ws)
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                logger.debug(f"[{self.camera_id}] Frame uplink unavailable: {e}")
+            finally:
+                if self.connected:
+                    logger.info(f"[{self.camera_id}] Frame uplink disconnected.")
+                self.connected = False
+                self.viewers = 0
+                self.level = 'none'
+            if not self._closed:
+                await asyncio.sleep(self.reconnect_seconds)
+
+    async def _session(self, ws):
+        receiver = asyncio.create_task(self._receive(ws))
+        try:
+            while not self._closed and not receiver.done():
+                waiter = asyncio.create_task(self._wakeup.wait())
+                await asyncio.wait({waiter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                self._wakeup.clear()
+                with self._lock:
+                    frame, self._frame = self._frame, None
+                    snapshot, self._snapshot = self._snapshot, None
+                    telemetry, self._telemetry = self._telemetry, None
+                if telemetry:
+                    await ws.send(telemetry)
+                if snapshot:
+                    await ws.send(snapshot)
+                if frame and self.level != 'none':
+                    await ws.send(frame)
+                    self.frames_sent += 1
+            if receiver.done():
+                receiver.result()  # re-raise ConnectionClosed etc.
+        finally:
+            receiver.cancel()
+
+    async def _receive(self, ws):
+        async for message in ws:
+            if not isinstance(message, str):
+                continue
+            try:
+                data = json.loads(message)
+            except ValueError:
+                continue
+            if data.get('type') == 'snapshot_request':
+                self.snapshot_requested = True
+            elif data.get('type') == 'demand':
+                self.viewers = int(data.get('viewers', 0))
+                level = data.get('level')
+                self.level = level if level in self.LEVELS else ('live' if self.viewers else 'none')
+                self._next_thumbnail_at = 0.0
+                if self.level == 'none':
+                    with self._lock:
+                        self._frame = None
@@ -0,0 +1,38 @@
+# latency.py
+import time
+
+
+class FrameTrace:
+    """
+    Timestamps carried by one frame from capture to the backend.
+
+    Stamped right after cap.read() with both a monotonic clock (for hop durations inside the worker)
+    and the wall clock (so the backend, on the same host or an NTP-synced one, can measure the rest
+    of the path: upload, DB insert and WebSocket broadcast).
+    """
+    __slots__ = ('frame_idx', 'capture_mono', 'capture_wall', '_last_mono', 'hops_ms')
+
+    def __init__(self, frame_idx):
+        self.frame_idx = frame_idx
+        self.capture_mono = time.monotonic()
+        self.capture_wall = time.time()
+        self._last_mono = self.capture_mono
+        self.hops_ms = {}
+
+    def mark(self, hop):
+        """Records the time spent since the previous mark (or capture) under `hop`."""
+        now = time.monotonic()
+        self.hops_ms[hop] = round((now - self._last_mono) * 1000.0, 3)
+        self._last_mono = now
+
+    def age_ms(self):
+        return (time.monotonic() - self.capture_mono) * 1000.0
+
+    def to_payload(self):
+        """Serializable form sent with events (`trace` field) and frames (X-Capture-Ts / X-Trace-Hops headers)."""
+        return {
+            'frame_idx': self.frame_idx,
+            'capture_ts': self.capture_wall,
+            'sent_ts': time.time(),
+            'hops_ms': dict(self.hops_ms),
+        }
@@ -9,6 +9,7 @@ import sys
 from multiprocessing import Process, Queue
 from pathlib import Path
 from camera_worker_process import camera_worker
+from config_watch import ConfigWatcher, camera_key
 from utils import load_config, save_parking_statistics
 import os
 import base64
@@ -139,6 +140,119 @@ class WsBroadcaster:
             await asyncio.gather(*coros, return_exceptions=True)
 
 
+def start_camera_worker(cam_cfg, config, display_queue, stats_queue, show_display):
+    """Starts one camera worker process. Returns (process, control_queue), or None if its source / ROI file is missing."""
+    cam_name = cam_cfg['name']
+    source_path = cam_cfg['source_path']
+    parking_zone_file = cam_cfg.get('parking_zone_file', "")
+    # check local file if not URL
+    if not str(source_path).startswith(('rtsp://', 'http://')):
+        src_path = Path(source_path)
+        if not src_path.exists():
+            print(f"[main] Warning: Video source file '{src_path}' for camera '{cam_name}' not found. Skipping this camera.")
+            return None
+    roi_file = Path(parking_zone_file) if parking_zone_file else None
+    if roi_file and not roi_file.exists():
+        print(f"[main] Warning: ROI file '{roi_file}' for camera '{cam_name}' not found. Skipping this camera.")
+        return None
+
+    control_queue = Queue()
+    p = Process(target=camera_worker, args=(cam_cfg, config, display_queue, stats_queue, show_display, control_queue))
+    p.start()
+    return p, control_queue
+
+
+def stop_camera_worker(p, control_queue, stopping, key, timeout=15.0):
+    """
+    Asks a worker to finish (final events are still sent) without waiting for it.
+    The main loop keeps draining display_queue / stats_queue so the worker can exit;
+    reap_stopping_workers() terminates it if it is still alive after `timeout`.
+    """
+    if not p.is_alive():
+        return
+    control_queue.put({'type': 'stop'})
+    stopping[p.pid] = (p, time.monotonic() + timeout, key)
+
+
+def reap_stopping_workers(stopping):
+    """Called every main-loop iteration: forgets workers that exited, terminates those past their deadline."""
+    now = time.monotonic()
+    for pid, (p, deadline, _key) in list(stopping.items()):
+        if not p.is_alive():
+            p.join(timeout=0)
+            del stopping[pid]
+        elif now >= deadline:
+            print(f"[Monitor] Process {pid} did not stop in time. Terminating...")
+            p.terminate()
+            p.join(timeout=2)
+            del stopping[pid]
+
+
+def drain_stats_queue(stats_queue, all_parking_stats):
+    # worker จะ exit ได้ก็ต่อเมื่อ final stats ที่ put ไว้ถูกอ่านออกจาก pipe แล้ว
+    while True:
+        try:
+            cam_name, stats_data = stats_queue.get_nowait()
+        except queue.Empty:
+            return
+        all_parking_stats[cam_name] = stats_data
+        print(f"[Monitor] Received final stats for {cam_name}")
+
+
+def _launch_worker(key, cam_cfg, config, workers, processes, active_processes, display_queue, stats_queue, show_display):
+    started = start_camera_worker(cam_cfg, config, display_queue, stats_queue, show_display)
+    if started:
+        print(f"[Monitor] Started camera '{key}'.")
+        workers[key] = started
+        processes.append(started[0])
+        active_processes[started[0].pid] = started[0]
+
+
+def apply_config_changes(plan, config, workers, processes, active_processes, stopping, pending_starts,
+                         display_queue, stats_queue, show_display):
+    """
+    Applies ConfigWatcher.poll() output: running workers are reconfigured in place, restarted or stopped.
+    Cameras without a worker (added, or skipped at start-up because a file was missing) are started.
+    A camera whose previous worker is still stopping is queued in pending_starts instead: the two would
+    share its log file, MOT / video outputs and /ws/ingest/{camera_id}.
+    """
+    for key, (action, cam_cfg) in plan.items():
+        if key in pending_starts:
+            # ยังรอ worker ตัวเก่า exit: ใช้ config ล่าสุดตอนเริ่ม หรือยกเลิกถ้ากล้องถูกลบ
+            if action == 'stop':
+                del pending_starts[key]
+            else:
+                pending_starts[key] = cam_cfg
+            continue
+        current = workers.get(key)
+        running = current is not None and current[0].is_alive()
+        if action == 'reconfigure' and running:
+            print(f"[Monitor] Config changed for camera '{key}'. Reloading in place.")
+            current[1].put({'type': 'reconfigure', 'cam_cfg': cam_cfg, 'config': config})
+            continue
+        if action == 'reconfigure' and current is not None:
+            continue  # worker already finished (end of video file)
+        if running:
+            print(f"[Monitor] {'Stopping' if action == 'stop' else 'Restarting'} camera '{key}' (config changed).")
+            stop_camera_worker(*current, stopping, key)
+        workers.pop(key, None)
+        if action == 'stop':
+            continue
+        if any(stopping_key == key for _p, _deadline, stopping_key in stopping.values()):
+            pending_starts[key] = cam_cfg
+            continue
+        _launch_worker(key, cam_cfg, config, workers, processes, active_processes, display_queue, stats_queue, show_display)
+
+
+def start_pending_workers(pending_starts, stopping, config, workers, processes, active_processes,
+                          display_queue, stats_queue, show_display):
+    """Called after reap_stopping_workers(): starts queued cameras whose previous worker has exited."""
+    stopping_keys = {key for _p, _deadline, key in stopping.values()}
+    for key in [key for key in pending_starts if key not in stopping_keys]:
+        _launch_worker(key, pending_starts.pop(key), config, workers, processes, active_processes,
+                       display_queue, stats_queue, show_display)
+
+
 # -------------------------
 # Main runner
 # -------------------------
@@ -159,26 +273,14 @@ def run(args):
     display_queue = Queue(maxsize=config.get('display_queue_max_size', 10))
     stats_queue = Queue()
     processes = []
+    workers = {}  # camera_key -> (process, control_queue)
 
     # Start camera worker processes
     for cam_cfg in camera_configs:
-        cam_name = cam_cfg['name']
-        source_path = cam_cfg['source_path']
-        parking_zone_file = cam_cfg.get('parking_zone_file', "")
-        # check local file if not URL
-        if not str(source_path).startswith(('rtsp://', 'http://')):
-            src_path = Path(source_path)
-            if not src_path.exists():
-                print(f"[main] Warning: Video source file '{src_path}' for camera '{cam_name}' not found. Skipping this camera.")
-                continue
-        roi_file = Path(parking_zone_file) if parking_zone_file else None
-        if roi_file and not roi_file.exists():
-            print(f"[main] Warning: ROI file '{roi_file}' for camera '{cam_name}' not found. Skipping this camera.")
-            continue
-
-        p = Process(target=camera_worker, args=(cam_cfg, config, display_queue, stats_queue, args.show_display))
-        processes.append(p)
-        p.start()
+        started = start_camera_worker(cam_cfg, config, display_queue, stats_queue, args.show_display)
+        if started:
+            workers[camera_key(cam_cfg)] = started
+            processes.append(started[0])
 
     # If no processes started, exit
     if not processes:
@@ -199,6 +301,11 @@ def run(args):
 
     latest_frames = {}
     active_processes = {p.pid: p for p in processes}
+    stopping = {}  # pid -> (process, deadline, camera key) ของ worker ที่สั่งหยุดแล้วแต่ยังไม่ exit
+    pending_starts = {}  # camera key -> cam_cfg ที่รอ worker ตัวเก่าของกล้องเดียวกัน exit ก่อนเริ่ม
+    all_parking_stats = {}
+    # แก้ config.yaml / ROI (จากหน้าเว็บหรือแก้มือ) มีผลกับกล้องที่ทำงานอยู่โดยไม่ต้อง restart ทั้ง process
+    config_watcher = ConfigWatcher(config_path, config, config.get('config_reload_interval_seconds', 2.0))
 
     try:
         while True:
@@ -256,13 +363,24 @@ def run(args):
                 # still allow graceful stop if all processes finished
                 pass
 
+            plan = config_watcher.poll()
+            if plan:
+                config = config_watcher.config
+                apply_config_changes(plan, config, workers, processes, active_processes, stopping, pending_starts,
+                                     display_queue, stats_queue, args.show_display)
+            drain_stats_queue(stats_queue, all_parking_stats)
+            reap_stopping_workers(stopping)
+            if pending_starts:
+                start_pending_workers(pending_starts, stopping, config, workers, processes, active_processes,
+                                      display_queue, stats_queue, args.show_display)
+
             # cleanup finished processes
             for p in list(active_processes.values()):
                 if not p.is_alive():
                     print(f"[Monitor] Process {p.pid} for camera has finished.")
                     del active_processes[p.pid]
 
-            if not active_processes:
+            if not active_processes and not pending_starts:
                 print("[Monitor] All camera processes have finished.")
                 break
 
@@ -288,14 +406,7 @@ def run(args):
         print("[Monitor] Windows closed.")
 
         # collect stats from stats_queue
-        all_parking_stats = {}
-        while not stats_queue.empty():
-            try:
-                cam_name, stats_data = stats_queue.get_nowait()
-                all_parking_stats[cam_name] = stats_data
-                print(f"[Monitor] Received final stats for {cam_name}")
-            except queue.Empty:
-                break
+        drain_stats_queue(stats_queue, all_parking_stats)
 
         # Save stats if requested
         if all_parking_stats and config.get('save_parking_stats', False):
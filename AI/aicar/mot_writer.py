@@ -0,0 +1,188 @@
+# mot_writer.py
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MotResultWriter:
+    """
+    Buffered, per-camera writer for MOTChallenge results.
+
+    Keeps the output file open for the lifetime of the worker and batches lines in memory.
+    A background thread flushes the buffer when either `flush_max_lines` lines are pending
+    or `flush_interval_s` seconds have passed, so the frame loop never touches the disk.
+
+    Format: <frame>, <id>, <bb_left>, <bb_top>, <bb_width>, <bb_height>, <conf>, <x>, <y>, <z>
+
+    Optional extras:
+        rotate_max_bytes: rotate `mot.txt` once it grows past this size (0 = never).
+        rotate_hourly:    rotate `mot.txt` whenever the wall-clock hour changes.
+        save_npy:         also dump every flushed batch as a float32 .npy chunk
+                          (columns: frame, id, x, y, w, h, conf) for fast reload.
+    """
+
+    NPY_COLUMNS = ('frame', 'id', 'x', 'y', 'w', 'h', 'conf')
+
+    def __init__(self, save_path, flush_max_lines=500, flush_interval_s=2.0,
+                 rotate_max_bytes=0, rotate_hourly=False, save_npy=False):
+        self.save_path = Path(save_path)
+        self.save_path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_max_lines = max(1, int(flush_max_lines))
+        self.flush_interval_s = max(0.05, float(flush_interval_s))
+        self.rotate_max_bytes = int(rotate_max_bytes or 0)
+        self.rotate_hourly = bool(rotate_hourly)
+        self.save_npy = bool(save_npy)
+
+        self.npy_dir = self.save_path.parent / "npy"
+        if self.save_npy:
+            self.npy_dir.mkdir(parents=True, exist_ok=True)
+        self._npy_chunk_idx = len(list(self.npy_dir.glob("mot_*.npy"))) if self.save_npy else 0
+
+        self._lines = []
+        self._rows = []
+        self._buffer_lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+
+        self._file = open(self.save_path, 'a', encoding='utf-8')
+        self._current_hour = self._hour_key()
+
+        self._thread = threading.Thread(target=self._flush_loop, name=f"mot-writer-{self.save_path.parent.name}", daemon=True)
+        self._thread.start()
+
+    # --- public API ---
+    def write(self, frame_idx, tracks_data):
+        """
+        Queues tracks for the given frame. Never blocks on disk I/O.
+        Args:
+            frame_idx (int): Current frame index (0-based, converted to 1-based for MOT).
+            tracks_data (list of dict | np.ndarray): Each dict: {'id': int, 'bbox': [x1,y1,x2,y2], 'conf': float},
+                or an (N, 7) array [x1, y1, x2, y2, id, conf, cls] from extract_zone_tracks.
+        """
+        if self._closed or not len(tracks_data):
+            return
+        mot_frame = frame_idx + 1
+        if isinstance(tracks_data, np.ndarray):
+            self._write_array(mot_frame, tracks_data)
+            return
+        lines, rows = [], []
+        for track in tracks_data:
+            x1, y1, x2, y2 = track['bbox']
+            width = x2 - x1
+            height = y2 - y1
+            conf = track.get('conf', -1)
+            track_id = int(track['id'])
+            lines.append(f"{mot_frame},{track_id},{x1:.2f},{y1:.2f},{width:.2f},{height:.2f},{conf:.2f},-1,-1,-1\n")
+            if self.save_npy:
+                rows.append((mot_frame, track_id, x1, y1, width, height, conf))
+
+        self._enqueue(lines, rows)
+
+    def _write_array(self, mot_frame, tracks):
+        widths = tracks[:, 2] - tracks[:, 0]
+        heights = tracks[:, 3] - tracks[:, 1]
+        lines = [
+            f"{mot_frame},{int(t[4])},{t[0]:.2f},{t[1]:.2f},{w:.2f},{h:.2f},{t[5]:.2f},-1,-1,-1\n"
+            for t, w, h in zip(tracks.tolist(), widths.tolist(), heights.tolist())
+        ]
+        rows = []
+        if self.save_npy:
+            rows = np.column_stack((
+                np.full(len(tracks), mot_frame, dtype=np.float32), tracks[:, 4], tracks[:, 0], tracks[:, 1],
+                widths, heights, tracks[:, 5]
+            )).tolist()
+        self._enqueue(lines, rows)
+
+    def _enqueue(self, lines, rows):
+        with self._buffer_lock:
+            self._lines.extend(lines)
+            self._rows.extend(rows)
+            pending = len(self._lines)
+        if pending >= self.flush_max_lines:
+            self._wakeup.set()
+
+    def flush(self):
+        """Writes all pending lines to disk (called from the background thread and on close)."""
+        with self._buffer_lock:
+            lines, self._lines = self._lines, []
+            rows, self._rows = self._rows, []
+        if not lines:
+            return
+        with self._io_lock:
+            if self._file is None:
+                return
+            self._maybe_rotate()
+            self._file.writelines(lines)
+            self._file.flush()
+            if rows:
+                self._write_npy_chunk(rows)
+
+    def close(self):
+        """Stops the background thread, flushes the remaining buffer and closes the file."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        with self._io_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # --- internals ---
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(timeout=self.flush_interval_s)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Flush failed for {self.save_path}: {e}")
+
+    def _hour_key(self):
+        return datetime.now().strftime("%Y%m%d-%H")
+
+    def _maybe_rotate(self):
+        rotate = False
+        if self.rotate_max_bytes and self._file.tell() >= self.rotate_max_bytes:
+            rotate = True
+        if self.rotate_hourly:
+            hour = self._hour_key()
+            if hour != self._current_hour:
+                self._current_hour = hour
+                rotate = True
+        if not rotate or self._file.tell() == 0:
+            return
+
+        self._file.close()
+        rotated_path = self.save_path.with_name(f"{self.save_path.stem}_{time.strftime('%Y%m%d-%H%M%S')}{self.save_path.suffix}")
+        suffix_idx = 1
+        while rotated_path.exists():
+            rotated_path = self.save_path.with_name(f"{self.save_path.stem}_{time.strftime('%Y%m%d-%H%M%S')}_{suffix_idx}{self.save_path.suffix}")
+            suffix_idx += 1
+        self.save_path.rename(rotated_path)
+        self._file = open(self.save_path, 'a', encoding='utf-8')
+
+    def _write_npy_chunk(self, rows):
+        chunk = np.asarray(rows, dtype=np.float32)
+        np.save(self.npy_dir / f"mot_{self._npy_chunk_idx:06d}.npy", chunk)
+        self._npy_chunk_idx += 1
+
+
+def load_mot_npy(npy_dir):
+    """
+    Loads all .npy chunks written by MotResultWriter(save_npy=True) into a single (N, 7) float32 array.
+    Columns are MotResultWriter.NPY_COLUMNS.
+    """
+    chunks = [np.load(p) for p in sorted(Path(npy_dir).glob("mot_*.npy"))]
+    if not chunks:
+        return np.empty((0, len(MotResultWriter.NPY_COLUMNS)), dtype=np.float32)
+    return np.concatenate(chunks, axis=0)
@@ -0,0 +1,172 @@
+# structured_log.py
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+DEFAULT_SETTINGS = {
+    'stdout_level': 'INFO',
+    'file_level': 'DEBUG',
+    'log_dir': 'runs/logs',
+    'file_max_mb': 20,
+    'file_backup_count': 5,
+    'rate_limit_per_key': 20,
+    'rate_limit_interval_seconds': 10.0,
+    'sample': {},
+}
+
+_STANDARD_ATTRS = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+
+def _level(name, default=logging.INFO):
+    level = logging.getLevelName(str(name).upper())
+    return level if isinstance(level, int) else default
+
+
+def message_key(record):
+    """Rate-limit / sampling key: extra={'key': ...} if given, otherwise the call site."""
+    return getattr(record, 'key', None) or f"{record.name}:{record.lineno}"
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Per-key limits applied before a record is queued, so suppressed records cost no formatting or I/O.
+
+    sample:         {key: fraction} keeps that fraction of the records of a key (0.1 = one in ten on average).
+    max_per_window: records per key and `interval_s` window (0 = unlimited). Records over the limit are
+                    dropped; the first record of the next window carries `suppressed` = how many were dropped.
+    WARNING and above are never sampled or limited.
+    """
+
+    def __init__(self, max_per_window=20, interval_s=10.0, sample=None):
+        super().__init__()
+        self.configure(max_per_window, interval_s, sample)
+        self._windows = {}  # key -> [window_start, passed, suppressed]
+        self.suppressed_total = 0
+
+    def configure(self, max_per_window, interval_s, sample):
+        self.max_per_window = int(max_per_window or 0)
+        self.interval_s = float(interval_s or 10.0)
+        self.sample = dict(sample or {})
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = message_key(record)
+        rate = self.sample.get(key)
+        if rate is not None and random.random() >= rate:
+            return False
+        if self.max_per_window <= 0:
+            return True
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval_s:
+            suppressed = window[2] if window else 0
+            window = self._windows[key] = [now, 0, 0]
+            if suppressed:
+                record.suppressed = suppressed
+        if window[1] >= self.max_per_window:
+            window[2] += 1
+            self.suppressed_total += 1
+            return False
+        window[1] += 1
+        return True
+
+
+class ContextFilter(logging.Filter):
+    """Stamps every record with the process-wide context (the camera of this worker process)."""
+
+    def __init__(self, **context):
+        super().__init__()
+        self.context = context
+
+    def filter(self, record):
+        for name, value in self.context.items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg and every extra={...} field (camera_id, frame_idx, track_id, key, ...)."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for name, value in record.__dict__.items():
+            if name not in _STANDARD_ATTRS and not name.startswith('_'):
+                entry[name] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(camera_id)s] %(message)s', '%H:%M:%S')
+
+    def format(self, record):
+        if not hasattr(record, 'camera_id'):
+            record.camera_id = '-'
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        return f"{text} (+{suppressed} similar suppressed)" if suppressed else text
+
+
+class WorkerLogging:
+    """
+    Logging for one camera worker process.
+
+    Records pass the ContextFilter and RateLimitFilter, then go through a QueueHandler. A
+    QueueListener thread writes them to the console (stdout, which the backend streams to the log
+    console) and to a rotating JSON-lines file. The frame loop never blocks on I/O. The logger level
+    is the lower of the two handler levels, so disabled debug calls return before building a record.
+    apply() changes levels and limits at runtime (config hot-reload).
+    """
+
+    def __init__(self, camera_id, settings=None):
+        settings = {**DEFAULT_SETTINGS, **(settings or {})}
+        self.queue = queue.SimpleQueue()
+        self.console = logging.StreamHandler(sys.stdout)
+        self.console.setFormatter(ConsoleFormatter())
+        log_dir = Path(settings['log_dir'])
+        log_dir.mkdir(parents=True, exist_ok=True)
+        self.file = logging.handlers.RotatingFileHandler(
+            log_dir / f"{camera_id}.jsonl", maxBytes=int(float(settings['file_max_mb']) * 1024 * 1024),
+            backupCount=int(settings['file_backup_count']), encoding='utf-8', delay=True
+        )
+        self.file.setFormatter(JsonFormatter())
+        self.rate_limit = RateLimitFilter()
+        self.handler = logging.handlers.QueueHandler(self.queue)
+        self.handler.addFilter(ContextFilter(camera_id=camera_id))
+        self.handler.addFilter(self.rate_limit)
+        self.listener = logging.handlers.QueueListener(self.queue, self.console, self.file, respect_handler_level=True)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        self.apply(settings)
+        self.listener.start()
+
+    def apply(self, settings=None):
+        settings = {**DEFAULT_SETTINGS, **(settings or {})}
+        stdout_level = _level(settings['stdout_level'])
+        file_level = _level(settings['file_level'], logging.DEBUG)
+        self.console.setLevel(stdout_level)
+        self.file.setLevel(file_level)
+        logging.getLogger().setLevel(min(stdout_level, file_level))
+        self.rate_limit.configure(settings['rate_limit_per_key'], settings['rate_limit_interval_seconds'], settings['sample'])
+
+    def close(self):
+        self.listener.stop()
+        self.file.close()
@@ -81,6 +81,26 @@ def is_point_in_any_polygon(point, polygons):
             return True # ถ้าเจอในโซนใดโซนหนึ่ง ให้คืนค่า True ทันที
     return False # ถ้าไม่เจอในทุกโซน ค่อยคืนค่า False
 
+def build_zone_mask(polygons, width, height):
+    """
+    Rasterizes all parking zone polygons into a (height, width) uint8 mask (1 = inside any zone).
+    Lets many points be tested at once with a single array lookup instead of cv2.pointPolygonTest per point.
+    """
+    mask = np.zeros((int(height), int(width)), dtype=np.uint8)
+    if polygons:
+        cv2.fillPoly(mask, [np.array(p, np.int32).reshape((-1, 1, 2)) for p in polygons if len(p) >= 3], 1)
+    return mask
+
+def points_in_mask(mask, xs, ys):
+    """Vectorized lookup of points (arrays of x and y) in a mask from build_zone_mask. Returns a bool array."""
+    h, w = mask.shape[:2]
+    xi = np.asarray(xs).astype(np.int64)
+    yi = np.asarray(ys).astype(np.int64)
+    inside = (xi >= 0) & (xi < w) & (yi >= 0) & (yi < h)
+    result = np.zeros(xi.shape, dtype=bool)
+    result[inside] = mask[yi[inside], xi[inside]] > 0
+    return result
+
 # ### แก้ไข ###: เปลี่ยนชื่อและตรรกะให้รองรับหลายโซน
 def draw_parking_zones(im, polygons, color=(0, 255, 255), thickness=2):
     """Draws all parking zone polygons on the image."""
@@ -120,20 +140,26 @@ def get_bbox_center(bbox_xyxy):
     x1, y1, x2, y2 = bbox_xyxy
     return ((x1 + x2) / 2, (y1 + y2) / 2)
 
+_clahe_cache = {}
+
 def adjust_brightness_clahe(frame, clipLimit=2.0, tileGridSize=(8,8)):
     """
     Adjusts brightness and contrast using CLAHE (Contrast Limited Adaptive Histogram Equalization).
     Works well for improving local contrast in dark or unevenly lit areas.
+    The CLAHE object is created once per (clipLimit, tileGridSize) and reused.
+    For per-camera auto-selection see brightness.BrightnessAdjuster.
     """
+    key = (clipLimit, tuple(tileGridSize))
+    clahe = _clahe_cache.get(key)
+    if clahe is None:
+        clahe = _clahe_cache[key] = cv2.createCLAHE(clipLimit=clipLimit, tileGridSize=tileGridSize)
     if len(frame.shape) == 3: # Color image
         lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
         l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=clipLimit, tileGridSize=tileGridSize)
         cl = clahe.apply(l)
         limg = cv2.merge((cl, a, b))
         adjusted_frame = cv2.cvtColor(limg, cv2.COLOR_LAB2BGR)
     else: # Grayscale image
-        clahe = cv2.createCLAHE(clipLimit=clipLimit, tileGridSize=tileGridSize)
         adjusted_frame = clahe.apply(frame)
     return adjusted_frame
 
@@ -142,26 +168,9 @@ def adjust_brightness_histogram(frame, alpha=1.0, beta=0):
     Adjusts brightness and contrast using simple alpha-beta scaling.
     alpha: contrast control (1.0-3.0)
     beta: brightness control (0-100)
+    alpha=1, beta=0 is an identity and returns the frame unchanged.
     """
+    if alpha == 1.0 and beta == 0:
+        return frame
     adjusted_frame = cv2.convertScaleAbs(frame, alpha=alpha, beta=beta)
     return adjusted_frame
-
-def write_mot_results(save_path, frame_idx, tracks_data):
-    """
-    Writes tracking results in MOTChallenge format.
-    Format: <frame>, <id>, <bb_left>, <bb_top>, <bb_width>, <bb_height>, <conf>, <x>, <y>, <z>
-    Args:
-        save_path (Path): Path to the output text file.
-        frame_idx (int): Current frame index (0-based, convert to 1-based for MOT).
-        tracks_data (list of dict): List of track info for current frame.
-            Each dict: {'id': int, 'bbox': [x1,y1,x2,y2], 'conf': float}
-    """
-    save_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(save_path, 'a') as f:
-        for track in tracks_data:
-            x1, y1, x2, y2 = track['bbox']
-            width = x2 - x1
-            height = y2 - y1
-            # Assuming conf, x, y, z are not always available or needed for parking
-            conf = track.get('conf', -1)
-            f.write(f"{frame_idx + 1},{int(track['id'])},{x1:.2f},{y1:.2f},{width:.2f},{height:.2f},{conf:.2f},-1,-1,-1\n")
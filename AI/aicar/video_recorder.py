@@ -0,0 +1,159 @@
+# video_recorder.py
+import logging
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+
+class VideoRecorder:
+    """
+    Records processed frames to mp4 off the frame loop.
+
+    Frames go through a bounded queue into a writer thread, so mp4 encoding never runs on the
+    inference path. Two modes are supported:
+        continuous: every frame is written, split into segments of `segment_minutes`.
+        event:      only a ring buffer of the last `pre_roll_seconds` is kept in memory; a call to
+                    trigger() (e.g. on a violation) writes the pre-roll plus everything up to
+                    `post_roll_seconds` after the last trigger into a clip file. The pre-roll is
+                    queued as a single item and is never dropped by queue_policy.
+
+    queue_policy:
+        drop:  if the writer falls behind, new frames are dropped (counted in `dropped_frames`).
+        block: the frame loop waits for the writer instead of losing frames.
+
+    Frames handed to write() must not be modified afterwards (they are queued by reference).
+    """
+
+    MODES = ('continuous', 'event')
+    POLICIES = ('drop', 'block')
+
+    def __init__(self, output_dir, base_name, fps, frame_size, mode='continuous', queue_size=64,
+                 queue_policy='drop', segment_minutes=10, pre_roll_seconds=10, post_roll_seconds=20,
+                 fourcc='mp4v'):
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported recording mode: {mode}")
+        if queue_policy not in self.POLICIES:
+            raise ValueError(f"Unsupported queue policy: {queue_policy}")
+
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.base_name = base_name
+        self.fps = float(fps) if fps and fps > 0 else 30.0
+        self.frame_size = tuple(frame_size)
+        self.mode = mode
+        self.queue_policy = queue_policy
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.segment_frames = int(segment_minutes * 60 * self.fps) if segment_minutes and segment_minutes > 0 else 0
+        self.post_roll_frames = int(post_roll_seconds * self.fps)
+
+        self.dropped_frames = 0
+        self.clips_written = 0
+
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._pre_roll = deque(maxlen=max(1, int(pre_roll_seconds * self.fps)))
+        self._recording_frames_left = 0
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._writer_loop, name=f"video-writer-{base_name}", daemon=True)
+        self._thread.start()
+        if self.mode == 'continuous':
+            self._put_control(('open', 'segment'))
+
+    # --- frame loop side ---
+    def write(self, frame):
+        if self._closed:
+            return
+        if self.mode == 'continuous':
+            self._put_frame(frame)
+            return
+
+        if self._recording_frames_left > 0:
+            self._put_frame(frame)
+            self._recording_frames_left -= 1
+            if self._recording_frames_left == 0:
+                self._put_control(('close',))
+        else:
+            self._pre_roll.append(frame)
+
+    def trigger(self, reason='event'):
+        """Starts (or extends) an event clip. No-op in continuous mode."""
+        if self._closed or self.mode != 'event':
+            return
+        if self._recording_frames_left == 0:
+            self._put_control(('open', reason))
+            # the pre-roll is the evidence of the event: hand it over as one item so it is never dropped
+            if self._pre_roll:
+                self._put_control(('preroll', list(self._pre_roll)))
+                self._pre_roll.clear()
+        self._recording_frames_left = max(self._recording_frames_left, self.post_roll_frames, 1)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=30)
+
+    def _put_frame(self, frame):
+        if self.queue_policy == 'block':
+            self._queue.put(('frame', frame))
+            return
+        try:
+            self._queue.put_nowait(('frame', frame))
+        except queue.Full:
+            self.dropped_frames += 1
+
+    def _put_control(self, item):
+        # open/close must never be dropped, otherwise clips would merge or never end
+        self._queue.put(item)
+
+    # --- writer thread side ---
+    def _new_path(self, tag):
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        safe_tag = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(tag))
+        return self.output_dir / f"{self.base_name}_{safe_tag}_{stamp}.mp4"
+
+    def _writer_loop(self):
+        writer = None
+        tag = None
+        frames_in_file = 0
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            kind = item[0]
+            try:
+                if kind == 'open':
+                    if writer is not None:
+                        writer.release()
+                    tag = item[1]
+                    writer = cv2.VideoWriter(str(self._new_path(tag)), self.fourcc, self.fps, self.frame_size)
+                    frames_in_file = 0
+                elif kind == 'close':
+                    if writer is not None:
+                        writer.release()
+                        writer = None
+                        self.clips_written += 1
+                elif kind == 'preroll' and writer is not None:
+                    if writer.isOpened():
+                        for frame in item[1]:
+                            writer.write(frame)
+                    frames_in_file += len(item[1])
+                elif kind == 'frame' and writer is not None:
+                    if self.segment_frames and frames_in_file >= self.segment_frames:
+                        writer.release()
+                        writer = cv2.VideoWriter(str(self._new_path(tag)), self.fourcc, self.fps, self.frame_size)
+                        frames_in_file = 0
+                    if writer.isOpened():
+                        writer.write(item[1])
+                    frames_in_file += 1
+            except Exception as e:
+                logger.error(f"Error while writing {self.base_name}: {e}")
+        if writer is not None:
+            writer.release()
@@ -0,0 +1,79 @@
+# app/api/compression.py
+"""
+บีบอัด response (Brotli ถ้าติดตั้ง package brotli และ client รองรับ ไม่งั้น gzip)
+
+- เฉพาะ content-type ที่บีบอัดได้ (JSON, NDJSON, CSV, text) และใหญ่กว่า minimum_size
+  JPEG / MJPEG / Parquet / รูปใน /media บีบอัดอยู่แล้ว: ส่งตรงไม่เสีย CPU
+- stream (เช่น /events/export) บีบอัดทีละ chunk และ flush ทุก chunk ผู้รับได้ข้อมูลต่อเนื่องเหมือนเดิม
+- ใช้ responder ของ Starlette GZipMiddleware (จัดการ header, Vary, streaming) เปลี่ยนแค่การเลือก content-type และ encoder
+"""
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+COMPRESSIBLE_CONTENT_TYPES = ("application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html")
+
+
+class _SelectiveMixin:
+    async def send_with_compression(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            await super().send_with_compression(message)
+            self.content_type_is_excluded = not content_type.startswith(COMPRESSIBLE_CONTENT_TYPES)
+            return
+        await super().send_with_compression(message)
+
+
+class _GZipResponder(_SelectiveMixin, GZipResponder):
+    def __init__(self, app: ASGIApp, minimum_size: int, compresslevel: int):
+        super().__init__(app, minimum_size, compresslevel=compresslevel)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if more_body:
+            self.gzip_file.write(body)
+            self.gzip_file.flush()   # Z_SYNC_FLUSH: chunk นี้ถึงผู้รับทันที
+            body = self.gzip_buffer.getvalue()
+            self.gzip_buffer.seek(0)
+            self.gzip_buffer.truncate()
+            return body
+        return super().apply_compression(body, more_body=False)
+
+
+class _BrotliResponder(_SelectiveMixin, IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, brotli, quality: int):
+        super().__init__(app, minimum_size)
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        data = self._compressor.process(body)
+        return data + (self._compressor.flush() if more_body else self._compressor.finish())
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 5, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        try:
+            import brotli  # optional dependency
+        except ImportError:
+            brotli = None
+        self._brotli = brotli
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = {part.split(";")[0].strip().lower() for part in Headers(scope=scope).get("accept-encoding", "").split(",")}
+        if self._brotli is not None and "br" in accepted:
+            responder = _BrotliResponder(self.app, self.minimum_size, self._brotli, self.brotli_quality)
+        elif "gzip" in accepted:
+            responder = _GZipResponder(self.app, self.minimum_size, self.gzip_level)
+        else:
+            await self.app(scope, receive, send)
+            return
+        await responder(scope, receive, send)
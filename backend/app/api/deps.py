@@ -16,4 +16,10 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    if database.AsyncSessionLocal is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Async database driver is not installed.")
+    async with database.AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,41 @@
+# app/api/responses.py
+"""
+JSON encoding ของ response
+
+- ใช้ orjson ถ้าติดตั้งไว้ (เร็วกว่า jsonable_encoder + json.dumps หลายเท่ากับ list หลายร้อยแถว)
+  ไม่มีก็ใช้ serializer ของ pydantic-core ผลลัพธ์ byte ต่อ byte เหมือนกับ Pydantic model เดิม
+  (datetime UTC ลงท้าย Z, UTF-8 ไม่ escape)
+- FastJSONResponse เป็น default_response_class ของ app; response_cache ใช้ dumps() ตัวเดียวกัน
+"""
+from decimal import Decimal
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+try:
+    import orjson  # optional dependency
+except ImportError:
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """ชนิดที่ orjson ไม่รู้จัก (Pydantic model, Decimal จาก SUM/AVG ของ Postgres, ...)"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return jsonable_encoder(obj)
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+    return to_json(content)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
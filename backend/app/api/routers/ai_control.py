@@ -1,13 +1,14 @@
 # app/api/routers/ai_control_router.py  (แก้/สร้างไฟล์นี้)
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
 from app.api.routers.config_router import validate_rois
+from app.services.log_stream import log_stream
 from pydantic import BaseModel
 import asyncio
 import subprocess
 import signal
 import sys
 from pathlib import Path
-from typing import Set, Optional, List
+from typing import Optional, List
 import os
 
 router = APIRouter(tags=["AI Control"])
@@ -19,57 +20,10 @@ CONFIG_FILE_PATH = Path(__file__).resolve().parent.parent.parent.parent / "confi
 # หา python executable: ใช้ sys.executable ก่อน (ครอบคลุม virtualenv / venv), fallback ถ้าจำเป็น
 PYTHON_EXE = Path(sys.executable) if sys.executable else Path(os.path.join(sys.prefix, "python.exe"))
 
-# === WS manager for log streaming ===
-class WSManager:
-    def __init__(self):
-        self.active: Set[WebSocket] = set()
-        self.lock = asyncio.Lock()
-
-    async def connect(self, ws: WebSocket):
-        await ws.accept()
-        async with self.lock:
-            self.active.add(ws)
-
-    async def disconnect(self, ws: WebSocket):
-        async with self.lock:
-            self.active.discard(ws)
-
-    async def broadcast(self, text: str):
-        async with self.lock:
-            dead = []
-            for ws in list(self.active):
-                try:
-                    await ws.send_text(text)
-                except Exception:
-                    dead.append(ws)
-            for ws in dead:
-                self.active.discard(ws)
-
-ws_manager = WSManager()
-
-# === global process state & log queue ===
+# === global process state ===
 PROCESS: Optional[subprocess.Popen] = None
-LOG_QUEUE: asyncio.Queue[str] = asyncio.Queue()
 READER_TASKS: List[asyncio.Task] = []
 
-# read stream and push lines into LOG_QUEUE
-async def _read_stream(stream, name: str):
-    loop = asyncio.get_running_loop()
-    while True:
-        # read line in thread pool to avoid blocking the event loop
-        line = await loop.run_in_executor(None, stream.readline)
-        if not line:
-            break
-        # ensure we strip trailing newline for nicer messages
-        await LOG_QUEUE.put(f"[{name}] {line.rstrip()}")
-    await LOG_QUEUE.put(f"[{name}] -- stream closed --")
-
-# pump log queue to all WS clients
-async def _pump_to_websocket():
-    while True:
-        line = await LOG_QUEUE.get()
-        await ws_manager.broadcast(line)
-
 # Pydantic model for start options
 class StartOptions(BaseModel):
     show_display: Optional[bool] = False
@@ -119,11 +73,11 @@ async def start_ai(options: StartOptions):
         error_message = "ไม่สามารถเริ่ม AI ได้ พบปัญหากับ ROI ของกล้อง:\n" + "\n".join(f"  - {msg}" for msg in invalid_cameras)
         
         # ส่งข้อความ Error นี้ไปที่ Log Console ผ่าน WebSocket ก่อน
-        await ws_manager.broadcast(f"[ERROR] {error_message}")
+        log_stream.publish(f"[ERROR] {error_message}")
         
         # ส่ง HTTP Error กลับไปให้ Frontend เพื่อหยุดการทำงาน
         raise HTTPException(status_code=400, detail=error_message)
-    await ws_manager.broadcast("=== AI Process Starting... ===")
+    log_stream.publish("=== AI Process Starting... ===")
     # config_path = Path(options.config_file_path) if options.config_file_path else CONFIG_FILE_PATH
     if not AI_DIR.exists():
         raise HTTPException(status_code=400, detail=f"AI_DIR not found: {AI_DIR}")
@@ -146,8 +100,7 @@ async def start_ai(options: StartOptions):
             cwd=str(AI_DIR),
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            bufsize=1,
-            text=True,
+            bufsize=0,  # อ่านเป็น byte ทีละ chunk (log_stream.read_pipe)
             creationflags=creationflags
         )
     except Exception as e:
@@ -157,13 +110,12 @@ async def start_ai(options: StartOptions):
     # start tasks to read stdout/stderr
     loop = asyncio.get_running_loop()
     READER_TASKS = [
-        loop.create_task(_read_stream(PROCESS.stdout, "STDOUT")),
-        loop.create_task(_read_stream(PROCESS.stderr, "STDERR")),
+        loop.create_task(log_stream.read_pipe(PROCESS.stdout, "STDOUT")),
+        loop.create_task(log_stream.read_pipe(PROCESS.stderr, "STDERR")),
     ]
 
     # notify clients
-    await ws_manager.broadcast(f"=== AI Process Started (pid={PROCESS.pid}) ===")
-    await ws_manager.broadcast(f"Command: {' '.join(cmd)}")
+    log_stream.publish(f"=== AI Process Started (pid={PROCESS.pid}) ===", f"Command: {' '.join(cmd)}")
 
     return {"status": "success", "pid": PROCESS.pid, "command": cmd}
 
@@ -181,12 +133,12 @@ async def stop_ai():
         else:
             PROCESS.terminate()
     except Exception as e:
-        await ws_manager.broadcast(f"[STOP] Failed to signal process: {e}")
+        log_stream.publish(f"[STOP] Failed to signal process: {e}")
 
     try:
         await asyncio.wait_for(asyncio.to_thread(PROCESS.wait), timeout=10)
     except asyncio.TimeoutError:
-        await ws_manager.broadcast("[STOP] Graceful stop timeout. Killing process...")
+        log_stream.publish("[STOP] Graceful stop timeout. Killing process...")
         try:
             PROCESS.kill()
         except Exception:
@@ -202,7 +154,7 @@ async def stop_ai():
     READER_TASKS = []
     PROCESS = None
 
-    await ws_manager.broadcast("=== AI Process Stopped ===")
+    log_stream.publish("=== AI Process Stopped ===")
     return {"status": "success", "message": "AI stopped"}
 
 # === Status endpoint ===
@@ -213,25 +165,35 @@ async def ai_status():
     return {"status": "running", "pid": PROCESS.pid}
 
 # === WebSocket for logs ===
+async def _send_logs(websocket: WebSocket, client):
+    # ข้อความหนึ่งอาจมีหลายบรรทัด (คั่นด้วย \n): log ย้อนหลังจาก ring buffer ก่อน แล้วตาม batch ใหม่
+    while True:
+        text, _ = await client.queue.get()
+        await websocket.send_text(text)
+
+
 @router.websocket("/ws/ai-logs")
 async def ai_logs_ws(websocket: WebSocket):
-    await ws_manager.connect(websocket)
+    await websocket.accept()
+    await websocket.send_text("--- Connected to AI Log Stream ---")
+    client = log_stream.subscribe()
+    sender = asyncio.create_task(_send_logs(websocket, client))
     try:
-        await websocket.send_text("--- Connected to AI Log Stream ---")
-        # don't consume LOG_QUEUE here; _pump_to_websocket handles broadcasting,
-        # here simply keep the connection open and optionally receive pings
-        while True:
-            try:
-                await asyncio.wait_for(websocket.receive_text(), timeout=30)
-            except asyncio.TimeoutError:
-                # loop, waiting for client keepalive or disconnection
-                continue
+        # รับ keepalive ping จาก client จนกว่าจะหลุด (receive_text raise WebSocketDisconnect)
+        while not sender.done():
+            receiver = asyncio.create_task(websocket.receive_text())
+            await asyncio.wait({receiver, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if not receiver.done():
+                receiver.cancel()
+                break
+            receiver.result()
     except WebSocketDisconnect:
         pass
     finally:
-        await ws_manager.disconnect(websocket)
+        sender.cancel()
+        log_stream.unsubscribe(client)
 
-# startup: run background task to pump logs to websocket clients
+# startup: run background task to batch logs to websocket clients
 @router.on_event("startup")
 async def _on_startup():
-    asyncio.create_task(_pump_to_websocket())
+    asyncio.create_task(log_stream.run())
@@ -1,110 +1,323 @@
 # app/api/routers/analytics.py
-import boto3
+import asyncio
 import uuid
 import json
-from fastapi import APIRouter, Depends, HTTPException, status, Form, File, UploadFile
-from sqlalchemy.orm import Session
+import time
+from fastapi import APIRouter, Depends, HTTPException, status, Form, File, UploadFile, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
-from typing import Optional
+from typing import Dict, List, Optional
 from app import database, schemas
-from app.api.deps import get_db, verify_api_key
+from app.api.deps import get_async_db, verify_api_key
+from app.services.kpi_hub import kpi_hub
+from app.services.latency import latency_registry
+from app.services.object_store import image_uploads
+from app.services.response_cache import response_cache
+from app.services import rollup
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/analytics", tags=["Analytics"],dependencies=[Depends(verify_api_key)])
 
-# --- 🔽 2. ตั้งค่าการเชื่อมต่อ S3 🔽 ---
-# *** จะย้ายค่าเหล่านี้ไปเก็บในไฟล์ config หรือ .env ในอนาคต ***
-S3_BUCKET_NAME = "carparkinglopayahc" # ⬅️⬅️⬅️ **เปลี่ยนเป็นชื่อ BUCKET ของคุณ**
-S3_REGION = "ap-southeast-2" # ⬅️ **เปลี่ยนเป็น REGION ของคุณ (ถ้าไม่ใช่สิงคโปร์)**
-# สร้าง S3 client แค่ครั้งเดียวตอนเริ่มต้น
-s3_client = boto3.client("s3", region_name=S3_REGION)
+# ค่าการเชื่อมต่อ S3 / local storage อยู่ใน app/core/config.py (OBJECT_STORE_BACKEND, S3_BUCKET_NAME, ...)
+
+def _record_ingest_latency(payload: schemas.AnalyticsDataIn, received_ts: float):
+    """บันทึก latency ของแต่ละช่วง (worker hops, upload, DB insert, detect -> visible) จาก trace ที่ worker แนบมา"""
+    trace = payload.trace
+    if trace is None:
+        return
+    event = payload.parking_violation or payload.table_occupancy or payload.chilled_basket_alert
+    camera_id = event.camera_id if event else None
+    committed_ts = time.time()
+    latency_registry.record_worker_hops(trace.hops_ms, camera_id)
+    if trace.sent_ts is not None:
+        latency_registry.record("upload", (received_ts - trace.sent_ts) * 1000.0, camera_id)
+    latency_registry.record("db_insert", (committed_ts - received_ts) * 1000.0, camera_id)
+    latency_registry.record_since("event_capture_to_commit", trace.capture_ts, camera_id, now=committed_ts)
+    if payload.parking_violation and payload.parking_violation.is_violation:
+        latency_registry.record_since("violation_detect_to_visible", trace.capture_ts, camera_id, now=committed_ts)
+
+async def _commit_item(db: AsyncSession, db_item, rollup_deltas: Optional[rollup.RollupDeltas] = None):
+    db.add(db_item)
+    if rollup_deltas is not None:
+        await rollup.apply_deltas(db, rollup_deltas)
+    await db.commit()
+    return db_item.id
+
+def _notify_kpi(update, *args):
+    """อัปเดต KPI สดหลัง commit: ผิดพลาดแค่ log (ตอบ 500 หลัง commit แล้ว worker จะส่ง event ซ้ำ)"""
+    try:
+        update(*args)
+    except Exception:
+        logger.exception("Live KPI update after commit failed:")
+
+def _set_violation_image_url(record_id: int, image_url: str, loop: asyncio.AbstractEventLoop):
+    """เรียกจาก upload thread เมื่ออัปโหลดเสร็จ จึงต้องเปิด session ของตัวเอง (ล้าง cache ผ่าน event loop ของ app)"""
+    db = database.SessionLocal()
+    try:
+        db_item = db.get(database.DBParkingViolation, record_id)
+        if db_item is None:
+            return
+        db_item.image_url = image_url
+        touched = (db_item.branch_id, db_item.timestamp)
+        db.commit()
+        asyncio.run_coroutine_threadsafe(response_cache.invalidate_rows([touched]), loop)
+    finally:
+        db.close()
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.InferenceResultResponse)
 async def create_inference_result(
     # เปลี่ยนจากการรับ JSON body (data: ...) มาเป็นการรับ Form data
     data: str = Form(..., description="A JSON string representing the analytics data."),
     image: Optional[UploadFile] = File(None, description="An optional image file for parking violations."),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     logger.info("Received analytics data via multipart/form-data")
-    image_url = None # เตรียมตัวแปรสำหรับเก็บ URL ของรูปภาพ
+    received_ts = time.time()
+    image_bytes, image_content_type = None, None
 
     try:
         # แปลง JSON string ที่ได้รับจาก Form กลับมาเป็น Pydantic object
         payload = schemas.AnalyticsDataIn.model_validate_json(data)
         
-        db_item, message = None, "No valid analytics data provided"
+        db_item, message, rollup_deltas = None, "No valid analytics data provided", None
 
         # --- ส่วนของ Parking Violation จะถูกแก้ไขเป็นพิเศษ ---
         if payload.parking_violation:
             logger.info("Processing parking violation...")
             
-            # 4. ตรวจสอบว่ามีไฟล์รูปภาพส่งมาพร้อมกับ violation หรือไม่
+            # อ่านรูปไว้ก่อน (async) แต่ยังไม่อัปโหลด: บันทึก row ทันทีแล้วค่อยเติม image_url ตอนอัปโหลดเสร็จ
             if image:
-                try:
-                    # สร้างชื่อไฟล์ใหม่ที่ไม่ซ้ำกัน
-                    unique_filename = f"violations/{uuid.uuid4()}.jpg"
-
-                    # อัปโหลดไฟล์ไปยัง S3
-                    s3_client.upload_fileobj(
-                        image.file,
-                        S3_BUCKET_NAME,
-                        unique_filename,
-                        ExtraArgs={'ContentType': image.content_type}
-                    )
-                    
-                    # สร้าง URL ของรูปภาพที่เข้าถึงได้แบบสาธารณะ
-                    image_url = f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{unique_filename}"
-                    logger.info(f"Image uploaded to S3. URL: {image_url}")
-
-                except Exception as s3_error:
-                    logger.error(f"Failed to upload image to S3: {s3_error}")
-                    # อาจจะแจ้งเตือน แต่ยังคงบันทึกข้อมูลต่อไปโดยไม่มี URL รูป
-                    # หรือจะให้ล้มเหลวไปเลยก็ได้
-                    # raise HTTPException(status_code=500, detail="Image upload failed.")
-
-            # 5. สร้าง DB Object และ **บันทึก image_url แทน image_base64**
-            # **สำคัญ:** ต้องแน่ใจว่า database.py และ schemas.py ของคุณ
-            # เปลี่ยนจาก image_base64 เป็น image_url (ชนิด String/Text) แล้ว
+                image_bytes = await image.read()
+                image_content_type = image.content_type
+
             violation_dict = payload.parking_violation.model_dump()
-            violation_dict['image_url'] = image_url # เพิ่ม URL เข้าไปใน dictionary
-            
+            violation_dict['image_url'] = None
             db_item = database.DBParkingViolation(**violation_dict)
-            db.add(db_item)
+            rollup_deltas = rollup.RollupDeltas()
+            rollup_deltas.add(violation_dict)
             message = "Parking violation data received."
 
         # --- ส่วนอื่นๆ ยังคงทำงานเหมือนเดิม ---
         elif payload.table_occupancy:
             db_item = database.DBTableOccupancy(**payload.table_occupancy.model_dump())
-            db.add(db_item)
             message = "Table occupancy data received."
         elif payload.chilled_basket_alert:
             db_item = database.DBChilledBasketAlert(**payload.chilled_basket_alert.model_dump())
-            db.add(db_item)
             message = "Chilled basket alert data received."
         else:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No valid analytics data provided.")
 
-        db.commit()
-        db.refresh(db_item)
-        return {"message": message, "id": db_item.id}
+        record_id = await _commit_item(db, db_item, rollup_deltas)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
-        logging.exception(f"Error processing analytics data:")
-        logger.info(f"\n--- DEBUG ERROR START ---")
-        logger.info(f"Type of error: {type(e)}")
-        logger.info(f"Error details: {e}")
-        import traceback
-        traceback.print_exc()
-        logger.info(f"--- DEBUG ERROR END ---\n")
+        await db.rollback()
+        logger.exception("Error processing analytics data:")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,detail=f"Failed to process inference result: {e}")
+
+    # row ถูก commit แล้ว: ถ้าตอบ 500 จากตรงนี้ worker จะส่ง event ซ้ำเป็น row ใหม่
+    try:
+        _record_ingest_latency(payload, received_ts)
+        if payload.parking_violation:
+            await response_cache.invalidate_rows([(db_item.branch_id, db_item.timestamp)])
+            _notify_kpi(kpi_hub.events_ingested, [(record_id, violation_dict)])
+
+        if image_bytes:
+            key = f"violations/{uuid.uuid4()}.jpg"
+            loop = asyncio.get_running_loop()
+            on_uploaded = lambda url, rid=record_id: _set_violation_image_url(rid, url, loop)
+            if not image_uploads.submit(key, image_bytes, image_content_type, on_uploaded):
+                # คิวเต็ม: อัปโหลดแบบรอผลใน threadpool (หน่วงเฉพาะ request นี้ ไม่ใช่ทั้ง loop)
+                logger.warning("Image upload queue is full; uploading inline for this request.")
+                await run_in_threadpool(image_uploads.upload_now, key, image_bytes, image_content_type, on_uploaded)
+    except Exception:
+        logger.exception(f"Post-commit step failed for analytics record {record_id}:")
+
+    return {"message": message, "id": record_id}
     
+# --- Batch ingest ---
+# ตารางปลายทางของแต่ละ field ใน AnalyticsDataIn
+_EVENT_TABLES = (
+    ("parking_violation", database.DBParkingViolation),
+    ("table_occupancy", database.DBTableOccupancy),
+    ("chilled_basket_alert", database.DBChilledBasketAlert),
+)
+
+def _parse_event_lines(text: str) -> List[schemas.AnalyticsDataIn]:
+    payloads = []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            payloads.append(schemas.AnalyticsDataIn.model_validate_json(line))
+        except ValidationError as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Line {line_no}: {e.errors()}")
+    if not payloads:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No analytics events provided.")
+    return payloads
+
+async def _bulk_insert(db: AsyncSession, payloads: List[schemas.AnalyticsDataIn], image_urls: Dict[int, str]) -> List[int]:
+    """Insert ทีละตารางด้วย executemany + RETURNING (เรียงตามลำดับ parameter) พร้อม rollup แล้ว commit ครั้งเดียว"""
+    ids: List[Optional[int]] = [None] * len(payloads)
+    rollup_deltas = rollup.RollupDeltas()
+    try:
+        for field, model in _EVENT_TABLES:
+            positions, rows = [], []
+            for idx, payload in enumerate(payloads):
+                event = getattr(payload, field)
+                if event is None:
+                    continue
+                row = event.model_dump()
+                if field == "parking_violation":
+                    row["image_url"] = image_urls.get(idx)
+                    rollup_deltas.add(row)
+                positions.append(idx)
+                rows.append(row)
+            if not rows:
+                continue
+            result = await db.execute(insert(model).returning(model.id, sort_by_parameter_order=True), rows)
+            for idx, record_id in zip(positions, result.scalars().all()):
+                ids[idx] = record_id
+        await rollup.apply_deltas(db, rollup_deltas)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return ids
+
+@router.post("/batch", status_code=status.HTTP_201_CREATED, response_model=schemas.BatchInferenceResultResponse)
+async def create_inference_results_batch(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    รับหลาย event ในครั้งเดียว (ใช้ตอน worker ส่งข้อมูลที่ค้างหลังระบบล่ม)
+
+    - `application/x-ndjson` (หรือ text/plain): body เป็น JSON lines, แต่ละบรรทัดคือ AnalyticsDataIn
+    - `multipart/form-data`: field `events` เป็น JSON lines และแนบรูปเป็นไฟล์ได้หลายไฟล์
+      บรรทัดที่มี `image_ref` ตรงกับชื่อไฟล์ที่แนบมาจะอัปโหลดรูปนั้น ถ้า `image_ref` เป็น URL จะบันทึกเป็น image_url ตรง ๆ
+
+    คืน `ids` ตามลำดับบรรทัดที่ส่งมา เพื่อให้ worker จับคู่ db_record_id สำหรับ PATCH ภายหลัง
+    """
+    received_ts = time.time()
+    images: Dict[str, StarletteUploadFile] = {}
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        events_text = form.get("events")
+        if not isinstance(events_text, str):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing 'events' form field.")
+        for part in form.getlist("images"):
+            if isinstance(part, StarletteUploadFile) and part.filename:
+                images[part.filename] = part
+    else:
+        events_text = (await request.body()).decode("utf-8")
+
+    payloads = _parse_event_lines(events_text)
+    if any(p.parking_violation is None and p.table_occupancy is None and p.chilled_basket_alert is None for p in payloads):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Every line must contain one analytics event.")
+
+    image_urls: Dict[int, str] = {}
+    pending_uploads = []
+    for idx, payload in enumerate(payloads):
+        ref = payload.image_ref
+        if not ref or payload.parking_violation is None:
+            continue
+        if ref in images:
+            pending_uploads.append((idx, await images[ref].read(), images[ref].content_type))
+        elif ref.startswith(("http://", "https://")):
+            image_urls[idx] = ref
+        else:
+            logger.warning(f"Batch line {idx + 1}: image_ref '{ref}' not found in the bundle; storing without image.")
+
+    try:
+        ids = await _bulk_insert(db, payloads, image_urls)
+    except Exception as e:
+        logger.exception("Error processing analytics batch:")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to process analytics batch: {e}")
+
+    for payload in payloads:
+        _record_ingest_latency(payload, received_ts)
+    await response_cache.invalidate_rows(
+        (p.parking_violation.branch_id, p.parking_violation.timestamp) for p in payloads if p.parking_violation
+    )
+    _notify_kpi(
+        kpi_hub.events_ingested,
+        [(record_id, p.parking_violation.model_dump()) for record_id, p in zip(ids, payloads) if p.parking_violation],
+    )
+
+    loop = asyncio.get_running_loop()
+    for idx, image_bytes, content_type in pending_uploads:
+        key = f"violations/{uuid.uuid4()}.jpg"
+        on_uploaded = lambda url, rid=ids[idx]: _set_violation_image_url(rid, url, loop)
+        if not image_uploads.submit(key, image_bytes, content_type, on_uploaded):
+            await run_in_threadpool(image_uploads.upload_now, key, image_bytes, content_type, on_uploaded)
+
+    logger.info(f"Batch ingest stored {len(ids)} analytics events.")
+    return {"message": f"{len(ids)} analytics events received.", "ids": ids}
+
+async def _bulk_update_exit_times(db: AsyncSession, items: List[schemas.ParkingViolationBatchUpdate]):
+    model = database.DBParkingViolation
+    requested = {item.record_id for item in items}
+    records = {r.id: r for r in (await db.execute(select(model).where(model.id.in_(requested)))).scalars().all()}
+    rollup_deltas = rollup.RollupDeltas()
+    updated = []
+    for item in items:
+        record = records.get(item.record_id)
+        if record is None:
+            continue
+        before = rollup.snapshot(record)
+        record.exit_time = item.exit_time
+        record.duration_minutes = item.duration_minutes
+        rollup_deltas.add_change(before, record)
+        updated.append(record.id)
+    if updated:
+        # flush ของ ORM รวม UPDATE by primary key เป็น executemany
+        await rollup.apply_deltas(db, rollup_deltas)
+        await db.commit()
+        await response_cache.invalidate_rows((records[rid].branch_id, records[rid].timestamp) for rid in updated)
+        _notify_kpi(kpi_hub.exits_recorded, updated)
+    return updated, sorted(requested - set(records))
+
+@router.patch("/batch", response_model=schemas.BatchUpdateResponse, summary="Bulk update Parking Violation exit times")
+async def update_violation_exit_times_batch(
+    items: List[schemas.ParkingViolationBatchUpdate],
+    db: AsyncSession = Depends(get_async_db)
+):
+    """อัปเดต exit_time / duration_minutes หลาย record ในครั้งเดียว (คู่กับ POST /batch)"""
+    if not items:
+        return {"updated": [], "not_found": []}
+    try:
+        updated, not_found = await _bulk_update_exit_times(db, items)
+    except Exception as e:
+        await db.rollback()
+        logger.exception("Error processing bulk exit time update:")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to update records: {e}")
+    if not_found:
+        logger.warning(f"Bulk update: records not found: {not_found}")
+    return {"updated": updated, "not_found": not_found}
+
+async def _update_exit_time(db: AsyncSession, record_id: int, data: schemas.ParkingViolationUpdate) -> bool:
+    db_item = await db.get(database.DBParkingViolation, record_id)
+    if not db_item:
+        return False
+    before = rollup.snapshot(db_item)
+    db_item.exit_time = data.exit_time
+    db_item.duration_minutes = data.duration_minutes
+    rollup_deltas = rollup.RollupDeltas()
+    rollup_deltas.add_change(before, db_item)
+    await rollup.apply_deltas(db, rollup_deltas)
+    await db.commit()
+    await response_cache.invalidate_rows([(db_item.branch_id, db_item.timestamp)])
+    _notify_kpi(kpi_hub.exits_recorded, [record_id])
+    return True
+
 @router.patch("/{record_id}", status_code=status.HTTP_200_OK, summary="Update Parking Violation Exit Time")
 async def update_violation_exit_time(
     record_id: int,
     data: schemas.ParkingViolationUpdate, # <-- ใช้ Schema ใหม่จาก schemas.py
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Endpoint สำหรับ "อัปเดต" record ของรถที่เคยทำผิดกฎไปแล้ว
@@ -112,18 +325,12 @@ async def update_violation_exit_time(
     """
     logger.info(f"Received request to update record ID: {record_id}")
     
-    # 1. ค้นหา record เดิมจาก ID
-    db_item = db.query(database.DBParkingViolation).filter(database.DBParkingViolation.id == record_id).first()
+    # 1-3. ค้นหา record เดิมจาก ID แล้วอัปเดต
+    updated = await _update_exit_time(db, record_id, data)
     
-    # 2. ตรวจสอบว่าเจอ record หรือไม่
-    if not db_item:
+    if not updated:
         logger.warning(f"Record with ID {record_id} not found for update.")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Record with id {record_id} not found")
-
-    # 3. อัปเดตข้อมูล
-    db_item.exit_time = data.exit_time
-    db_item.duration_minutes = data.duration_minutes
-    db.commit()
     
     logger.info(f"Record {record_id} updated successfully.")
-    return {"message": f"Record {record_id} updated successfully."}  
\ No newline at end of file
+    return {"message": f"Record {record_id} updated successfully."}
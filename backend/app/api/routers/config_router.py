@@ -1,22 +1,25 @@
 # app/api/routers/config_router.py
 from fastapi import APIRouter, HTTPException, Response, status,  Query
 from fastapi.responses import JSONResponse
-import yaml
 from pydantic import BaseModel, Field
 from typing import List, Literal, Dict, Optional
 from pathlib import Path as PPath
 from pathlib import Path
 import re
 import urllib.parse
-import cv2
 import json
+import copy
 import logging
+import time
+
+from app.services.config_store import config_store
+from app.services.snapshots import snapshot_service
 
 router = APIRouter()
 
 # # กำหนด Path ของไฟล์ config.yaml แบบ Relative
 # path_to_config_file = PPath(__file__).resolve().parent.parent.parent.parent / "config.yaml"
-path_to_config_file = PPath(__file__).resolve().parent.parent.parent.parent.parent / "config.yaml"
+path_to_config_file = config_store.path
 print(f"🧭 Config file path: {path_to_config_file}")
 
 # ===================
@@ -41,6 +44,60 @@ class PerformanceSettings(BaseModel):
     draw_bounding_box: bool
 
 
+class BrightnessSettings(BaseModel):
+    clahe_clip_limit: float = Field(default=2.0, gt=0.0)
+    clahe_tile_grid_size: List[int] = Field(default_factory=lambda: [8, 8], min_items=2, max_items=2)
+    alpha: float = Field(default=1.0, gt=0.0)
+    beta: float = 0
+    target_min: int = Field(default=80, ge=0, le=255)
+    target_max: int = Field(default=170, ge=0, le=255)
+    min_contrast: int = Field(default=40, ge=0, le=255)
+    dark_threshold: int = Field(default=60, ge=0, le=255)
+    night_hours: Optional[List[int]] = Field(default=None, description="[start_hour, end_hour] ช่วงกลางคืน เช่น [19, 6]")
+    reevaluate_every_frames: int = Field(default=30, ge=1)
+
+
+class VideoRecordingSettings(BaseModel):
+    mode: Literal['continuous', 'event'] = 'continuous'
+    queue_size: int = Field(default=64, ge=1)
+    queue_policy: Literal['drop', 'block'] = 'drop'
+    segment_minutes: float = Field(default=10, ge=0, description="0 = ไม่แบ่งไฟล์")
+    pre_roll_seconds: float = Field(default=10, ge=0)
+    post_roll_seconds: float = Field(default=20, ge=0)
+
+
+class MotSettings(BaseModel):
+    flush_max_lines: int = Field(default=500, ge=1)
+    flush_interval_seconds: float = Field(default=2.0, gt=0.0)
+    rotate_max_mb: float = Field(default=0, ge=0, description="0 = ไม่หมุนไฟล์ตามขนาด")
+    rotate_hourly: bool = False
+    save_npy: bool = False
+
+
+class FrameUplinkSettings(BaseModel):
+    enabled: bool = True
+    url: str = "ws://127.0.0.1:8000/api/ws/ingest"
+    jpeg_quality: int = Field(default=80, ge=1, le=100)
+    reconnect_seconds: float = Field(default=2.0, gt=0.0)
+    telemetry_interval_seconds: float = Field(default=5.0, gt=0.0)
+    # ผู้ชมที่ซ่อนแผงวิดีโอ / สลับแท็บ ได้ภาพย่อความถี่ต่ำแทนภาพสด
+    thumbnail_fps: float = Field(default=1.0, gt=0.0)
+    thumbnail_width: int = Field(default=320, ge=16)
+    thumbnail_quality: int = Field(default=60, ge=1, le=100)
+
+
+class LoggingSettings(BaseModel):
+    # ระดับ log ที่ออก stdout (log console บนหน้าเว็บ) / ไฟล์ JSON lines ของแต่ละกล้อง: เปลี่ยนระหว่างทำงานได้
+    stdout_level: Literal['DEBUG', 'INFO', 'WARNING', 'ERROR'] = 'INFO'
+    file_level: Literal['DEBUG', 'INFO', 'WARNING', 'ERROR'] = 'DEBUG'
+    log_dir: str = "runs/logs"
+    file_max_mb: float = Field(default=20, gt=0)
+    file_backup_count: int = Field(default=5, ge=0)
+    rate_limit_per_key: int = Field(default=20, ge=0, description="ข้อความต่อ key ต่อช่วงเวลา (0 = ไม่จำกัด)")
+    rate_limit_interval_seconds: float = Field(default=10.0, gt=0.0)
+    sample: Dict[str, float] = Field(default_factory=dict, description="key -> สัดส่วนที่เก็บ เช่น {'tracker.reassociate': 0.1}")
+
+
 class ConfigModel(BaseModel):
     model_path: str
     yolo_model: str
@@ -71,9 +128,15 @@ class ConfigModel(BaseModel):
     display_combined_max_height: int
     queue_max_size: int
     save_video: bool
+    video_recording: VideoRecordingSettings = Field(default_factory=VideoRecordingSettings)
     save_mot_results: bool
+    mot_settings: MotSettings = Field(default_factory=MotSettings)
+    frame_uplink: FrameUplinkSettings = Field(default_factory=FrameUplinkSettings)
+    config_reload_interval_seconds: float = Field(default=2.0, ge=0, description="ความถี่ที่ AI ตรวจ config / ROI ที่แก้ระหว่างทำงาน (0 = ปิด)")
+    logging: LoggingSettings = Field(default_factory=LoggingSettings)
     enable_brightness_adjustment: bool
-    brightness_method: Literal['clahe', 'histogram']
+    brightness_method: Literal['clahe', 'histogram', 'gamma', 'auto']
+    brightness_settings: BrightnessSettings = Field(default_factory=BrightnessSettings)
     video_sources: List[VideoSource]
     performance_settings: PerformanceSettings
     reid_iou_threshold: float = 0.3
@@ -97,11 +160,7 @@ backend_override = {
 # === Helper Functions ===
 def load_config() -> ConfigModel:
     """โหลด config.yaml และแปลงเป็น ConfigModel"""
-    if not path_to_config_file.exists():
-        raise FileNotFoundError(f"Config file not found: {path_to_config_file}")
-    with open(path_to_config_file, "r", encoding="utf-8") as f:
-        raw_data = yaml.safe_load(f) or {}
-    return ConfigModel(**raw_data)
+    return ConfigModel(**config_store.data())
 
 
 def get_merged_config_dict() -> dict:
@@ -116,8 +175,7 @@ def validate_rois():
     """
     invalid_cameras = []
     try:
-        with open(path_to_config_file, "r", encoding="utf-8") as f:
-            config = yaml.safe_load(f)
+        config = config_store.data()
 
         video_sources = config.get("video_sources", [])
         if not video_sources:
@@ -150,10 +208,9 @@ def validate_rois():
                     invalid_cameras.append(f"'{camera_identifier}' (ROI file is empty)")
                     continue
 
-                with open(roi_file_path, 'r', encoding='utf-8') as f:
-                    polygons = json.load(f)
-                    if not isinstance(polygons, list) or not polygons:
-                        invalid_cameras.append(f"'{camera_identifier}' (ROI file contains no valid polygons)")
+                polygons = config_store.roi(roi_file_path)
+                if not isinstance(polygons, list) or not polygons:
+                    invalid_cameras.append(f"'{camera_identifier}' (ROI file contains no valid polygons)")
             except (json.JSONDecodeError, ValueError):
                 invalid_cameras.append(f"'{camera_identifier}' (ROI file is not a valid JSON)")
 
@@ -186,17 +243,23 @@ def resolve_parking_zone_file_path(parking_zone_filename: str) -> PPath:
         return ai_folder_path / parking_zone_filename
 
 
+def _camera_roi_path(camera_id: str) -> Optional[PPath]:
+    """path ของไฟล์ ROI ของกล้อง; None ถ้าไม่มีกล้องนี้หรือไม่ได้กำหนด parking_zone_file"""
+    source = config_store.source(camera_id)
+    parking_zone_filename = source.get("parking_zone_file") if source else None
+    return resolve_parking_zone_file_path(parking_zone_filename) if parking_zone_filename else None
+
+
 # ===================
 # === Endpoints ===
 @router.get("/config")
 async def get_config():
     try:
-        if not path_to_config_file.exists():
-            raise HTTPException(status_code=404, detail=f"Config file not found at path: {path_to_config_file}")
-        with open(path_to_config_file, "r", encoding='utf-8') as f:
-            config_data = yaml.safe_load(f)
+        config_data = config_store.data()
         # รวม override ให้ backend ใช้
         return {**config_data, **backend_override}
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Config file not found at path: {path_to_config_file}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading config.yaml: {str(e)}")
         
@@ -206,73 +269,83 @@ async def save_config(config: ConfigModel):
     try:
         # save เฉพาะ config ที่มาจาก frontend
         config_dict = config.model_dump(by_alias=False)
-        with open(path_to_config_file, "w", encoding='utf-8') as f:
-            yaml.dump(config_dict, f, sort_keys=False)
+        config_store.save(config_dict)
         return JSONResponse(content={"message": "Config saved successfully to config.yaml"}, status_code=200)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save config: {str(e)}")
 
 
-@router.get("/video-frame/{camera_id}", response_class=Response)
-async def get_video_frame(camera_id: str, skip: int = 30):
-    """
-    ดึงภาพจากวิดีโอ/RTSP ของกล้องตาม camera_id
-    skip = จำนวนเฟรมที่จะข้ามก่อนดึงเฟรมจริง (default = 10)
-    """
+def _resolve_video_source(camera_id: str) -> str:
     try:
-        if not path_to_config_file.exists():
-            raise HTTPException(status_code=404, detail="Config file not found.")
-
-        with open(path_to_config_file, "r", encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-
-        source_path_str = None
-        for source in config.get("video_sources", []):
-            if source.get("camera_id") == camera_id:
-                _source_path = source.get("source_path")
-                if _source_path:
-                    if re.match(r'^(http|https|rtsp)://', _source_path):
-                        source_path_str = _source_path
-                    else:
-                        resolved_path = PPath(_source_path)
-                        if not resolved_path.is_absolute():
-                            base_project_dir = path_to_config_file.parent.parent
-                            resolved_path = base_project_dir / resolved_path
-                        if not resolved_path.exists():
-                            raise HTTPException(
-                                status_code=404,
-                                detail=f"Video file not found at path: {resolved_path}"
-                            )
-                        source_path_str = str(resolved_path)
-                break
-
-        if not source_path_str:
-            raise HTTPException(status_code=404, detail=f"Video source not found for camera_id: {camera_id}")
-
-        cap = cv2.VideoCapture(source_path_str, cv2.CAP_FFMPEG)
-        if not cap.isOpened():
-            raise HTTPException(status_code=500, detail=f"Could not open video source from path/url: {source_path_str}")
-
-        # ข้ามเฟรมตามค่า skip
-        frame = None
-        ret = False
-        for _ in range(skip):
-            ret, frame = cap.read()
-            if not ret:
-                continue
-
-        cap.release()
+        source = config_store.source(camera_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Config file not found.")
 
-        if not ret or frame is None:
-            raise HTTPException(status_code=500, detail="Could not read video frame after skipping frames.")
+    source_path_str = None
+    _source_path = source.get("source_path") if source else None
+    if _source_path:
+        if re.match(r'^(http|https|rtsp)://', _source_path):
+            source_path_str = _source_path
+        else:
+            resolved_path = PPath(_source_path)
+            if not resolved_path.is_absolute():
+                base_project_dir = path_to_config_file.parent.parent
+                resolved_path = base_project_dir / resolved_path
+            if not resolved_path.exists():
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Video file not found at path: {resolved_path}"
+                )
+            source_path_str = str(resolved_path)
+
+    if not source_path_str:
+        raise HTTPException(status_code=404, detail=f"Video source not found for camera_id: {camera_id}")
+    return source_path_str
 
-        _, buffer = cv2.imencode('.jpeg', frame)
-        return Response(content=buffer.tobytes(), media_type="image/jpeg")
 
+@router.get("/video-frame/{camera_id}", response_class=Response)
+async def get_video_frame(
+    camera_id: str,
+    skip: int = 30,
+    width: Optional[int] = Query(None, ge=16, description="ขอภาพย่อกว้าง width px (พิกัด ROI ต้องอิงภาพขนาดเต็ม)"),
+    refresh: bool = False,
+):
+    """
+    ดึงภาพจากวิดีโอ/RTSP ของกล้องตาม camera_id (ขนาดเต็ม ไม่มี overlay) สำหรับหน้าแก้ไข ROI
+    - ถ้า AI worker ของกล้องทำงานอยู่ ใช้เฟรมจาก worker ไม่ต้องเปิด stream ใหม่
+    - ไม่งั้นเปิด source เองใน thread pool, skip = จำนวนเฟรมที่จะข้ามก่อนดึงเฟรมจริง
+    - ผลถูก cache ต่อกล้อง SNAPSHOT_TTL_S วินาที (refresh=true เพื่อดึงใหม่)
+    """
+    try:
+        source_path_str = _resolve_video_source(camera_id)
+        snapshot = await snapshot_service.get(camera_id, source_path_str, skip, refresh)
+        data = await snapshot_service.variant(snapshot, width)
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error in get_video_frame for {camera_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error getting video frame: {str(e)}")
 
+    headers = {
+        "X-Snapshot-Source": snapshot.source,
+        "X-Snapshot-Age": f"{time.time() - snapshot.taken_at:.1f}",
+    }
+    return Response(content=data, media_type="image/jpeg", headers=headers)
+
+
+@router.put("/config/logging")
+async def update_logging_settings(logging_settings: LoggingSettings):
+    """
+    เปลี่ยนระดับ log / rate limit ของ AI worker ระหว่างทำงาน (เขียนเฉพาะส่วน logging ของ config.yaml:
+    worker ที่ทำงานอยู่รับค่าใหม่ผ่าน config hot-reload ภายใน config_reload_interval_seconds)
+    """
+    try:
+        config = copy.deepcopy(config_store.data())
+        config["logging"] = logging_settings.model_dump()
+        config_store.save(config)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Config file not found.")
+    return {"message": "Logging settings saved", "logging": config["logging"]}
 
 
 @router.get("/roi/polygons/{camera_id}")
@@ -282,24 +355,11 @@ async def get_roi_polygons(camera_id: str):
         if not path_to_config_file.exists():
             raise HTTPException(status_code=404, detail="Config file not found.")
 
-        with open(path_to_config_file, "r", encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-
-        parking_zone_filename = None
-        for source in config.get("video_sources", []):
-            if source.get("camera_id") == camera_id:
-                parking_zone_filename = source.get("parking_zone_file")
-                break
-
-        if not parking_zone_filename:
-            return []
-
-        parking_zone_file_path = resolve_parking_zone_file_path(parking_zone_filename)
-        if not parking_zone_file_path.exists():
+        parking_zone_file_path = _camera_roi_path(camera_id)
+        if parking_zone_file_path is None or not parking_zone_file_path.exists():
             return []
 
-        with open(parking_zone_file_path, 'r', encoding='utf-8') as f:
-            roi_data = json.load(f)
+        roi_data = config_store.roi(parking_zone_file_path)
 
         # ตรวจสอบว่า roi_data เป็น list ของ polygons หรือไม่
         if isinstance(roi_data, list):
@@ -320,24 +380,12 @@ async def get_roi_polygons(camera_id: str):
 @router.post("/roi", status_code=status.HTTP_201_CREATED)
 async def save_roi_polygons(camera_id: str, polygons: List[List[List[int]]]):
     try:
-        with open(path_to_config_file, "r", encoding="utf-8") as f:
-            config = yaml.safe_load(f)
-
-        parking_zone_filename = None
-        for source in config.get("video_sources", []):
-            if source.get("camera_id") == camera_id:
-                parking_zone_filename = source.get("parking_zone_file")
-                break
-
-        if not parking_zone_filename:
+        file_path = _camera_roi_path(camera_id)
+        if file_path is None:
             raise HTTPException(status_code=404, detail=f"Camera ID {camera_id} not found in config")
 
-        file_path = resolve_parking_zone_file_path(parking_zone_filename)
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-
         # save JSON as list of polygons
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(polygons, f, ensure_ascii=False, indent=4)
+        config_store.save_roi(file_path, polygons, indent=4)
 
         return {"status": "success", "message": "ROI polygons saved successfully"}
     except Exception as e:
@@ -353,9 +401,8 @@ async def create_camera_file(camera: VideoSource):
         if not path_to_config_file.exists():
             raise HTTPException(status_code=404, detail="Config file not found.")
 
-        # โหลด config ปัจจุบัน
-        with open(path_to_config_file, "r", encoding="utf-8") as f:
-            config = yaml.safe_load(f)
+        # โหลด config ปัจจุบัน (สำเนา: ของใน cache ห้ามแก้ตรงๆ)
+        config = copy.deepcopy(config_store.data())
 
         # ชื่อไฟล์ roi สำหรับกล้องนี้
         camera_name = camera.name or f"camera_{len(config.get('video_sources', [])) + 1}"
@@ -368,8 +415,7 @@ async def create_camera_file(camera: VideoSource):
 
         # ถ้าไฟล์ยังไม่มี → สร้างไฟล์ JSON เปล่า
         if not roi_path.exists():
-            with open(roi_path, "w", encoding="utf-8") as f:
-                json.dump([], f, ensure_ascii=False, indent=4)
+            config_store.save_roi(roi_path, [], indent=4)
 
         # อัปเดต config.yaml ให้กล้องนี้ชี้ไปที่ roi_file นี้
         for source in config.get("video_sources", []):
@@ -377,8 +423,7 @@ async def create_camera_file(camera: VideoSource):
                 source["parking_zone_file"] = f"AI/aicar/roi/{roi_filename}"
 
         # บันทึกกลับลง config.yaml
-        with open(path_to_config_file, "w", encoding="utf-8") as f:
-            yaml.dump(config, f, sort_keys=False)
+        config_store.save(config)
 
         return JSONResponse(
             content={
@@ -422,23 +467,11 @@ async def save_zone_file(data: dict):
     if not camera_id or not polygons:
         raise HTTPException(status_code=400, detail="camera_id or polygons missing")
 
-    # ✅ อ่าน config เพื่อหาพาธจริง
-    with open(path_to_config_file, "r", encoding="utf-8") as f:
-        config = yaml.safe_load(f)
-
-    parking_zone_filename = None
-    for source in config.get("video_sources", []):
-        if source.get("camera_id") == camera_id:
-            parking_zone_filename = source.get("parking_zone_file")
-            break
-
-    if not parking_zone_filename:
+    # ✅ หาพาธจริงจาก config (index ตาม camera_id)
+    file_path = _camera_roi_path(camera_id)
+    if file_path is None:
         raise HTTPException(status_code=404, detail=f"No ROI file found for camera {camera_id}")
-
-    file_path = resolve_parking_zone_file_path(parking_zone_filename)
-    file_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(polygons, f, indent=2, ensure_ascii=False)
+    config_store.save_roi(file_path, polygons)
 
     return {"message": f"ROI saved for {camera_id}", "path": str(file_path)}
 
@@ -3,72 +3,103 @@
 # --- 🔽 1. แก้ไข Import ให้ครบถ้วน 🔽 ---
 from fastapi import (
     APIRouter, WebSocket, WebSocketDisconnect, Request, 
-    HTTPException, Response, status
+    HTTPException, Response, Query, status
 )
-from typing import Dict, Set
+from fastapi.responses import StreamingResponse
+from typing import Optional
 import asyncio
+import json
 import logging
+import time
+
+from app.core.config import settings
+from app.services.frame_hub import frame_hub
+from app.services.kpi_hub import kpi_hub
+from app.services.latency import latency_registry
 
 # --- 🔽 2. สร้าง Logger สำหรับไฟล์นี้ 🔽 ---
 logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["Frames"])
 
-# clients per camera_id
-_clients: Dict[str, Set[WebSocket]] = {}
-_clients_lock = asyncio.Lock()
+MJPEG_BOUNDARY = "frame"
+
+
+async def _send_frames(websocket: WebSocket, camera_id: str):
+    """ส่งเฟรมล่าสุดของกล้องให้ client นี้ทุกครั้งที่มีเฟรมใหม่ (ส่งไม่ทันก็ข้ามไปเฟรมล่าสุดเลย)"""
+    feed = frame_hub.feed(camera_id)
+    last_seq = 0
+    while True:
+        frame = await feed.next_frame(last_seq)
+        await websocket.send_bytes(frame.data)
+        feed.mark_delivered(frame, last_seq)
+        last_seq = frame.seq
+
+
+async def _receive_until_closed(websocket: WebSocket, camera_id: str, viewer: dict):
+    # รอรับข้อความ (ping/pong) จาก client เพื่อเช็คว่ายังเชื่อมต่ออยู่
+    # ถ้า client หลุดไปโดยไม่บอกลา (เช่น ปิดแท็บเบราว์เซอร์)
+    # await websocket.receive_text() จะ raise WebSocketDisconnect
+    # {"type": "visibility", "visible": false} = ผู้ชมซ่อนแผงวิดีโอ / สลับแท็บ (ได้ภาพย่อความถี่ต่ำแทน)
+    feed = frame_hub.feed(camera_id)
+    while True:
+        text = await websocket.receive_text()
+        try:
+            message = json.loads(text)
+        except ValueError:
+            continue
+        if isinstance(message, dict) and message.get("type") == "visibility":
+            live = bool(message.get("visible", True))
+            await feed.set_viewer_live(viewer["live"], live)
+            viewer["live"] = live
+
 
 # --- 🔽 3. แก้ไขฟังก์ชัน ws_frames ให้ "หุ้มเกราะ" 🔽 ---
 @router.websocket("/ws/ai-frames/{camera_id}")
 async def ws_frames(websocket: WebSocket, camera_id: str):
     await websocket.accept()
-    async with _clients_lock:
-        _clients.setdefault(camera_id, set()).add(websocket)
-    
+    feed = frame_hub.feed(camera_id)
+    viewer = {"live": True}
+    await feed.add_viewer()
     logger.info(f"Client connected for camera_id: {camera_id}")
-    
+
+    tasks = {
+        asyncio.create_task(_receive_until_closed(websocket, camera_id, viewer)),
+        asyncio.create_task(_send_frames(websocket, camera_id)),
+    }
     try:
-        # Keep connection alive
-        while True:
-            # รอรับข้อความ (ping/pong) จาก client เพื่อเช็คว่ายังเชื่อมต่ออยู่
-            # ถ้า client หลุดไปโดยไม่บอกลา (เช่น ปิดแท็บเบราว์เซอร์)
-            # await websocket.receive_text() จะ raise WebSocketDisconnect
-            await websocket.receive_text()
-
-    except WebSocketDisconnect:
-        # logger.info(f"Client disconnected gracefully for camera_id: {camera_id}")
-        pass
-    except Exception as e:
-        # **นี่คือส่วนที่สำคัญที่สุด**
-        # ดักจับ Error อื่นๆ ที่ไม่คาดคิดทั้งหมด แล้ว log มันออกมา
-        # logger.error(f"An unexpected error occurred in WebSocket for {camera_id}: {e}", exc_info=True)
-        pass
+        # จบเมื่อฝั่งใดฝั่งหนึ่งจบ (client ปิด หรือส่งไม่สำเร็จ)
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                logger.debug(f"WebSocket for {camera_id} closed: {error}")
     finally:
         # ไม่ว่าจะเกิดอะไรขึ้น ส่วนนี้จะทำงานเสมอ เพื่อเคลียร์การเชื่อมต่อ
-        async with _clients_lock:
-            if camera_id in _clients and websocket in _clients[camera_id]:
-                _clients[camera_id].remove(websocket)
-        # logger.info(f"Cleaned up client for camera_id: {camera_id}")
+        for task in tasks:
+            task.cancel()
+        await feed.remove_viewer(viewer["live"])
 
 
-# --- 🔽 4. แก้ไขฟังก์ชัน _broadcast_bytes ให้สมบูรณ์ 🔽 ---
-async def _broadcast_bytes(camera_id: str, b: bytes):
-    """ส่ง binary JPEG ไปยังทุก client ของ camera_id"""
-    async with _clients_lock:
-        clients_to_send = list(_clients.get(camera_id, set()))
+def _parse_capture_ts(request: Request) -> Optional[float]:
+    value = request.headers.get("x-capture-ts")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
 
-    if not clients_to_send:
-        return
 
-    send_tasks = [ws.send_bytes(b) for ws in clients_to_send]
-    results = await asyncio.gather(*send_tasks, return_exceptions=True)
-    
-    for ws, result in zip(clients_to_send, results):
-        if isinstance(result, Exception):
-            logger.error(f"Error broadcasting to client for {camera_id}: {result}. Removing client.")
-            async with _clients_lock:
-                if camera_id in _clients and ws in _clients[camera_id]:
-                    _clients[camera_id].remove(ws)
+def _record_frame_latency(camera_id: str, capture_ts: Optional[float], hops: Optional[dict]):
+    if capture_ts is None:
+        return
+    latency_registry.record_since("frame_capture_to_backend", capture_ts, camera_id)
+    if hops:
+        try:
+            latency_registry.record_worker_hops(hops, camera_id)
+        except (ValueError, TypeError, AttributeError):
+            pass
 
 
 # --- 🔽 5. แก้ไขฟังก์ชัน publish_frame ให้สมบูรณ์ 🔽 ---
@@ -87,8 +118,171 @@ async def publish_frame(camera_id: str, request: Request):
     if not b:
         raise HTTPException(status_code=400, detail="Empty body")
     
-    # สร้าง task ให้ส่งภาพไปเบื้องหลัง จะได้ไม่ block AI worker
-    asyncio.create_task(_broadcast_bytes(camera_id, b))
+    # latency: เวลา capture และช่วงเวลาภายใน worker ที่แนบมาใน header
+    capture_ts = _parse_capture_ts(request)
+    hops = request.headers.get("x-trace-hops")
+    if hops:
+        try:
+            hops = json.loads(hops)
+        except ValueError:
+            hops = None
+    _record_frame_latency(camera_id, capture_ts, hops)
+
+    # เก็บเป็นเฟรมล่าสุด แล้วปลุก sender ของผู้ชม (ไม่ block AI worker และไม่สร้าง task ต่อเฟรม)
+    await frame_hub.feed(camera_id).publish(b, capture_ts)
     
     # คืนค่า 204 No Content เพื่อบอก AI worker ว่ารับทราบแล้ว
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get("/frames/{camera_id}/latest")
+async def get_latest_frame(camera_id: str, request: Request):
+    """
+    Snapshot: เฟรมล่าสุดของกล้อง (image/jpeg) จาก cache ไม่เรียก AI worker
+    ส่ง If-None-Match เป็น ETag เดิมเพื่อรับ 304 เมื่อยังไม่มีเฟรมใหม่
+    แต่ละ request ต่ออายุ thumbnail demand (FRAME_POLL_DEMAND_LEASE_S) worker จึงส่งเฟรมใหม่ต่อแม้ไม่มีผู้ชมสด
+    """
+    feed = frame_hub.get(camera_id)
+    if feed is not None:
+        await feed.touch_poll_demand(settings.FRAME_POLL_DEMAND_LEASE_S)
+    frame = frame_hub.latest(camera_id)
+    if frame is None:
+        raise HTTPException(status_code=404, detail=f"No frame received yet for camera_id: {camera_id}")
+    headers = {
+        "ETag": frame.etag,
+        "Cache-Control": "no-cache",
+        "X-Frame-Seq": str(frame.seq),
+        "X-Frame-Timestamp": f"{frame.received_at:.3f}",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and frame.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=frame.data, media_type="image/jpeg", headers=headers)
+
+
+@router.get("/frames/{camera_id}/mjpeg")
+async def stream_mjpeg(
+    camera_id: str,
+    request: Request,
+    max_fps: Optional[float] = Query(None, gt=0, description="จำกัดจำนวนเฟรมต่อวินาทีของ stream นี้"),
+):
+    """MJPEG (multipart/x-mixed-replace) จากเฟรมล่าสุด ใช้กับ <img src> ได้โดยตรง"""
+    feed = frame_hub.feed(camera_id)
+
+    async def frames():
+        await feed.add_viewer()
+        last_seq = 0
+        try:
+            while not await request.is_disconnected():
+                started = time.monotonic()
+                frame = await feed.next_frame(last_seq, timeout=5.0)
+                if frame is None:
+                    continue   # กล้องยังไม่ส่งเฟรม: วนกลับไปเช็คว่า client ยังต่ออยู่
+                yield (
+                    f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(frame.data)}\r\n\r\n"
+                ).encode("ascii") + frame.data + b"\r\n"
+                feed.mark_delivered(frame, last_seq)
+                last_seq = frame.seq
+                if max_fps:
+                    await asyncio.sleep(max(0.0, 1.0 / max_fps - (time.monotonic() - started)))
+        finally:
+            await feed.remove_viewer()
+
+    return StreamingResponse(
+        frames(),
+        media_type=f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+
+# --- ช่องทางส่งเฟรมถาวรจาก camera worker (แทน POST ทีละเฟรม) ---
+# worker -> backend:
+#   binary = 1 เฟรม: [ความยาว header 4 byte big-endian][header JSON utf-8][JPEG]
+#            header: {"capture_ts": <epoch>, "hops_ms": {...}}
+#            หรือ {"kind": "snapshot"} = เฟรมดิบขนาดเต็มที่ตอบ snapshot_request (ไม่แสดงให้ผู้ชม)
+#   text   = telemetry JSON (เช่น fps, จำนวนรถที่จอด) เก็บเป็นค่าล่าสุดของกล้อง และส่งจำนวนรถที่จอดต่อให้ /ws/kpi
+# backend -> worker:
+#   text   = {"type": "demand", "level": "none" | "thumbnail" | "live", "viewers": n, "live": m}
+#            ตอนเชื่อมต่อและทุกครั้งที่ผู้ชมเปลี่ยน (ดู app/services/frame_hub.py)
+#            {"type": "snapshot_request"} = ขอเฟรมดิบขนาดเต็ม (app/services/snapshots.py)
+def _parse_ingest_frame(message: bytes):
+    header_len = int.from_bytes(message[:4], "big")
+    header = json.loads(message[4:4 + header_len]) if header_len else {}
+    if not isinstance(header, dict):
+        raise ValueError(f"frame header must be a JSON object, got {type(header).__name__}")
+    return header, message[4 + header_len:]
+
+
+async def _send_control(websocket: WebSocket, camera_id: str):
+    feed = frame_hub.feed(camera_id)
+    level, viewers, live_viewers = demand = feed.demand
+    await websocket.send_text(json.dumps({"type": "demand", "level": level, "viewers": viewers, "live": live_viewers}))
+    while True:
+        message = await feed.next_uplink_message(demand)
+        if message["type"] == "demand":
+            demand = (message["level"], message["viewers"], message["live"])
+        await websocket.send_text(json.dumps(message))
+
+
+async def _receive_ingest(websocket: WebSocket, camera_id: str):
+    feed = frame_hub.feed(camera_id)
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+        if message.get("bytes"):
+            try:
+                header, jpeg = _parse_ingest_frame(message["bytes"])
+            except ValueError as e:
+                logger.warning(f"Malformed frame from worker {camera_id}: {e}")
+                continue
+            if not jpeg:
+                continue
+            if header.get("kind") == "snapshot":
+                feed.resolve_snapshot(jpeg)
+                continue
+            capture_ts = header.get("capture_ts")
+            if not isinstance(capture_ts, (int, float)):
+                capture_ts = None
+            _record_frame_latency(camera_id, capture_ts, header.get("hops_ms"))
+            await feed.publish(jpeg, capture_ts)
+        elif message.get("text"):
+            try:
+                telemetry = json.loads(message["text"])
+            except ValueError:
+                telemetry = None
+            if not isinstance(telemetry, dict):
+                logger.warning(f"Malformed telemetry from worker {camera_id}")
+                continue
+            feed.set_telemetry(telemetry)
+            kpi_hub.telemetry(camera_id, telemetry)
+
+
+@router.websocket("/ws/ingest/{camera_id}")
+async def ws_ingest(websocket: WebSocket, camera_id: str):
+    """WebSocket ถาวรจาก camera worker: รับเฟรม + telemetry และแจ้ง demand / ขอ snapshot กลับไป"""
+    if websocket.headers.get("x-api-key") != settings.API_KEY:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    feed = frame_hub.feed(camera_id)
+    feed.uplink_opened()
+    logger.info(f"Frame uplink connected for camera_id: {camera_id}")
+
+    tasks = {
+        asyncio.create_task(_receive_ingest(websocket, camera_id)),
+        asyncio.create_task(_send_control(websocket, camera_id)),
+    }
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                logger.warning(f"Frame uplink for {camera_id} closed: {error}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        if feed.uplink_closed():
+            kpi_hub.camera_offline(camera_id)
+        logger.info(f"Frame uplink disconnected for camera_id: {camera_id}")
@@ -0,0 +1,63 @@
+# app/api/routers/kpi_router.py
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from app.services.kpi_hub import kpi_hub
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["KPI"])
+
+
+async def _send_kpi(websocket: WebSocket, client):
+    while True:
+        message = await kpi_hub.next_message(client)
+        await websocket.send_text(json.dumps(message, separators=(",", ":"), default=str))
+
+
+async def _receive_filters(websocket: WebSocket, client):
+    # {"type": "subscribe", "branch_id": "..."} = เปลี่ยนสาขาที่ติดตาม (ว่าง = ทุกสาขา) ข้อความอื่นเป็น keepalive
+    while True:
+        text = await websocket.receive_text()
+        try:
+            message = json.loads(text)
+        except ValueError:
+            continue
+        if isinstance(message, dict) and message.get("type") == "subscribe":
+            branch_id = message.get("branch_id")
+            # socket นี้ไม่มี auth: filter ที่ไม่ใช่ string (เช่น ตัวเลข) ทำให้ matches() ใน ingest path ล้ม
+            if branch_id is not None and not isinstance(branch_id, str):
+                continue
+            kpi_hub.set_filter(client, branch_id)
+
+
+@router.websocket("/ws/kpi")
+async def ws_kpi(websocket: WebSocket, branch_id: Optional[str] = None):
+    """
+    KPI สดของ dashboard: snapshot ตอนเชื่อมต่อ / เปลี่ยน filter แล้วตามด้วย delta
+      snapshot  ongoing_violations, ongoing[], current_parked, cameras{}
+      events    parking event ใหม่ที่ ingest เข้ามา
+      ongoing   added[] / removed[] (id) และ ongoing_violations ล่าสุด
+      parked    จำนวนรถที่จอดของกล้องหนึ่ง (จาก telemetry) และ current_parked_total
+    ทุกข้อความกรองตาม prefix ของ branch_id (query ?branch_id= หรือข้อความ subscribe)
+    """
+    await websocket.accept()
+    client = await kpi_hub.subscribe(branch_id)
+    tasks = {
+        asyncio.create_task(_receive_filters(websocket, client)),
+        asyncio.create_task(_send_kpi(websocket, client)),
+    }
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                logger.debug(f"KPI WebSocket closed: {error}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        kpi_hub.unsubscribe(client)
@@ -0,0 +1,56 @@
+# backend/app/api/routers/metrics_router.py
+from typing import Optional
+
+from fastapi import APIRouter
+
+from app.services.frame_hub import frame_hub
+from app.services.kpi_hub import kpi_hub
+from app.services.latency import latency_registry
+from app.services.log_stream import log_stream
+from app.services.object_store import image_uploads
+from app.services.response_cache import response_cache
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@router.get("/latency")
+async def get_latency_metrics(camera_id: Optional[str] = None):
+    """
+    Latency histograms ต่อ hop (worker_inference, worker_tracking, upload, db_insert,
+    violation_detect_to_visible, frame_capture_to_broadcast, ...) พร้อมสถานะ SLO
+    ระบุ camera_id เพื่อดูเฉพาะกล้องนั้น
+    """
+    return latency_registry.snapshot(camera_id)
+
+
+@router.get("/uploads")
+async def get_upload_metrics():
+    """สถานะคิวอัปโหลดรูปภาพ (pending / completed / failed)"""
+    return image_uploads.stats()
+
+
+@router.get("/cache")
+async def get_cache_metrics():
+    """Hit rate ของ response cache (hits / misses / 304 / entries ที่ถูกล้างจาก ingest)"""
+    return await response_cache.snapshot()
+
+
+@router.get("/frames")
+async def get_frame_metrics():
+    """
+    เฟรมต่อกล้อง: demand, จำนวนผู้ชม, เฟรมที่รับ / ส่งถึงผู้ชม / ข้ามเพราะผู้ชมรับไม่ทัน, อายุเฟรมล่าสุด และ telemetry
+    hosts: CPU ที่ worker แต่ละเครื่องประหยัดได้จากการไม่วาด / encode เฟรมที่ไม่มีคนดู
+    """
+    return frame_hub.stats()
+
+
+@router.get("/logs")
+async def get_log_metrics():
+    """Log ของ AI process: บรรทัดต่อวินาที (เฉลี่ย 10 วินาที), batch ที่ส่ง, บรรทัดที่ทิ้งเพราะ console รับไม่ทัน, จำนวน console"""
+    return log_stream.stats()
+
+
+@router.get("/kpi")
+async def get_kpi_metrics():
+    """KPI stream (/ws/kpi): จำนวน dashboard ที่เชื่อมต่อ, รถที่กำลังจอดเกินใน state, event / ข้อความที่ส่ง, จำนวนครั้งที่ต้องส่ง snapshot ใหม่"""
+    return kpi_hub.stats()
@@ -1,28 +1,108 @@
 # backend/app/api/routers/parking.py
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func, cast, Date
-from typing import Optional, List
-from datetime import date, timedelta, datetime
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, cast, Date, select, tuple_
+from typing import Literal, Optional, List
+from datetime import date, datetime, timedelta, timezone
 from fastapi import Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import base64
+import json
 import math
+from itertools import islice
+from types import SimpleNamespace
 
 from app import database, schemas, api_schemas
-from app.api.deps import get_db
+from app.api.deps import get_async_db
+from app.api.responses import FastJSONResponse
+from app.core.config import settings
+from app.services.response_cache import CacheScope, response_cache
+from app.services import violation_export
+from app.services.violation_archive import archive
 
 router = APIRouter(prefix="/parking_violations", tags=["Parking Violations"])
 
-@router.get("/", response_model=List[schemas.ParkingViolationData])
-def get_parking_violations(
+@router.get("/", response_class=FastJSONResponse, responses={200: {"model": List[schemas.ParkingViolationData]}})
+async def get_parking_violations(
      skip: int=0, 
      limit: int=100, 
      branch_id: Optional[str]=None, 
-     db: Session=Depends(get_db)
+     db: AsyncSession=Depends(get_async_db)
      ):
-    query = db.query(database.DBParkingViolation)
+    model = database.DBParkingViolation
+    # select เฉพาะคอลัมน์ของ ParkingViolationData เป็น dict (ไม่สร้าง ORM entity ต่อแถว)
+    # ส่ง FastJSONResponse ตรง ๆ: ไม่ validate dict แต่ละแถวกลับเป็น Pydantic model (schema ยังอยู่ใน docs ผ่าน responses)
+    query = select(*(getattr(model, name) for name in schemas.ParkingViolationData.model_fields))
     if branch_id:
-        query = query.filter(database.DBParkingViolation.branch_id.ilike(f"{branch_id}%"))
-    return query.offset(skip).limit(limit).all()
+        query = query.where(database.like_prefix(model.branch_id, branch_id))
+    return FastJSONResponse([dict(row) for row in (await db.execute(query.offset(skip).limit(limit))).mappings()])
+
+# helper ชื่อเดือนย่อไทย
+THAI_MONTHS = ["ม.ค.", "ก.พ.", "มี.ค.", "เม.ย.", "พ.ค.", "มิ.ย.",
+               "ก.ค.", "ส.ค.", "ก.ย.", "ต.ค.", "พ.ย.", "ธ.ค."]
+
+def _chart_bucket(group_by_unit: str, ts):
+    """Expression ที่ใช้ group ข้อมูล chart ตามหน่วยเวลา (None = หน่วยที่ไม่รองรับ, ไม่มี chart)"""
+    if group_by_unit == 'hour':
+        return func.extract('hour', ts)
+    if group_by_unit in ['day', 'week', 'month']:
+        return cast(ts, Date)
+    if group_by_unit == 'week_range':
+        return func.date_trunc('week', ts)   # จันทร์ต้นสัปดาห์ (ISO week)
+    if group_by_unit == 'month_range':
+        return func.date_trunc('month', ts)
+    return None
+
+def _build_chart_data(rows, group_by_unit: str, start_date: date, end_date: date) -> List[api_schemas.ViolationChartDataPoint]:
+    """เติมช่วงเวลาที่ไม่มีข้อมูลเป็น 0 และสร้าง label ตามหน่วยเวลา"""
+    chart_data = []
+
+    def point(label, row):
+        return api_schemas.ViolationChartDataPoint(
+            label=label,
+            value=row.violations if row else 0,
+            total=row.total if row else 0
+        )
+
+    # --- Hourly (ชั่วโมงของวัน 00:00 - 23:00) ---
+    if group_by_unit == 'hour':
+        by_hour = {int(r.bucket): r for r in rows}
+        for hour in range(24):
+            chart_data.append(point(f"{hour:02d}:00", by_hour.get(hour)))
+
+    # --- Day / Week / Month (รายวัน) ---
+    elif group_by_unit in ['day', 'week', 'month']:
+        by_date = {r.bucket: r for r in rows}
+        current_date = start_date
+        while current_date <= end_date:
+            date_str = current_date.strftime("%d/%m/%Y")
+            label_display = current_date.strftime("%d/%m") if group_by_unit == 'month' else date_str
+            chart_data.append(point(label_display, by_date.get(current_date)))
+            current_date += timedelta(days=1)
+
+    # --- Week Range (วนทีละสัปดาห์จากวันจันทร์ของ start_date) ---
+    elif group_by_unit == 'week_range':
+        by_week = {r.bucket.date(): r for r in rows}
+        monday = start_date - timedelta(days=start_date.weekday())
+        while monday <= end_date:
+            year, week, _ = monday.isocalendar()
+            chart_data.append(point(f"W {week}/{year}", by_week.get(monday)))
+            monday += timedelta(days=7)
+
+    # --- Month Range ---
+    elif group_by_unit == 'month_range':
+        by_month = {(r.bucket.year, r.bucket.month): r for r in rows}
+        year, month = start_date.year, start_date.month
+        while (year < end_date.year) or (year == end_date.year and month <= end_date.month):
+            chart_data.append(point(THAI_MONTHS[month - 1], by_month.get((year, month))))
+            if month == 12:
+                month = 1
+                year += 1
+            else:
+                month += 1
+
+    return chart_data
 
 #--- ข้อมูลสรุป KPI Card, Chart, Top Branch---#
 @router.get(
@@ -30,8 +110,9 @@ def get_parking_violations(
     response_model=api_schemas.ViolationSummaryResponse,
     summary="Get Aggregated Summary of Parking Violations"
 )
-def get_violation_summary(
-    db: Session = Depends(get_db),
+async def get_violation_summary(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     branch_id: Optional[str] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
@@ -39,9 +120,11 @@ def get_violation_summary(
 ):
     """
     Endpoint นี้จะคำนวณและรวบรวมข้อมูลสรุปทั้งหมดสำหรับหน้า Parking Violations:
-    1.  คำนวณ KPI Cards
-    2.  คำนวณข้อมูลสำหรับ Chart (จัดกลุ่มรายวัน)
+    1.  คำนวณ KPI Cards (query เดียวด้วย conditional aggregates)
+    2.  คำนวณข้อมูลสำหรับ Chart (query เดียว group ตามหน่วยเวลาใน SQL)
     3.  คำนวณ Top 5 สาขาที่มีการละเมิดสูงสุด
+    ทุก query อ่านจาก parking_hourly_rollup (1 row ต่อ สาขา/กล้อง/ชั่วโมง) แทนข้อมูลดิบ
+    ผลลัพธ์ถูก cache ตาม filter จนกว่าจะหมด TTL หรือมีข้อมูลใหม่ของสาขา/ช่วงวันที่นั้น
     """
     # ถ้าไม่มีการส่งวันที่มา ให้ใช้ Default เป็น 7 วันล่าสุด
     if not end_date:
@@ -49,247 +132,78 @@ def get_violation_summary(
     if not start_date:
         start_date = end_date - timedelta(days=6)
 
-    # สร้าง Base Query เพื่อเป็นตัวตั้งต้น    
-    base_query = db.query(database.DBParkingViolation)
+    params = {"branch_id": branch_id or None, "start_date": start_date, "end_date": end_date, "group_by_unit": group_by_unit}
+    return await response_cache.respond(
+        request, "summary", params, CacheScope(branch_id or None, start_date, end_date),
+        lambda: build_violation_summary(db, branch_id, start_date, end_date, group_by_unit),
+    )
 
-    # เงื่อนไข .filter() เข้าไปใน Base Query ถ้ามีการส่งค่ามา
+async def build_violation_summary(
+    db: AsyncSession,
+    branch_id: Optional[str],
+    start_date: date,
+    end_date: date,
+    group_by_unit: str
+) -> api_schemas.ViolationSummaryResponse:
+    model = database.DBParkingHourlyRollup
+
+    # เงื่อนไขร่วมของทุก query (บวกไป 1 วันเพื่อให้ครอบคลุมข้อมูลของ end_date ทั้งวัน)
+    conditions = [
+        model.hour >= start_date,
+        model.hour < (end_date + timedelta(days=1)),
+    ]
     if branch_id:
-        base_query = base_query.filter(database.DBParkingViolation.branch_id.startswith(branch_id))
-    if start_date:
-        base_query = base_query.filter(database.DBParkingViolation.timestamp >= start_date)
-    if end_date:
-        # บวกไป 1 วันเพื่อให้ครอบคลุมข้อมูลของ end_date ทั้งวัน
-        base_query = base_query.filter(database.DBParkingViolation.timestamp < (end_date + timedelta(days=1)))
-
-    # --- 1. คำนวณข้อมูลสำหรับ KPI Cards ---
-
-    total_unique_branches = base_query.with_entities(func.count(func.distinct(database.DBParkingViolation.branch_id))).scalar() or 0
-    
-    # online_threshold = datetime.utcnow() - timedelta(minutes=15)
-    # online_branches_count = db.query(func.count(database.DBParkingViolation.branch_id.distinct()))\
-    #     .filter(database.DBParkingViolation.timestamp >= online_threshold)\
-    #     .scalar() or 0
-    
-    total_violations = base_query.filter(database.DBParkingViolation.is_violation == True).count()
-    ongoing_violations = base_query.filter(
-        database.DBParkingViolation.is_violation == True,
-        database.DBParkingViolation.exit_time.is_(None)
-    ).count()
-
-    avg_duration_violation = base_query.with_entities(func.avg(database.DBParkingViolation.duration_minutes)).filter(database.DBParkingViolation.is_violation == True).scalar() or 0
-    avg_duration_normal = base_query.with_entities(func.avg(database.DBParkingViolation.duration_minutes)).filter(database.DBParkingViolation.is_violation == False).scalar() or 0
-    total_sessions = base_query.count()
+        conditions.append(database.like_prefix(model.branch_id, branch_id))
+
+    # --- 1. KPI Cards: query เดียว ---
+    kpi_row = (await db.execute(
+        select(
+            func.coalesce(func.sum(model.session_count), 0).label("total_sessions"),
+            func.count(func.distinct(model.branch_id)).label("unique_branches"),
+            func.coalesce(func.sum(model.violation_count), 0).label("total_violations"),
+            func.coalesce(func.sum(model.ongoing_count), 0).label("ongoing_violations"),
+            (func.sum(model.violation_duration_sum) / func.nullif(func.sum(model.violation_duration_count), 0)).label("avg_violation"),
+            (func.sum(model.normal_duration_sum) / func.nullif(func.sum(model.normal_duration_count), 0)).label("avg_normal"),
+        ).where(*conditions)
+    )).one()
 
     kpi_data = api_schemas.ParkingKpiData(
-        totalViolations=total_violations,
-        ongoingViolations=ongoing_violations,
-        total_parking_sessions=total_sessions,
-        avgViolationDuration=round(avg_duration_violation, 1),
-        avgNormalParkingTime=round(avg_duration_normal, 1),
-        onlineBranches=total_unique_branches
+        totalViolations=int(kpi_row.total_violations),
+        ongoingViolations=int(kpi_row.ongoing_violations),
+        total_parking_sessions=int(kpi_row.total_sessions),
+        avgViolationDuration=round(float(kpi_row.avg_violation or 0), 1),
+        avgNormalParkingTime=round(float(kpi_row.avg_normal or 0), 1),
+        onlineBranches=kpi_row.unique_branches
     )
 
-    # --- 2. คำนวณข้อมูลสำหรับ Violations Chart (เปรียบเทียบ รถจอดเกิน vs รถทั้งหมด) ---
+    # --- 2. Violations Chart (รถจอดเกิน vs รถทั้งหมด) ใน query เดียว ---
     chart_data = []
-
-    # total = base_query (รวมทุกคันในช่วงที่กรองแล้ว)
-    total_query = base_query
-    # violation = เฉพาะที่ is_violation == True
-    violation_query = base_query.filter(database.DBParkingViolation.is_violation == True)
-
-    # --- Hourly ---
-    if group_by_unit == 'hour':
-        total_results = total_query.with_entities(
-            func.date_trunc('hour', database.DBParkingViolation.timestamp).label("label_dt"),
-            func.count(database.DBParkingViolation.id).label("total")   # <- นับ rows (sessions), ไม่ใช่ distinct car_id
-        ).group_by("label_dt").all()
-
-        violation_results = violation_query.with_entities(
-            func.date_trunc('hour', database.DBParkingViolation.timestamp).label("label_dt"),
-            func.count(database.DBParkingViolation.id).label("violations")  # <- นับ rows ที่เป็น violation
-        ).group_by("label_dt").all()
-
-        # map datetime -> counts, format key as "HH:00"
-        total_map = {
-            (r.label_dt.strftime("%H:00") if hasattr(r.label_dt, "strftime") else str(r.label_dt)): r.total
-            for r in total_results
-        }
-        violation_map = {
-            (r.label_dt.strftime("%H:00") if hasattr(r.label_dt, "strftime") else str(r.label_dt)): r.violations
-            for r in violation_results
-        }
-
-        for hour in range(24):
-            hour_str = f"{hour:02d}:00"
-            chart_data.append(
-                api_schemas.ViolationChartDataPoint(
-                    label=hour_str,
-                    value=violation_map.get(hour_str, 0),
-                    total=total_map.get(hour_str, 0)
-                )
-            )
-
-    # --- Day / Week / Month ---
-    elif group_by_unit in ['day', 'week', 'month']:
-        total_results = total_query.with_entities(
-            cast(database.DBParkingViolation.timestamp, Date).label("label_date"),
-            func.count(database.DBParkingViolation.id).label("total")   # <- ใช้ id (rows)
-        ).group_by("label_date").all()
-
-        violation_results = violation_query.with_entities(
-            cast(database.DBParkingViolation.timestamp, Date).label("label_date"),
-            func.count(database.DBParkingViolation.id).label("violations")  # <- ใช้ id (rows)
-        ).group_by("label_date").all()
-
-        def date_key(d):
-            if hasattr(d, "strftime"):
-                # return d.strftime("%Y-%m-%d")
-                return d.strftime("%d/%m/%Y")
-            return str(d)
-
-        total_map = {date_key(r.label_date): r.total for r in total_results}
-        violation_map = {date_key(r.label_date): r.violations for r in violation_results}
-
-        current_date = start_date
-        while current_date <= end_date:
-            # date_str = current_date.strftime("%Y-%m-%d")
-            date_str = current_date.strftime("%d/%m/%Y")
-            label_display = current_date.strftime("%d/%m") if group_by_unit == 'month' else date_str
-
-            chart_data.append(
-                api_schemas.ViolationChartDataPoint(
-                    label=label_display,
-                    value=violation_map.get(date_str, 0),
-                    total=total_map.get(date_str, 0)
-                )
-            )
-            current_date += timedelta(days=1)
-
-    # --- Week Range, Month Range ---
-    elif group_by_unit in ['week_range', 'month_range']:
-        # Group ตามวันที่ก่อน แล้วค่อยแปลง label ภายหลัง
-        total_results = total_query.with_entities(
-            cast(database.DBParkingViolation.timestamp, Date).label("label_date"),
-            func.count(database.DBParkingViolation.id).label("total")
-        ).group_by("label_date").all()
-
-        violation_results = violation_query.with_entities(
-            cast(database.DBParkingViolation.timestamp, Date).label("label_date"),
-            func.count(database.DBParkingViolation.id).label("violations")
-        ).group_by("label_date").all()
-
-        # สร้าง dict เพื่อ lookup
-        def date_key(d):
-            return d.strftime("%Y-%m-%d") if hasattr(d, "strftime") else str(d)
-
-        total_map = {date_key(r.label_date): r.total for r in total_results}
-        violation_map = {date_key(r.label_date): r.violations for r in violation_results}
-        
-        # --- Week Range ---
-        if group_by_unit == 'week_range':
-            # รวมข้อมูลเป็นรายสัปดาห์
-            weekly_summary = {}
-            for date_str, total in total_map.items():
-                d = datetime.strptime(date_str, "%Y-%m-%d").date()
-                year, week, _ = d.isocalendar()
-                key = (year, week)
-                weekly_summary.setdefault(key, {"total": 0, "violations": 0})
-                weekly_summary[key]["total"] += total
-            for date_str, vio in violation_map.items():
-                d = datetime.strptime(date_str, "%Y-%m-%d").date()
-                year, week, _ = d.isocalendar()
-                key = (year, week)
-                weekly_summary.setdefault(key, {"total": 0, "violations": 0})
-                weekly_summary[key]["violations"] += vio
-
-            # วนสร้างสัปดาห์จากช่วง start_date → end_date
-            start_year, start_week, _ = start_date.isocalendar()
-            end_year, end_week, _ = end_date.isocalendar()
-
-            # รองรับกรณีข้ามปี
-            year = start_year
-            week = start_week
-            while (year < end_year) or (year == end_year and week <= end_week):
-                key = (year, week)
-                label = f"W {week}/{year}"
-                summary = weekly_summary.get(key, {"total": 0, "violations": 0})
-                chart_data.append(
-                    api_schemas.ViolationChartDataPoint(
-                        label=label,
-                        value=summary["violations"],
-                        total=summary["total"]
-                    )
-                )
-                # เพิ่มสัปดาห์
-                week += 1
-                if week > 52:
-                    week = 1
-                    year += 1
-
-        # --- Month Range ---
-        elif group_by_unit == 'month_range':
-            monthly_summary = {}
-            for date_str, total in total_map.items():
-                d = datetime.strptime(date_str, "%Y-%m-%d").date()
-                key = (d.year, d.month)
-                monthly_summary.setdefault(key, {"total": 0, "violations": 0})
-                monthly_summary[key]["total"] += total
-            for date_str, vio in violation_map.items():
-                d = datetime.strptime(date_str, "%Y-%m-%d").date()
-                key = (d.year, d.month)
-                monthly_summary.setdefault(key, {"total": 0, "violations": 0})
-                monthly_summary[key]["violations"] += vio
-
-            # helper ชื่อเดือนย่อไทย
-            thai_months = ["ม.ค.", "ก.พ.", "มี.ค.", "เม.ย.", "พ.ค.", "มิ.ย.",
-                            "ก.ค.", "ส.ค.", "ก.ย.", "ต.ค.", "พ.ย.", "ธ.ค."]
-
-            year, month = start_date.year, start_date.month
-            while (year < end_date.year) or (year == end_date.year and month <= end_date.month):
-                key = (year, month)
-                label = thai_months[month - 1]
-                summary = monthly_summary.get(key, {"total": 0, "violations": 0})
-                chart_data.append(
-                    api_schemas.ViolationChartDataPoint(
-                        label=label,
-                        value=summary["violations"],
-                        total=summary["total"]
-                    )
-                )
-                # เพิ่มเดือน
-                if month == 12:
-                    month = 1
-                    year += 1
-                else:
-                    month += 1
-
-    # Debug check (optional)
-    try:
-        sum_chart_total = sum([c.total for c in chart_data])
-        print(f"[SUMMARY DEBUG] total_sessions KPI={total_sessions}, sum_chart_total={sum_chart_total}")
-    except Exception:
-        pass
+    bucket = _chart_bucket(group_by_unit, model.hour)
+    if bucket is not None:
+        chart_rows = (await db.execute(
+            select(
+                bucket.label("bucket"),
+                func.sum(model.session_count).label("total"),   # นับ sessions, ไม่ใช่ distinct car_id
+                func.sum(model.violation_count).label("violations"),
+            ).where(*conditions).group_by("bucket")
+        )).all()
+        chart_data = _build_chart_data(chart_rows, group_by_unit, start_date, end_date)
 
     # --- 3. คำนวณ Top 5 Branches ---
-    top_branches_query_base = db.query(database.DBParkingViolation)
-    if branch_id:
-        top_branches_query_base = top_branches_query_base.filter(database.DBParkingViolation.branch_id.startswith(branch_id))
-    if start_date:
-        top_branches_query_base = top_branches_query_base.filter(database.DBParkingViolation.timestamp >= start_date)
-    if end_date:
-        top_branches_query_base = top_branches_query_base.filter(database.DBParkingViolation.timestamp < (end_date + timedelta(days=1)))
- 
-    top_branches_query = top_branches_query_base.with_entities(
-        database.DBParkingViolation.branch,
-        database.DBParkingViolation.branch_id,
-        func.count(database.DBParkingViolation.id).label("violation_count")
-    ).filter(database.DBParkingViolation.is_violation == True,
-             database.DBParkingViolation.branch.isnot(None))\
-     .group_by(database.DBParkingViolation.branch, database.DBParkingViolation.branch_id)\
-     .order_by(func.count(database.DBParkingViolation.id).desc())\
-     .limit(5).all()
-
-    top_branches_data = [api_schemas.TopBranchData(name=row.branch, code=row.branch_id, count=row.violation_count) for row in top_branches_query]
+    violation_count = func.sum(model.violation_count)
+    top_branches_rows = (await db.execute(
+        select(
+            model.branch,
+            model.branch_id,
+            violation_count.label("violation_count")
+        )
+        .where(*conditions, model.violation_count > 0, model.branch.isnot(None))
+        .group_by(model.branch, model.branch_id)
+        .order_by(violation_count.desc())
+        .limit(5)
+    )).all()
+
+    top_branches_data = [api_schemas.TopBranchData(name=row.branch, code=row.branch_id, count=row.violation_count) for row in top_branches_rows]
 
     # --- 4. รวบรวมข้อมูลทั้งหมดและส่งกลับในรูปแบบที่กำหนด ---
     return api_schemas.ViolationSummaryResponse(
@@ -305,66 +219,152 @@ def get_violation_summary(
     summary="Get a paginated list of all violating branches"
 )
 
-def get_all_violating_branches(
-    db: Session = Depends(get_db),
+async def get_all_violating_branches(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     page: int = 1,
     limit: int = 10,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None
 ):
-    # --- 1. Base Query ---
-    query_base = db.query(database.DBParkingViolation).filter(
-        database.DBParkingViolation.is_violation == True,
-        database.DBParkingViolation.branch.isnot(None)
+    params = {"page": page, "limit": limit, "start_date": start_date, "end_date": end_date}
+    return await response_cache.respond(
+        request, "all_branches", params, CacheScope(None, start_date, end_date),
+        lambda: build_violating_branches(db, page, limit, start_date, end_date),
     )
 
+async def build_violating_branches(
+    db: AsyncSession,
+    page: int,
+    limit: int,
+    start_date: Optional[date],
+    end_date: Optional[date]
+) -> dict:
+    # --- 1. Base Query (อ่านจาก hourly rollup) ---
+    model = database.DBParkingHourlyRollup
+    conditions = [
+        model.violation_count > 0,
+        model.branch.isnot(None)
+    ]
+
     if start_date:
-        query_base = query_base.filter(database.DBParkingViolation.timestamp >= start_date)
+        conditions.append(model.hour >= start_date)
     if end_date:
-        query_base = query_base.filter(database.DBParkingViolation.timestamp < (end_date + timedelta(days=1)))
+        conditions.append(model.hour < (end_date + timedelta(days=1)))
 
     # --- 2. Query สำหรับนับจำนวนทั้งหมดของกลุ่มสาขา ---
-    total_items = query_base.with_entities(func.count(func.distinct(database.DBParkingViolation.branch_id))).scalar() or 0
+    total_items = (await db.execute(
+        select(func.count(func.distinct(model.branch_id))).where(*conditions)
+    )).scalar() or 0
     
     total_pages = math.ceil(total_items / limit) if total_items else 1
 
     # --- 3. Query สำหรับดึงข้อมูลในหน้านั้น ๆ ---
+    violation_count = func.sum(model.violation_count)
     branches_query = (
-        query_base
-        .with_entities(
-            database.DBParkingViolation.branch.label("branch"),
-            database.DBParkingViolation.branch_id.label("branch_id"),
-            func.count(database.DBParkingViolation.id).label("violation_count")
+        select(
+            model.branch.label("branch"),
+            model.branch_id.label("branch_id"),
+            violation_count.label("violation_count")
         )
-        .group_by(database.DBParkingViolation.branch, database.DBParkingViolation.branch_id)
-        .order_by(func.count(database.DBParkingViolation.id).desc())
+        .where(*conditions)
+        .group_by(model.branch, model.branch_id)
+        .order_by(violation_count.desc())
         .offset((page - 1) * limit)
         .limit(limit)
-        .all()
     )
+    rows = (await db.execute(branches_query)).all()
+
+    # --- 4. แปลงผลลัพธ์ (dict ตรงตาม PaginatedTopBranchResponse ไม่ต้องสร้าง Pydantic model ต่อแถว) ---
+    return {
+        "total_items": total_items,
+        "total_pages": total_pages,
+        "current_page": page,
+        "branches": [{"name": row.branch, "code": row.branch_id, "count": row.violation_count} for row in rows],
+    }
 
-    # --- 4. แปลงผลลัพธ์ ---
-    branches_data = [
-        api_schemas.TopBranchData(name=row.branch, code=row.branch_id, count=row.violation_count)
-        for row in branches_query
-    ]
 
-    return api_schemas.PaginatedTopBranchResponse(
-        total_items=total_items,
-        total_pages=total_pages,
-        current_page=page,
-        branches=branches_data
+#--- ข้อมูลตารางทั้งหมด---#
+# Cursor ของ /events: base64 ของ (timestamp, id) ของแถวขอบหน้า + ทิศทาง ("n" = ถัดไป/เก่ากว่า, "p" = ก่อนหน้า/ใหม่กว่า)
+def _encode_cursor(row, direction: str) -> str:
+    raw = json.dumps({"ts": row.timestamp.isoformat() if row.timestamp else None, "id": row.id, "d": direction})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if data["d"] not in ("n", "p"):
+            raise ValueError(data["d"])
+        return datetime.fromisoformat(data["ts"]), int(data["id"]), data["d"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid cursor: {e}")
+
+def _day_start(d: date) -> datetime:
+    return datetime(d.year, d.month, d.day, tzinfo=timezone.utc)
+
+def _events_filters(branch_id: Optional[str], start_date: Optional[date], end_date: Optional[date],
+                    is_violation_only: bool, in_progress_only: bool) -> list:
+    """เงื่อนไข WHERE ของ /events และ /events/export"""
+    model = database.DBParkingViolation
+    conditions = []
+
+    # เงื่อนไข branch
+    if branch_id:
+        conditions.append(database.like_prefix(model.branch_id, branch_id))
+
+    # --- Logic ใหม่สำหรับ in-progress ---
+    if in_progress_only:
+        conditions += [model.is_violation == True, model.exit_time.is_(None)]
+        # ❌ ไม่ใส่ start_date/end_date filter เพราะต้องการแสดงทั้งหมด
+    else:
+        # ใช้ filter เดิม
+        if start_date:
+            conditions.append(model.timestamp >= start_date)   # ไม่ cast คอลัมน์ เพื่อให้ใช้ index ได้
+        if end_date:
+            conditions.append(model.timestamp < (end_date + timedelta(days=1)))
+        if is_violation_only:
+            conditions.append(model.is_violation == True)
+    return conditions
+
+# คอลัมน์ที่ /events ใช้: select เฉพาะคอลัมน์ได้ Row (tuple) ไม่ต้องสร้าง ORM entity ต่อแถว
+_EVENT_COLUMNS = ("id", "timestamp", "branch_id", "branch", "camera_id", "car_id", "entry_time", "exit_time",
+                  "duration_minutes", "is_violation", "total_parking_sessions", "image_url")
+
+def _event_view(v) -> dict:
+    """แถวจากฐานข้อมูล / archive -> โครงสร้างของ ParkingViolationEvent ที่ Frontend ใช้"""
+    return {
+        "id": v.id,
+        "status": "Violate" if v.is_violation else "Normal",
+        "timestamp": v.timestamp,
+        "branch": {"id": v.branch_id, "name": v.branch},
+        "camera": {"id": v.camera_id},
+        "vehicleId": str(v.car_id),
+        "entryTime": v.entry_time,
+        "exitTime": v.exit_time,
+        "durationMinutes": v.duration_minutes,
+        "isViolation": v.is_violation,
+        "total_parking_sessions": v.total_parking_sessions or 0,
+        "imageUrl": v.image_url,
+    }
+
+async def _count_events(db: AsyncSession, query, params: dict, scope: CacheScope) -> int:
+    """จำนวนรายการต่อชุด filter (COUNT ทั้งชุดแพง: เก็บไว้ EVENTS_COUNT_CACHE_TTL_S วินาที ล้างเมื่อมี ingest ใน scope)"""
+    return await response_cache.cached_count(
+        "events", params, scope, settings.EVENTS_COUNT_CACHE_TTL_S,
+        lambda: _run_count(db, query),
     )
 
+async def _run_count(db: AsyncSession, query) -> int:
+    return (await db.execute(select(func.count()).select_from(query.subquery()))).scalar() or 0
 
-#--- ข้อมูลตารางทั้งหมด---#
 @router.get(
     "/events",
     response_model=api_schemas.PaginatedViolationEventsResponse,
     summary="Get Paginated and Transformed Parking Violation Events"
 )
-def get_violation_events(
-    db: Session = Depends(get_db),
+async def get_violation_events(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     page: int = 1,
     limit: int = 50,
     branch_id: Optional[str] = None,
@@ -372,75 +372,171 @@ def get_violation_events(
     end_date: Optional[date] = None,
     is_violation_only: bool = False,
     in_progress_only: bool = False,
-
-
+    cursor: Optional[str] = Query(None, description="next_cursor / prev_cursor จาก response ก่อนหน้า (ใช้แทน page)"),
+    include_total: bool = Query(False, description="โหมด cursor: คืน total_items / total_pages ด้วย (ค่าจาก cache)"),
 ):
     """
     Endpoint นี้จะดึงข้อมูลเหตุการณ์แบบแบ่งหน้าสำหรับแสดงในตาราง
     และแปลงโครงสร้างข้อมูลให้ตรงตามที่ Frontend ต้องการ
-    """
-    query = db.query(database.DBParkingViolation)
-
-    # เงื่อนไข branch
-    if branch_id:
-        query = query.filter(database.DBParkingViolation.branch_id.startswith(branch_id))
 
-    # --- Logic ใหม่สำหรับ in-progress ---
+    - แบบ page/limit (เดิม): คืน total_items / total_pages ทุกครั้ง
+    - แบบ cursor: ส่ง `cursor` จาก `next_cursor` / `prev_cursor` แล้วดึงต่อจาก (timestamp, id) ของแถวนั้น
+      ความเร็วคงที่ไม่ว่าจะอยู่หน้าลึกแค่ไหน และไม่นับจำนวนทั้งหมดเว้นแต่ขอด้วย include_total
+    """
     if in_progress_only:
-        query = query.filter(
-            database.DBParkingViolation.is_violation == True,
-            database.DBParkingViolation.exit_time.is_(None)
-        )
-        # ❌ ไม่ใส่ start_date/end_date filter เพราะต้องการแสดงทั้งหมด
+        # in-progress ไม่กรองวันที่ จึงถูกกระทบโดย row ของสาขานี้ทุกวัน
+        params = {"page": page, "limit": limit, "branch_id": branch_id or None, "in_progress_only": True}
+        scope = CacheScope(branch_id or None)
     else:
-        # ใช้ filter เดิม
-        if start_date:
-            query = query.filter(cast(database.DBParkingViolation.timestamp, Date) >= start_date)
-        if end_date:
-            query = query.filter(database.DBParkingViolation.timestamp < (end_date + timedelta(days=1)))
-        if is_violation_only:
-            query = query.filter(database.DBParkingViolation.is_violation == True)
-
-    # นับจำนวนรายการทั้งหมด (ก่อนที่จะแบ่งหน้า)
-    total_items = query.count()
+        params = {"page": page, "limit": limit, "branch_id": branch_id or None, "start_date": start_date,
+                  "end_date": end_date, "is_violation_only": is_violation_only}
+        scope = CacheScope(branch_id or None, start_date, end_date)
+    if cursor:
+        params.update(page=None, cursor=cursor, include_total=include_total)
+    return await response_cache.respond(
+        request, "events", params, scope,
+        lambda: build_violation_events(
+            db, page=page, limit=limit, branch_id=branch_id, start_date=start_date, end_date=end_date,
+            is_violation_only=is_violation_only, in_progress_only=in_progress_only,
+            cursor=cursor, include_total=include_total,
+        ),
+    )
 
-    # คำนวณจำนวนหน้าทั้งหมด
-    total_pages = math.ceil(total_items / limit) if total_items else 1
+async def build_violation_events(
+    db: AsyncSession,
+    page: int = 1,
+    limit: int = 50,
+    branch_id: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    is_violation_only: bool = False,
+    in_progress_only: bool = False,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+) -> dict:
+    model = database.DBParkingViolation
+    query = select(*(getattr(model, c) for c in _EVENT_COLUMNS)).where(*_events_filters(branch_id, start_date, end_date, is_violation_only, in_progress_only))
+    if in_progress_only:
+        count_params = {"branch_id": branch_id or None, "in_progress_only": True}
+        count_scope = CacheScope(branch_id or None)
+    else:
+        count_params = {"branch_id": branch_id or None, "start_date": start_date, "end_date": end_date,
+                        "is_violation_only": is_violation_only}
+        count_scope = CacheScope(branch_id or None, start_date, end_date)
+
+    # ช่วงเวลาที่ขอเก่ากว่าข้อมูลที่ยังอยู่ในฐานข้อมูล: อ่านเพิ่มจาก archive ทีละหน้า (ไม่โหลดทั้งช่วง)
+    # แถวใน archive เก่ากว่าแถวในฐานข้อมูลทั้งหมด จึงต่อท้ายผลจากฐานข้อมูลได้ตรง ๆ
+    archive_range = None
+    archived_until = archive.archived_until()
+    if archived_until and start_date and not in_progress_only and _day_start(start_date) < archived_until:
+        archive_range = (
+            _day_start(start_date), _day_start(end_date + timedelta(days=1)) if end_date else None,
+            branch_id or None, is_violation_only,
+        )
 
-    # 1. ดึงข้อมูลดิบจากฐานข้อมูล พร้อมการแบ่งหน้า
-    #    - order_by: เรียงจากเหตุการณ์ล่าสุดไปเก่าสุด
-    #    - offset: ข้ามข้อมูลของหน้าก่อนๆ
-    #    - limit: จำกัดจำนวนข้อมูลต่อหน้า
-    db_violations = query.order_by(database.DBParkingViolation.timestamp.desc())\
-        .offset((page - 1) * limit)\
-        .limit(limit)\
-        .all()
-    
-    # 2. แปลงข้อมูล (Transformation) ทีละรายการ
-    #    นี่คือส่วนที่แปลงข้อมูลจาก ORM Model (DBParkingViolation)
-    #    ไปเป็น Pydantic Schema (ParkingViolationEvent) ที่ออกแบบไว้สำหรับ Frontend
-    results = []
-    for v in db_violations:
-        event = api_schemas.ParkingViolationEvent(
-            id=v.id,
-            status="Violate" if v.is_violation else "Normal",
-            timestamp=v.timestamp,
-            branch=api_schemas.BranchInfo(id=v.branch_id, name=v.branch),
-            camera=api_schemas.CameraInfo(id=v.camera_id),
-            vehicleId=str(v.car_id),
-            entryTime=v.entry_time,
-            exitTime=v.exit_time,
-            durationMinutes=v.duration_minutes,
-            isViolation=v.is_violation,
-            total_parking_sessions=v.total_parking_sessions or 0,
-            imageUrl=v.image_url
+    # นับจำนวนรายการทั้งหมด (ก่อนที่จะแบ่งหน้า): โหมด page ต้องใช้เสมอ, โหมด cursor เมื่อขอ
+    total_items = total_pages = None
+    if not cursor or include_total:
+        live_total = await _count_events(db, query, count_params, count_scope)
+        archived_total = await run_in_threadpool(archive.count_violations, *archive_range) if archive_range else 0
+        total_items = live_total + archived_total
+        total_pages = math.ceil(total_items / limit) if total_items else 1
+
+    # 1. ดึงข้อมูลดิบจากฐานข้อมูล เรียงจากเหตุการณ์ล่าสุดไปเก่าสุด (id ใช้ตัดสินเมื่อ timestamp เท่ากัน)
+    #    ดึงเกิน 1 แถวเพื่อรู้ว่ายังมีหน้าถัดไปหรือไม่ ถ้าฐานข้อมูลมีไม่พอจึงเติมจาก archive
+    newest_first = (model.timestamp.desc(), model.id.desc())
+    has_newer = has_older = False
+    if cursor:
+        cursor_ts, cursor_id, direction = _decode_cursor(cursor)
+        key = tuple_(model.timestamp, model.id)
+        if direction == "n":
+            rows = (await db.execute(
+                query.where(key < tuple_(cursor_ts, cursor_id)).order_by(*newest_first).limit(limit + 1)
+            )).all()
+            if archive_range and len(rows) <= limit:
+                rows += await run_in_threadpool(
+                    archive.page_violations, *archive_range, limit=limit + 1 - len(rows), before=(cursor_ts, cursor_id)
+                )
+            has_older, has_newer = len(rows) > limit, True
+            db_violations = rows[:limit]
+        else:
+            rows = []
+            if archive_range:
+                rows = await run_in_threadpool(
+                    lambda: [SimpleNamespace(**r) for r in islice(archive.iter_violations(*archive_range, after=(cursor_ts, cursor_id)), limit + 1)]
+                )
+            if len(rows) <= limit:
+                rows += (await db.execute(
+                    query.where(key > tuple_(cursor_ts, cursor_id))
+                    .order_by(model.timestamp.asc(), model.id.asc()).limit(limit + 1 - len(rows))
+                )).all()
+            has_newer, has_older = len(rows) > limit, True
+            db_violations = list(reversed(rows[:limit]))
+    else:
+        offset = (page - 1) * limit
+        rows = []
+        if not archive_range or offset < live_total:
+            rows = (await db.execute(
+                query.order_by(*newest_first).offset(offset).limit(limit + 1)
+            )).all()
+        if archive_range and len(rows) <= limit:
+            rows += await run_in_threadpool(
+                archive.page_violations, *archive_range, offset=max(0, offset - live_total), limit=limit + 1 - len(rows)
+            )
+        has_newer, has_older = page > 1, len(rows) > limit
+        db_violations = rows[:limit]
+
+    # 2. แปลงข้อมูลเป็นโครงสร้างของ PaginatedViolationEventsResponse ที่ Frontend ใช้
+    #    (dict ตรง ๆ: serialize ด้วย orjson ได้ทันที ไม่ต้องสร้าง Pydantic model ต่อแถว)
+    return {
+        "total_items": total_items,
+        "total_pages": total_pages,
+        "current_page": None if cursor else page,
+        "events": [_event_view(v) for v in db_violations],
+        "next_cursor": _encode_cursor(db_violations[-1], "n") if db_violations and has_older else None,
+        "prev_cursor": _encode_cursor(db_violations[0], "p") if db_violations and has_newer else None,
+    }
+
+
+@router.get("/events/export", summary="Stream Parking Violation Events as CSV / NDJSON / Parquet")
+async def export_violation_events(
+    fmt: Literal["csv", "ndjson", "parquet"] = Query("csv", alias="format"),
+    branch_id: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    is_violation_only: bool = False,
+    in_progress_only: bool = False,
+):
+    """
+    Export เหตุการณ์ทั้งหมดตาม filter เดียวกับ /events แบบ stream (เรียงจากเก่าไปใหม่)
+    อ่านทีละ EXPORT_CHUNK_ROWS แถวด้วย server-side cursor จึง export ได้หลายล้านแถวโดยหน่วยความจำคงที่
+    ช่วงเวลาที่ย้ายไป archive แล้วจะรวมแถวจาก archive ด้วย
+    """
+    if database.AsyncSessionLocal is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Async database driver is not installed.")
+    try:
+        encoder = violation_export.make_encoder(fmt)
+    except ImportError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="pyarrow is not installed; Parquet export is unavailable.")
+
+    model = database.DBParkingViolation
+    statement = (
+        select(*[getattr(model, c) for c in violation_export.COLUMNS])
+        .where(*_events_filters(branch_id, start_date, end_date, is_violation_only, in_progress_only))
+        .order_by(model.timestamp.asc(), model.id.asc())
+    )
+    archive_range = None
+    archived_until = archive.archived_until()
+    if archived_until and not in_progress_only and (not start_date or _day_start(start_date) < archived_until):
+        archive_range = (
+            _day_start(start_date) if start_date else None,
+            _day_start(end_date + timedelta(days=1)) if end_date else None,
+            branch_id or None, is_violation_only,
         )
-        results.append(event)
-    
-    # 3. ส่งข้อมูลที่แปลงร่างแล้วกลับไป
-    return api_schemas.PaginatedViolationEventsResponse(
-        total_items=total_items,
-        total_pages=total_pages,
-        current_page=page,
-        events=results
-    )
\ No newline at end of file
+
+    file_name = "_".join(["parking_violations"] + [str(d) for d in (start_date, end_date) if d]) + "." + fmt
+    return StreamingResponse(
+        violation_export.stream_events(encoder, statement, archive_range),
+        media_type=violation_export.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'},
+    )
@@ -33,10 +33,12 @@ class ParkingViolationEvent(BaseModel):
         orm_mode = True
 
 class PaginatedViolationEventsResponse(BaseModel):
-    total_items: int
-    total_pages: int
-    current_page: int
+    total_items: Optional[int] = None   # โหมด cursor: None เว้นแต่ขอ include_total
+    total_pages: Optional[int] = None
+    current_page: Optional[int] = None  # โหมด cursor: None
     events: List[ParkingViolationEvent]
+    next_cursor: Optional[str] = None   # หน้าถัดไป (เก่ากว่า)
+    prev_cursor: Optional[str] = None   # หน้าก่อนหน้า (ใหม่กว่า)
 
 class ParkingKpiData(BaseModel):
     """ตรงกับ mockKpiData"""
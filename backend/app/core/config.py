@@ -9,6 +9,92 @@ class Settings:
     POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
     POSTGRES_DB = os.getenv("POSTGRES_DB", "car_parking_db")
 
+    # --- Connection pool (ใช้ทั้ง sync และ async engine) ---
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+    # --- Object storage สำหรับรูปภาพ violation ---
+    # "s3" = อัปโหลดขึ้น S3, "local" = เก็บไว้ในเครื่องแล้วเสิร์ฟผ่าน /media (ใช้ทดสอบแบบ offline)
+    OBJECT_STORE_BACKEND = os.getenv("OBJECT_STORE_BACKEND", "s3")
+    S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "carparkinglopayahc")
+    S3_REGION = os.getenv("S3_REGION", "ap-southeast-2")
+    LOCAL_MEDIA_DIR = os.getenv("LOCAL_MEDIA_DIR", "media")
+    LOCAL_MEDIA_URL = os.getenv("LOCAL_MEDIA_URL", "http://localhost:8000/media")
+    # จำนวน thread ที่ใช้อัปโหลด และจำนวนงานที่รอคิวได้สูงสุดก่อนจะอัปโหลดแบบรอผลใน request นั้นแทน
+    IMAGE_UPLOAD_WORKERS = int(os.getenv("IMAGE_UPLOAD_WORKERS", "4"))
+    IMAGE_UPLOAD_MAX_PENDING = int(os.getenv("IMAGE_UPLOAD_MAX_PENDING", "64"))
+
+    # --- Hourly rollup (parking_hourly_rollup) ---
+    # สร้าง rollup จากข้อมูลเดิมตอน start ถ้าตารางยังว่าง
+    ROLLUP_AUTO_BACKFILL = os.getenv("ROLLUP_AUTO_BACKFILL", "true").lower() == "true"
+    # compaction: คำนวณ rollup ย้อนหลัง N ชั่วโมงใหม่จากข้อมูลดิบทุก ๆ interval วินาที (0 = ปิด)
+    ROLLUP_COMPACTION_INTERVAL_S = int(os.getenv("ROLLUP_COMPACTION_INTERVAL_S", "3600"))
+    ROLLUP_COMPACTION_LOOKBACK_HOURS = int(os.getenv("ROLLUP_COMPACTION_LOOKBACK_HOURS", "48"))
+
+    # --- Monthly partitions ของ parking_violations (Postgres) ---
+    # สร้าง partition ล่วงหน้ากี่เดือน และเก็บข้อมูลในฐานข้อมูลกี่เดือน (0 = ไม่ย้ายไป archive)
+    PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", "3"))
+    PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "24"))
+    PARTITION_MAINTENANCE_INTERVAL_S = int(os.getenv("PARTITION_MAINTENANCE_INTERVAL_S", "86400"))
+    # partition ที่พ้น retention จะถูก export ไปที่นี่ก่อน drop (parquet ต้องติดตั้ง pyarrow, ไม่งั้นใช้ csv.gz)
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+    ARCHIVE_FORMAT = os.getenv("ARCHIVE_FORMAT", "parquet")
+    # จำนวนผลนับแถวของไฟล์ archive (ต่อไฟล์ + filter) ที่จำไว้ (แบ่งหน้าช่วงเวลาเก่าไม่ต้องนับไฟล์ซ้ำ)
+    ARCHIVE_COUNT_CACHE_SIZE = int(os.getenv("ARCHIVE_COUNT_CACHE_SIZE", "1024"))
+
+    # --- Response cache (/parking_violations/summary, /all_branches, /events) ---
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_TTL_S = float(os.getenv("RESPONSE_CACHE_TTL_S", "15"))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+    # ตั้งค่าเมื่อรันหลาย worker process เพื่อใช้ cache ร่วมกัน (ต้องติดตั้ง redis)
+    RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL", "")
+    # อายุของจำนวนรายการทั้งหมดที่ /events นับไว้ต่อชุด filter
+    EVENTS_COUNT_CACHE_TTL_S = float(os.getenv("EVENTS_COUNT_CACHE_TTL_S", "60"))
+    # /events/export: จำนวนแถวต่อ chunk ที่อ่านจาก server-side cursor และ encode ส่งออก (กำหนดหน่วยความจำต่อ export)
+    EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+
+    # --- บีบอัด response (JSON / CSV / NDJSON): Brotli ถ้าติดตั้ง package brotli ไม่งั้น gzip ---
+    RESPONSE_COMPRESSION_ENABLED = os.getenv("RESPONSE_COMPRESSION_ENABLED", "true").lower() == "true"
+    # response ที่เล็กกว่านี้ (byte) ส่งตรง ไม่คุ้มเวลาบีบอัด
+    RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+    RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+    RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+
+    # GET /frames/{id}/latest นับเป็นผู้ชมแบบ thumbnail นานเท่านี้ (worker ส่งภาพย่อต่อให้ผู้ที่ poll อยู่)
+    FRAME_POLL_DEMAND_LEASE_S = float(os.getenv("FRAME_POLL_DEMAND_LEASE_S", "10"))
+    # feed ของกล้องที่ไม่มี worker / ผู้ชม / คน poll นานเท่านี้ (วินาที) ถูกลบ (รวมเฟรมล่าสุดที่ค้างไว้)
+    FRAME_FEED_IDLE_EVICT_S = float(os.getenv("FRAME_FEED_IDLE_EVICT_S", "300"))
+
+    # --- ภาพนิ่งสำหรับหน้าแก้ไข ROI (/video-frame/{camera_id}) ---
+    SNAPSHOT_TTL_S = float(os.getenv("SNAPSHOT_TTL_S", "30"))
+    # รอเฟรมดิบจาก camera worker ที่เชื่อมต่ออยู่นานเท่านี้ ก่อนเปิด source เอง
+    SNAPSHOT_UPLINK_TIMEOUT_S = float(os.getenv("SNAPSHOT_UPLINK_TIMEOUT_S", "3"))
+
+    # --- Log ของ AI process ที่ส่งไปยัง console (/ws/ai-logs) ---
+    # จำนวนบรรทัดล่าสุดที่ส่งย้อนหลังให้ console ที่เพิ่งเชื่อมต่อ
+    LOG_RING_LINES = int(os.getenv("LOG_RING_LINES", "5000"))
+    # รวมบรรทัดที่เข้ามาในช่วงนี้เป็นข้อความเดียว
+    LOG_BATCH_INTERVAL_MS = float(os.getenv("LOG_BATCH_INTERVAL_MS", "100"))
+    # batch ที่ค้างส่งได้ต่อ client ก่อนเริ่มทิ้ง batch เก่าสุด
+    LOG_CLIENT_QUEUE_BATCHES = int(os.getenv("LOG_CLIENT_QUEUE_BATCHES", "100"))
+    LOG_READ_CHUNK_BYTES = int(os.getenv("LOG_READ_CHUNK_BYTES", "65536"))
+
+    # --- KPI สดของ dashboard (/ws/kpi) ---
+    # ข้อความที่ค้างส่งได้ต่อ client ก่อนล้างคิวแล้วส่ง snapshot ใหม่แทน
+    KPI_CLIENT_QUEUE_MESSAGES = int(os.getenv("KPI_CLIENT_QUEUE_MESSAGES", "256"))
+    # event ต่อข้อความสูงสุด (batch ingest ขนาดใหญ่ส่งเฉพาะ event ล่าสุด)
+    KPI_MAX_EVENTS_PER_MESSAGE = int(os.getenv("KPI_MAX_EVENTS_PER_MESSAGE", "200"))
+
+    # --- Latency SLOs (มิลลิวินาที) ---
+    # violation detected (frame capture) -> row committed and visible to the dashboard
+    LATENCY_SLO_VIOLATION_MS = float(os.getenv("LATENCY_SLO_VIOLATION_MS", "5000"))
+    # frame capture -> broadcast to /ws/ai-frames/{camera_id}
+    LATENCY_SLO_FRAME_MS = float(os.getenv("LATENCY_SLO_FRAME_MS", "1500"))
+    # จำนวนกล้องสูงสุดที่เก็บ histogram แยกรายกล้อง (กล้องเกินจากนี้นับรวมเฉพาะภาพรวม)
+    LATENCY_MAX_CAMERAS = int(os.getenv("LATENCY_MAX_CAMERAS", "256"))
+
     @property
     def DATABASE_URL(self) -> str:
         # ใช้ค่าจาก POSTGRES_* เสมอ
@@ -17,5 +103,13 @@ class Settings:
             f"@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
         )
 
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        # ตั้ง ASYNC_DATABASE_URL เองได้ เช่น sqlite+aiosqlite:///./data/test.sqlite สำหรับทดสอบในเครื่อง
+        return os.getenv("ASYNC_DATABASE_URL") or (
+            f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}"
+            f"@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
+        )
+
 settings = Settings()
 print(f"Using Database URL: {settings.DATABASE_URL}")
\ No newline at end of file
@@ -1,26 +1,76 @@
 # backend/app/database.py
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Boolean, JSON , Text
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Boolean, JSON , Text, Index, func, text
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.schema import CreateTable
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from datetime import datetime
+import logging
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 # DATABASE_URL = "sqlite:///./data/db.sqlite" #Path batabase data folder
 DATABASE_URL = settings.DATABASE_URL
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL
+
+def _pool_kwargs(url: str) -> dict:
+    # SQLite ไม่ใช้ QueuePool จึงไม่ต้องกำหนดขนาด pool
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+engine = create_engine(DATABASE_URL, pool_pre_ping=True, **_pool_kwargs(DATABASE_URL))
 
 SessionLocal= sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# --- Async engine (asyncpg สำหรับ Postgres, aiosqlite สำหรับทดสอบในเครื่อง) ---
+# driver เป็น optional: ถ้าไม่ได้ติดตั้ง route ที่ใช้ get_async_db จะตอบ 503 แต่ route แบบ sync ยังทำงานได้
+# asyncpg ใช้ prepared statement: บังคับ custom plan เพื่อให้ LIKE 'prefix%' ที่ส่งเป็น parameter ยังใช้ index ได้
+_async_connect_args = {"server_settings": {"plan_cache_mode": "force_custom_plan"}} if "+asyncpg" in ASYNC_DATABASE_URL else {}
+try:
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=True, connect_args=_async_connect_args,
+                                       **_pool_kwargs(ASYNC_DATABASE_URL))
+    AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+except ImportError as e:
+    logger.warning(f"Async database driver not available ({e}); async routes are disabled.")
+    async_engine = None
+    AsyncSessionLocal = None
 Base = declarative_base()
 
+def like_prefix(column, prefix: str):
+    """column LIKE 'prefix%' โดย escape %, _ ในค่าที่รับมา (ใช้ index แบบ text_pattern_ops ได้ ต่างจาก ilike)"""
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return column.like(escaped + "%", escape="\\")
+
 class DBParkingViolation(Base):
     __tablename__= "parking_violations"
+    # ชุด index ของ query หลัก (สร้างใน migrations/versions/0002_parking_violation_indexes.py)
+    __table_args__ = (
+        # branch_id LIKE 'prefix%' + ช่วงเวลา (summary / events / list)
+        Index("ix_pv_branch_prefix_ts", "branch_id", "timestamp", postgresql_ops={"branch_id": "text_pattern_ops"}),
+        # รถที่ยังจอดเกินอยู่ (/events?in_progress_only=true) เป็นส่วนน้อยของตาราง
+        Index("ix_pv_ongoing", "branch_id", "timestamp", postgresql_ops={"branch_id": "text_pattern_ops"},
+              postgresql_where=text("is_violation AND exit_time IS NULL")),
+        # keyset (timestamp, id) ของ /events และ covering สำหรับ aggregate รายชั่วโมงตามช่วงเวลา (index-only scan)
+        Index("ix_pv_ts_id_cover", "timestamp", "id",
+              postgresql_include=["branch_id", "camera_id", "branch", "is_violation", "exit_time", "duration_minutes"]),
+        # Postgres: แบ่ง partition รายเดือนตาม timestamp (app/services/partitions.py)
+        # primary key บน Postgres เป็น (id, timestamp) ดู _create_parking_violations_postgresql ด้านล่าง
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
     id= Column(Integer, primary_key=True, index=True)
     car_id = Column(Integer, index=True, nullable=True) 
-    timestamp= Column(DateTime(timezone=True), index=True, default=datetime.utcnow)
+    timestamp= Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
     branch = Column(String, index=True)
-    branch_id = Column(String, index=True) # เลขสาขา เซ้ทมั่วไว้ก่อน 
+    branch_id = Column(String) # เลขสาขา เซ้ทมั่วไว้ก่อน 
     camera_id= Column(String, index=True) #เลขสาขา เซ้ทมั่วไว้ก่อน
     event_type = Column(String)
     current_park = Column(Integer, nullable=True) 
@@ -36,6 +86,44 @@ class DBParkingViolation(Base):
                 f"event_type='{self.event_type}', timestamp='{self.timestamp}', "
                 f"image_url='{self.image_url}')>")
     
+@compiles(CreateTable, "postgresql")
+def _create_parking_violations_postgresql(element, compiler, **kw):
+    """
+    ตาราง partitioned ของ Postgres ต้องมี partition key (timestamp) ใน primary key
+    ส่วน dialect อื่น (SQLite สำหรับทดสอบ) ใช้ primary key (id) เดิมที่ autoincrement ได้ ORM อ้างอิงด้วย id อย่างเดียวเหมือนกัน
+    """
+    ddl = compiler.visit_create_table(element, **kw)
+    if element.element.name == DBParkingViolation.__tablename__:
+        ddl = ddl.replace("PRIMARY KEY (id)", "PRIMARY KEY (id, timestamp)")
+    return ddl
+
+class DBParkingHourlyRollup(Base):
+    """
+    ยอดรวมรายชั่วโมงของ parking_violations ต่อ (branch_id, camera_id, hour) ใช้ตอบ dashboard summary
+    ดูแลแบบ incremental ใน transaction เดียวกับการ insert / PATCH (app/services/rollup.py)
+    """
+    __tablename__ = "parking_hourly_rollup"
+    __table_args__ = (
+        # chart / KPI ตามช่วงเวลา: อ่านจาก index อย่างเดียวไม่ต้องเปิด heap
+        Index("ix_rollup_hour_cover", "hour", postgresql_include=[
+            "branch_id", "branch", "session_count", "violation_count", "ongoing_count",
+            "violation_duration_sum", "violation_duration_count", "normal_duration_sum", "normal_duration_count",
+        ]),
+    )
+    branch_id = Column(String, primary_key=True)
+    camera_id = Column(String, primary_key=True)
+    hour = Column(DateTime(timezone=True), primary_key=True)  # date_trunc('hour', timestamp)
+    branch = Column(String, nullable=True)
+    session_count = Column(Integer, nullable=False, default=0)
+    violation_count = Column(Integer, nullable=False, default=0)
+    normal_count = Column(Integer, nullable=False, default=0)
+    ongoing_count = Column(Integer, nullable=False, default=0)
+    violation_duration_sum = Column(Float, nullable=False, default=0.0)
+    violation_duration_count = Column(Integer, nullable=False, default=0)
+    normal_duration_sum = Column(Float, nullable=False, default=0.0)
+    normal_duration_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class DBTableOccupancy(Base):
     __tablename__= "table_occupancy"
     id= Column(Integer, primary_key=True, index=True)
@@ -74,9 +74,16 @@ print(f"AWS_ACCESS_KEY_ID: {os.environ.get('AWS_ACCESS_KEY_ID')}")
 
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from starlette.responses import Response
-from app.api.routers import parking, analytics, config_router, ai_control, frame_router
+from app.api.compression import CompressionMiddleware
+from app.api.responses import FastJSONResponse
+from app.api.routers import parking, analytics, config_router, ai_control, frame_router, metrics_router, kpi_router
 from app import database
+from app.core.config import settings
+from app.services.object_store import image_uploads
+from app.services import partitions, rollup
+import asyncio
 import logging
 
 # --- Configure Logging ---
@@ -87,7 +94,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="AI CCTV Prototype Backend API",
     description="API for receiving and serving AI inference results from CCTV streams.",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=FastJSONResponse,
 )
 
 # # --- 🔽🔽🔽 เพิ่ม Middleware สำหรับวินิจฉัย 🔽🔽🔽 ---
@@ -119,6 +127,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- บีบอัด JSON / CSV ขนาดใหญ่ (ตารางเหตุการณ์, export) ---
+if settings.RESPONSE_COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES,
+        gzip_level=settings.RESPONSE_GZIP_LEVEL,
+        brotli_quality=settings.RESPONSE_BROTLI_QUALITY,
+    )
+
 # --- Database Startup Event ---
 @app.on_event("startup")
 def on_startup():
@@ -127,6 +144,51 @@ def on_startup():
         logger.info("Database tables ensured and ready.")
     except Exception as e:
         logger.critical(f"FATAL: Could not connect to the database on startup: {e}", exc_info=True)
+        return
+
+    # partition ของเดือนนี้ต้องมีก่อนรับ insert แรก (retention ทำใน background task)
+    try:
+        partitions.run_maintenance(settings.PARTITION_PREMAKE_MONTHS, retention_months=0)
+    except Exception as e:
+        logger.error(f"Creating parking_violations partitions failed: {e}", exc_info=True)
+
+    if settings.ROLLUP_AUTO_BACKFILL:
+        db = database.SessionLocal()
+        try:
+            rollup.backfill_if_empty(db)
+        except Exception as e:
+            logger.error(f"Hourly rollup backfill failed: {e}", exc_info=True)
+        finally:
+            db.close()
+
+_background_tasks = set()
+
+@app.on_event("startup")
+async def start_background_tasks():
+    if settings.ROLLUP_COMPACTION_INTERVAL_S > 0 and database.engine.dialect.name == "postgresql":
+        task = asyncio.create_task(rollup.run_compaction_loop(
+            settings.ROLLUP_COMPACTION_INTERVAL_S, settings.ROLLUP_COMPACTION_LOOKBACK_HOURS
+        ))
+        _background_tasks.add(task)
+    if settings.PARTITION_MAINTENANCE_INTERVAL_S > 0 and database.engine.dialect.name == "postgresql":
+        task = asyncio.create_task(partitions.run_maintenance_loop(
+            settings.PARTITION_MAINTENANCE_INTERVAL_S, settings.PARTITION_PREMAKE_MONTHS, settings.PARTITION_RETENTION_MONTHS
+        ))
+        _background_tasks.add(task)
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    # รออัปโหลดรูปที่ค้างในคิวให้เสร็จก่อนปิด (image_url จะถูกอัปเดตครบ)
+    for task in _background_tasks:
+        task.cancel()
+    image_uploads.shutdown(wait=True)
+    if database.async_engine is not None:
+        await database.async_engine.dispose()
+
+# --- รูป violation ที่เก็บแบบ local (OBJECT_STORE_BACKEND=local) ---
+if settings.OBJECT_STORE_BACKEND.lower() == "local":
+    app.mount("/media", StaticFiles(directory=settings.LOCAL_MEDIA_DIR), name="media")
 
 
 # --- Root and Health Endpoints ---
@@ -144,6 +206,8 @@ app.include_router(analytics.router, prefix="/api")
 app.include_router(config_router.router, prefix="/api")
 app.include_router(ai_control.router, prefix="/api")
 app.include_router(frame_router.router, prefix="/api")
+app.include_router(metrics_router.router, prefix="/api")
+app.include_router(kpi_router.router, prefix="/api")
 
 # # --- Log All Registered Routes on Startup ---
 # logger.info("--- REGISTERED ROUTES ---")
@@ -2,7 +2,7 @@
 # --- Schemas for Internal Data & Ingestion ---
 
 from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
+from typing import List, Optional, Literal, Dict
 from datetime import datetime
 
 # --- Base Schema for all Analytics Events ---
@@ -50,12 +50,33 @@ class ChilledBasketAlertData(BaseAnalyticsEvents):
     is_alert_triggered: bool = Field(..., example=True)
     alert_reason: Optional[str] = Field(None, example="time_limit_exceeded")
 
+# --- Latency trace ที่ worker แนบมากับ event ---
+class TraceInfo(BaseModel):
+    frame_idx: Optional[int] = None
+    capture_ts: float = Field(..., description="Wall-clock (epoch seconds) when the frame was captured.")
+    sent_ts: Optional[float] = Field(None, description="Wall-clock (epoch seconds) when the worker sent the request.")
+    hops_ms: Dict[str, float] = Field(default_factory=dict, description="Durations measured inside the worker, e.g. inference/tracking/event.")
+
 # --- Unified Schema for incoming POST data ---
 class AnalyticsDataIn(BaseModel):
     parking_violation: Optional[ParkingViolationData]= None
     table_occupancy: Optional[TableOccupancyData]= None
     chilled_basket_alert: Optional[ChilledBasketAlertData]= None
+    trace: Optional[TraceInfo] = None
+    image_ref: Optional[str] = Field(None, description="Batch ingest only: filename of an image part in the same multipart bundle, or an already uploaded image URL.")
 
 class InferenceResultResponse(BaseModel):
     message: str = Field(..., examples="Parking violation data received.")
     id: int = Field(..., examples=123)
+
+# --- Batch ingest / bulk update ---
+class BatchInferenceResultResponse(BaseModel):
+    message: str = Field(..., examples="3 analytics events received.")
+    ids: List[int] = Field(..., description="Assigned record ids, in the same order as the submitted lines.")
+
+class ParkingViolationBatchUpdate(ParkingViolationUpdate):
+    record_id: int = Field(..., examples=123)
+
+class BatchUpdateResponse(BaseModel):
+    updated: List[int] = Field(default_factory=list)
+    not_found: List[int] = Field(default_factory=list)
@@ -0,0 +1,125 @@
+# app/services/config_store.py
+"""
+config.yaml และไฟล์ ROI ที่ backend อ่าน / เขียน (ไฟล์ชุดเดียวกับที่ AI process ใช้)
+
+- parse ครั้งเดียวแล้ว cache ไว้ ทุกครั้งที่อ่านเช็คแค่ stat (mtime_ns, inode, size):
+  ไฟล์ถูกแก้จากภายนอก (แก้มือ / select_roi.py / AI process) ก็ parse ใหม่เอง
+- index camera_id -> video_source: lookup กล้องเป็น O(1) แทนการไล่ list ทุก request
+- ไฟล์ ROI cache ตาม path แบบเดียวกัน
+- เขียนแบบ atomic: เขียนไฟล์ชั่วคราวใน directory เดียวกัน, fsync แล้ว os.replace
+  ผู้อ่านพร้อมกันเห็นไฟล์เก่าหรือใหม่ทั้งไฟล์ ไม่เห็นไฟล์ที่เขียนไปครึ่งเดียว แล้วอัปเดต cache จากข้อมูลที่เขียนเลย
+
+ค่าที่คืนจาก data() / source() / roi() เป็น object ใน cache: ห้ามแก้ไขตรงๆ (copy.deepcopy ก่อนแก้แล้ว save())
+"""
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import yaml
+
+Signature = Tuple[int, int, int]
+
+
+def _signature(path: Path) -> Optional[Signature]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_ino, st.st_size
+
+
+def atomic_write(path: Path, text: str) -> Signature:
+    """เขียน text ลง path แบบ write-then-rename; คืน signature ของไฟล์ใหม่"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    mode = os.stat(path).st_mode & 0o777 if path.exists() else 0o644
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    return _signature(path)
+
+
+class _CachedFile:
+    def __init__(self, path: Path, parse: Callable[[str], Any]):
+        self.path = path
+        self._parse = parse
+        self._signature: Optional[Signature] = None
+        self.value: Any = None
+
+    def get(self) -> Any:
+        signature = _signature(self.path)
+        if signature is None:
+            raise FileNotFoundError(f"File not found: {self.path}")
+        if signature != self._signature:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.value = self._parse(f.read())
+            self._signature = signature
+        return self.value
+
+    def set(self, value: Any, signature: Signature):
+        self.value = value
+        self._signature = signature
+
+
+class ConfigRepository:
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._config = _CachedFile(path, lambda text: yaml.safe_load(text) or {})
+        self._indexed: Optional[dict] = None
+        self._sources: Dict[str, dict] = {}
+        self._rois: Dict[Path, _CachedFile] = {}
+
+    def data(self) -> dict:
+        """config.yaml ทั้งไฟล์; FileNotFoundError ถ้าไม่มีไฟล์"""
+        with self._lock:
+            data = self._config.get()
+            if data is not self._indexed:
+                self._sources = {}
+                for source in data.get("video_sources") or []:
+                    if source.get("camera_id"):
+                        self._sources.setdefault(source["camera_id"], source)   # camera_id ซ้ำ: ใช้ตัวแรกเหมือนเดิม
+                self._indexed = data
+            return data
+
+    def source(self, camera_id: str) -> Optional[dict]:
+        with self._lock:
+            self.data()
+            return self._sources.get(camera_id)
+
+    def save(self, data: dict):
+        with self._lock:
+            signature = atomic_write(self.path, yaml.dump(data, sort_keys=False))
+            self._config.set(data, signature)
+
+    def roi(self, path: Path) -> Any:
+        """JSON ของไฟล์ ROI; FileNotFoundError ถ้าไม่มีไฟล์, ValueError ถ้าไม่ใช่ JSON"""
+        with self._lock:
+            cached = self._rois.get(path)
+            if cached is None:
+                cached = self._rois[path] = _CachedFile(path, json.loads)
+            return cached.get()
+
+    def save_roi(self, path: Path, data: Any, indent: int = 2):
+        with self._lock:
+            signature = atomic_write(path, json.dumps(data, ensure_ascii=False, indent=indent))
+            cached = self._rois.get(path)
+            if cached is None:
+                cached = self._rois[path] = _CachedFile(path, json.loads)
+            cached.set(data, signature)
+
+
+config_store = ConfigRepository(Path(__file__).resolve().parents[3] / "config.yaml")
@@ -0,0 +1,272 @@
+# app/services/frame_hub.py
+"""
+เฟรมล่าสุดของแต่ละกล้อง (JPEG + sequence + เวลา) ที่ camera worker ส่งมาทาง /ws/ingest/{camera_id}
+(หรือ POST /frames/{camera_id} แบบเดิม)
+
+- เก็บเฉพาะเฟรมล่าสุด: snapshot (/frames/{id}/latest), MJPEG และ WebSocket อ่านจากที่เดียวกัน
+  ผู้ชมกี่คนก็ใช้ JPEG ที่ worker encode มาครั้งเดียว
+- ผู้ชมแต่ละคนมี sender ของตัวเองที่รอเฟรมใหม่แล้วส่ง "เฟรมล่าสุด ณ ตอนนั้น" เสมอ
+  client ที่ช้าจึงข้ามเฟรมที่ถูกแทนที่แล้ว (นับเป็น dropped) แทนการสะสม task ส่งค้างไว้ต่อเฟรม
+- ผู้ชมคือ demand ที่แจ้งกลับไปยัง camera worker ผ่าน /ws/ingest/{camera_id}:
+  none (ไม่มีผู้ชม: worker ไม่วาด / encode / ส่งเฟรม), thumbnail (ผู้ชมทุกคนซ่อนแผงวิดีโอหรือสลับแท็บ:
+  ภาพย่อความถี่ต่ำ), live (มีผู้ชมที่เห็นภาพอยู่อย่างน้อย 1 คน)
+  GET /frames/{id}/latest นับเป็น thumbnail ชั่วคราว (lease) worker จึงส่งภาพย่อต่อให้ผู้ที่ poll อยู่
+- request_snapshot(): ขอเฟรมดิบขนาดเต็มจาก worker ผ่านช่องทางเดียวกัน (ใช้กับหน้าแก้ไข ROI)
+- feed ของ camera_id ใด ๆ ถูกสร้างเมื่อมีผู้ชมหรือ worker เชื่อมต่อ (ผู้ชมเปิดก่อน worker ได้)
+  feed ที่ไม่มี uplink / ผู้ชม / คน poll นานเกิน idle_evict_s ถูกลบ registry จึงไม่โตตาม camera_id ที่ใครก็ขอได้
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from app.services.latency import latency_registry
+
+# ETag ของ snapshot อิง sequence: ใส่เวลาเริ่ม process กัน ETag ซ้ำกับของ process ก่อน restart
+_BOOT_TAG = format(int(time.time()), "x")
+
+
+@dataclass(frozen=True)
+class Frame:
+    data: bytes
+    seq: int
+    received_at: float   # epoch seconds ที่ backend ได้รับ
+    capture_ts: Optional[float] = None
+
+    @property
+    def etag(self) -> str:
+        return f'"{_BOOT_TAG}-{self.seq}"'
+
+
+class CameraFeed:
+    def __init__(self, camera_id: str):
+        self.camera_id = camera_id
+        self.latest: Optional[Frame] = None
+        self._cond = asyncio.Condition()
+        self._recorded_seq = 0
+        self.viewers = 0
+        self.live_viewers = 0
+        # monotonic time ที่ thumbnail demand จาก /latest หมดอายุ
+        self._poll_lease_until = 0.0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        # จำนวน /ws/ingest ที่เชื่อมต่ออยู่: worker ตัวเก่ากับตัวใหม่ซ้อนกันได้ช่วงสั้น ๆ (restart / reconnect)
+        self.uplinks = 0
+        self.telemetry: Optional[dict] = None
+        self.telemetry_at: Optional[float] = None
+        self._snapshot_requested = False
+        self._snapshot_waiters: List[asyncio.Future] = []
+        # monotonic time ที่มีการใช้งานล่าสุด (ใช้ตัดสินว่า feed ว่างนานพอจะลบได้หรือยัง)
+        self.last_active = time.monotonic()
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def is_idle(self, now: float, idle_s: float) -> bool:
+        in_use = self.uplinks or self.viewers or self._snapshot_waiters or now < self._poll_lease_until
+        return not in_use and now - self.last_active >= idle_s
+
+    @property
+    def uplink_connected(self) -> bool:
+        return self.uplinks > 0
+
+    def uplink_opened(self):
+        self.uplinks += 1
+        self.touch()
+
+    def uplink_closed(self) -> bool:
+        """True เมื่อ uplink สุดท้ายของกล้องหลุด (กล้อง offline)"""
+        self.uplinks -= 1
+        self.touch()
+        return self.uplinks == 0
+
+    async def publish(self, data: bytes, capture_ts: Optional[float] = None) -> Frame:
+        async with self._cond:
+            seq = self.latest.seq + 1 if self.latest else 1
+            self.latest = Frame(data, seq, time.time(), capture_ts)
+            self.published += 1
+            self.last_active = time.monotonic()
+            self._cond.notify_all()
+        return self.latest
+
+    async def next_frame(self, after_seq: int, timeout: Optional[float] = None) -> Optional[Frame]:
+        """เฟรมล่าสุดที่ใหม่กว่า after_seq (รอถ้ายังไม่มี); None เมื่อครบ timeout"""
+        async with self._cond:
+            try:
+                await asyncio.wait_for(
+                    self._cond.wait_for(lambda: self.latest is not None and self.latest.seq > after_seq), timeout
+                )
+            except asyncio.TimeoutError:
+                return None
+            return self.latest
+
+    @property
+    def demand(self) -> Tuple[str, int, int]:
+        polled = time.monotonic() < self._poll_lease_until
+        level = "live" if self.live_viewers else ("thumbnail" if self.viewers or polled else "none")
+        return level, self.viewers, self.live_viewers
+
+    async def touch_poll_demand(self, lease_s: float):
+        """มีคนขอ /latest: อย่างน้อยให้ worker ส่งภาพย่อต่อไปอีก lease_s วินาที"""
+        async with self._cond:
+            self._poll_lease_until = time.monotonic() + lease_s
+            self._cond.notify_all()
+
+    async def add_viewer(self, live: bool = True):
+        async with self._cond:
+            self.viewers += 1
+            self.live_viewers += 1 if live else 0
+            self._cond.notify_all()
+
+    async def remove_viewer(self, live: bool = True):
+        async with self._cond:
+            self.viewers -= 1
+            self.live_viewers -= 1 if live else 0
+            self.last_active = time.monotonic()
+            self._cond.notify_all()
+
+    async def set_viewer_live(self, was_live: bool, live: bool):
+        """ผู้ชมซ่อน / แสดงแผงวิดีโออีกครั้ง"""
+        if was_live == live:
+            return
+        async with self._cond:
+            self.live_viewers += 1 if live else -1
+            self._cond.notify_all()
+
+    async def next_uplink_message(self, last_demand: Tuple[str, int, int]) -> dict:
+        """
+        ข้อความถัดไปที่ต้องส่งให้ worker: ขอ snapshot ที่ค้างอยู่ หรือ demand
+        (ระดับ, จำนวนผู้ชม, จำนวนผู้ชมที่เห็นภาพ) เมื่อต่างจาก last_demand
+        """
+        async with self._cond:
+            while not (self._snapshot_requested or self.demand != last_demand):
+                # lease ของ /latest หมดอายุตามเวลา ไม่มีใคร notify: ตื่นมาตรวจ demand เองตอนหมดอายุ
+                remaining = self._poll_lease_until - time.monotonic()
+                try:
+                    await asyncio.wait_for(self._cond.wait(), remaining if remaining > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+            if self._snapshot_requested:
+                self._snapshot_requested = False
+                return {"type": "snapshot_request"}
+            level, viewers, live_viewers = self.demand
+            return {"type": "demand", "level": level, "viewers": viewers, "live": live_viewers}
+
+    async def request_snapshot(self, timeout: float) -> Optional[bytes]:
+        """เฟรมดิบขนาดเต็มจาก worker; None ถ้า worker ไม่ได้เชื่อมต่อหรือไม่ตอบภายใน timeout"""
+        if not self.uplink_connected:
+            return None
+        waiter = asyncio.get_running_loop().create_future()
+        async with self._cond:
+            self._snapshot_waiters.append(waiter)
+            self._snapshot_requested = True
+            self._cond.notify_all()
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if waiter in self._snapshot_waiters:
+                self._snapshot_waiters.remove(waiter)
+
+    def resolve_snapshot(self, data: bytes):
+        for waiter in self._snapshot_waiters:
+            if not waiter.done():
+                waiter.set_result(data)
+        self._snapshot_waiters.clear()
+
+    def set_telemetry(self, data: dict):
+        self.telemetry = data
+        self.telemetry_at = time.time()
+
+    def mark_delivered(self, frame: Frame, after_seq: int):
+        """นับเฟรมที่ส่งถึงผู้ชมหนึ่งคน; latency ของ broadcast บันทึกครั้งเดียวต่อเฟรม"""
+        self.delivered += 1
+        if after_seq:
+            self.dropped += frame.seq - after_seq - 1
+        if frame.seq > self._recorded_seq:
+            self._recorded_seq = frame.seq
+            latency_registry.record_since("frame_capture_to_broadcast", frame.capture_ts, self.camera_id)
+
+    def stats(self) -> dict:
+        return {
+            "demand": self.demand[0],
+            "viewers": self.viewers,
+            "live_viewers": self.live_viewers,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "last_seq": self.latest.seq if self.latest else None,
+            "last_frame_age_s": round(time.time() - self.latest.received_at, 3) if self.latest else None,
+            "last_frame_bytes": len(self.latest.data) if self.latest else None,
+            "uplink_connected": self.uplink_connected,
+            "uplinks": self.uplinks,
+            "telemetry": self.telemetry,
+            "telemetry_age_s": round(time.time() - self.telemetry_at, 3) if self.telemetry_at else None,
+        }
+
+
+class FrameHub:
+    # ตรวจหา feed ที่ว่างอย่างมากทุก ๆ เท่านี้วินาที (ตอนสร้าง feed ใหม่หรืออ่าน stats)
+    EVICT_CHECK_INTERVAL_S = 1.0
+
+    def __init__(self, idle_evict_s: float = 300.0):
+        self.idle_evict_s = idle_evict_s
+        self._feeds: Dict[str, CameraFeed] = {}
+        self._next_evict_check = 0.0
+        self.evicted_feeds = 0
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        if now < self._next_evict_check:
+            return
+        self._next_evict_check = now + self.EVICT_CHECK_INTERVAL_S
+        for camera_id in [cid for cid, feed in self._feeds.items() if feed.is_idle(now, self.idle_evict_s)]:
+            del self._feeds[camera_id]
+            self.evicted_feeds += 1
+
+    def feed(self, camera_id: str) -> CameraFeed:
+        """feed ของกล้อง (สร้างถ้ายังไม่มี) ผู้เรียกต้อง add_viewer / uplink_opened ภายใน idle_evict_s"""
+        feed = self._feeds.get(camera_id)
+        if feed is None:
+            self._evict_idle()
+            feed = self._feeds[camera_id] = CameraFeed(camera_id)
+        feed.touch()
+        return feed
+
+    def get(self, camera_id: str) -> Optional[CameraFeed]:
+        return self._feeds.get(camera_id)
+
+    def latest(self, camera_id: str) -> Optional[Frame]:
+        feed = self._feeds.get(camera_id)
+        return feed.latest if feed else None
+
+    def stats(self) -> dict:
+        self._evict_idle()
+        cameras = {camera_id: feed.stats() for camera_id, feed in self._feeds.items()}
+        # CPU ที่ worker ไม่ต้องใช้วาด / encode เฟรมที่ไม่มีคนดู รวมต่อเครื่อง (จาก telemetry ล่าสุดของแต่ละกล้อง)
+        hosts: Dict[str, dict] = {}
+        for camera_id, feed in self._feeds.items():
+            telemetry = feed.telemetry or {}
+            if not isinstance(telemetry.get("host"), str) or not telemetry["host"]:
+                continue
+            host = hosts.setdefault(telemetry["host"], {"cameras": [], "cpu_saved_ms": 0.0, "process_cpu_ms": 0.0, "frames_skipped": 0})
+            host["cameras"].append(camera_id)
+            host["cpu_saved_ms"] += telemetry.get("cpu_saved_ms") or 0.0
+            host["process_cpu_ms"] += (telemetry.get("process_cpu_s") or 0.0) * 1000.0
+            host["frames_skipped"] += telemetry.get("frames_skipped") or 0
+        for host in hosts.values():
+            spent_and_saved = host["process_cpu_ms"] + host["cpu_saved_ms"]
+            host["cpu_saved_pct"] = round(100.0 * host["cpu_saved_ms"] / spent_and_saved, 2) if spent_and_saved else None
+            host["cpu_saved_ms"] = round(host["cpu_saved_ms"], 1)
+            host["process_cpu_ms"] = round(host["process_cpu_ms"], 1)
+        return {"cameras": cameras, "hosts": hosts, "evicted_feeds": self.evicted_feeds}
+
+
+def _build_hub() -> FrameHub:
+    from app.core.config import settings
+    return FrameHub(idle_evict_s=settings.FRAME_FEED_IDLE_EVICT_S)
+
+
+frame_hub = _build_hub()
@@ -0,0 +1,265 @@
+# app/services/kpi_hub.py
+"""
+KPI สดของ dashboard ที่ push ไปยัง browser ทาง /ws/kpi (แทนการ poll /parking_violations/summary ซ้ำ ๆ)
+
+- state อยู่ในหน่วยความจำและอัปเดตจาก ingest path ไม่มี query ต่อ client:
+  * รถที่กำลังจอดเกิน (is_violation และยังไม่มี exit_time): seed จาก DB ครั้งเดียวตอน client แรกเชื่อมต่อ
+    จากนั้นเพิ่มจาก POST /analytics และลบเมื่อ PATCH exit time
+  * จำนวนรถที่จอดอยู่ต่อกล้อง จาก telemetry ของ camera worker (/ws/ingest)
+  * parking event ใหม่ตามที่ ingest เข้ามา
+- client กรองตาม prefix ของ branch_id (เหมือน filter branch_id ของ /summary) ด้วย
+  {"type": "subscribe", "branch_id": "..."} ได้ snapshot ของสาขาที่ตรงกันก่อน แล้วตามด้วย delta
+- delta บอกยอดรวมแบบค่าจริง (ไม่ใช่ +1 / -1) และ ongoing อ้างอิงด้วย id: ได้ซ้ำก็ไม่ผิด
+- client แต่ละคนมีคิวของตัวเอง คิวเต็ม (รับไม่ทัน) ก็ล้างคิวแล้วส่ง snapshot ใหม่แทน delta ที่ค้าง
+จำนวน browser ที่เปิด dashboard จึงไม่เพิ่ม query ของ DB
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from app import database
+from app.core.config import settings
+from app.services.config_store import config_store
+
+logger = logging.getLogger(__name__)
+
+_EVENT_FIELDS = ("branch_id", "branch", "camera_id", "car_id", "timestamp", "entry_time", "exit_time",
+                 "duration_minutes", "is_violation", "current_park", "total_parking_sessions")
+_ONGOING_FIELDS = ("branch_id", "branch", "camera_id", "car_id", "timestamp", "entry_time")
+
+
+def _view(record_id: int, row, fields: Tuple[str, ...]) -> dict:
+    view = {"id": record_id}
+    for name in fields:
+        value = row.get(name) if isinstance(row, dict) else getattr(row, name, None)
+        view[name] = value.isoformat() if isinstance(value, datetime) else value
+    return view
+
+
+class KpiClient:
+    def __init__(self, branch_prefix: Optional[str], max_messages: int):
+        self.branch_prefix = branch_prefix or None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_messages)
+        self.resyncs = 0
+
+    def matches(self, branch_id: Optional[str]) -> bool:
+        return self.branch_prefix is None or (branch_id or "").startswith(self.branch_prefix)
+
+    def resync(self):
+        """ทิ้ง delta ที่ค้างแล้วให้ sender ส่ง snapshot ของ state ปัจจุบัน"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait({"type": "resync"})
+
+    def put(self, message: dict):
+        if self.queue.full():
+            self.resyncs += 1
+            self.resync()
+        else:
+            self.queue.put_nowait(message)
+
+
+class KpiHub:
+    def __init__(self, client_queue_messages: int, max_events_per_message: int):
+        self.client_queue_messages = client_queue_messages
+        self.max_events_per_message = max_events_per_message
+        self.clients: Set[KpiClient] = set()
+        self.ongoing: Dict[int, dict] = {}
+        self._ongoing_by_branch: Counter = Counter()
+        self.cameras: Dict[str, dict] = {}
+        self._seeded = False
+        self._seed_lock: Optional[asyncio.Lock] = None
+        self._closed_while_seeding: Optional[Set[int]] = None
+        self.events_total = 0
+        self.messages_total = 0
+
+    # --- state ---
+    def _add_ongoing(self, view: dict) -> bool:
+        if view["id"] in self.ongoing:
+            return False
+        self.ongoing[view["id"]] = view
+        self._ongoing_by_branch[view["branch_id"] or ""] += 1
+        return True
+
+    def _remove_ongoing(self, record_id: int) -> Optional[dict]:
+        view = self.ongoing.pop(record_id, None)
+        if view is not None:
+            branch_id = view["branch_id"] or ""
+            self._ongoing_by_branch[branch_id] -= 1
+            if self._ongoing_by_branch[branch_id] <= 0:
+                del self._ongoing_by_branch[branch_id]
+        return view
+
+    def _ongoing_count(self, client: KpiClient) -> int:
+        return sum(n for branch_id, n in self._ongoing_by_branch.items() if client.matches(branch_id))
+
+    def _parked_count(self, client: KpiClient) -> int:
+        return sum(c["current_parked"] or 0 for c in self.cameras.values() if client.matches(c["branch_id"]))
+
+    def snapshot(self, client: KpiClient) -> dict:
+        return {
+            "type": "snapshot",
+            "branch_id": client.branch_prefix,
+            "ongoing_violations": self._ongoing_count(client),
+            "ongoing": [v for v in self.ongoing.values() if client.matches(v["branch_id"])],
+            "current_parked": self._parked_count(client),
+            "cameras": {camera_id: c for camera_id, c in self.cameras.items() if client.matches(c["branch_id"])},
+            "server_time": time.time(),
+        }
+
+    async def ensure_seeded(self):
+        """โหลดรถที่กำลังจอดเกินจาก DB ครั้งเดียว (ล้มเหลวก็ลองใหม่ตอน client ถัดไปเชื่อมต่อ)"""
+        if self._seeded or database.AsyncSessionLocal is None:
+            return
+        if self._seed_lock is None:
+            self._seed_lock = asyncio.Lock()
+        async with self._seed_lock:
+            if self._seeded:
+                return
+            model = database.DBParkingViolation
+            # PATCH exit time ที่เข้ามาระหว่าง query: row ที่ query ได้อาจยังไม่มี exit_time
+            self._closed_while_seeding = set()
+            try:
+                async with database.AsyncSessionLocal() as db:
+                    rows = (await db.execute(
+                        select(model.id, *(getattr(model, name) for name in _ONGOING_FIELDS))
+                        .where(model.is_violation.is_(True), model.exit_time.is_(None))
+                    )).all()
+            except Exception as e:
+                logger.error(f"Loading ongoing violations for the KPI stream failed: {e}")
+                return
+            finally:
+                closed, self._closed_while_seeding = self._closed_while_seeding, None
+            for row in rows:
+                if row.id not in closed:
+                    self._add_ongoing(_view(row.id, row, _ONGOING_FIELDS))
+            self._seeded = True
+            logger.info(f"KPI stream loaded {len(self.ongoing)} ongoing violations.")
+            for client in self.clients:
+                client.resync()
+
+    # --- ingest path ---
+    def events_ingested(self, events: Iterable[Tuple[int, dict]]):
+        """parking violation ที่ commit แล้ว: (record id, row ที่ insert)"""
+        views, added = [], []
+        for record_id, row in events:
+            views.append(_view(record_id, row, _EVENT_FIELDS))
+            if row.get("is_violation") is True and row.get("exit_time") is None:
+                view = _view(record_id, row, _ONGOING_FIELDS)
+                if self._add_ongoing(view):
+                    added.append(view)
+        if not views:
+            return
+        self.events_total += len(views)
+        for client in self.clients:
+            matched = [v for v in views if client.matches(v["branch_id"])]
+            if not matched:
+                continue
+            # backlog หลังระบบล่มอาจมาทีละหลายพันแถว: ส่งเฉพาะล่าสุด ยอดรวมยังถูกเสมอ
+            client.put({
+                "type": "events",
+                "events": matched[-self.max_events_per_message:],
+                "count": len(matched),
+            })
+            client_added = [v for v in added if client.matches(v["branch_id"])]
+            if client_added:
+                client.put({"type": "ongoing", "added": client_added, "removed": [],
+                            "ongoing_violations": self._ongoing_count(client)})
+
+    def exits_recorded(self, record_ids: Iterable[int]):
+        """PATCH exit time: รถออกแล้ว ไม่นับเป็นรถที่กำลังจอดเกิน"""
+        removed = []
+        for record_id in record_ids:
+            if self._closed_while_seeding is not None:
+                self._closed_while_seeding.add(record_id)
+            view = self._remove_ongoing(record_id)
+            if view is not None:
+                removed.append(view)
+        if not removed:
+            return
+        for client in self.clients:
+            client_removed = [v["id"] for v in removed if client.matches(v["branch_id"])]
+            if client_removed:
+                client.put({"type": "ongoing", "added": [], "removed": client_removed,
+                            "ongoing_violations": self._ongoing_count(client)})
+
+    def _camera_branch(self, camera_id: str, telemetry: dict) -> Optional[str]:
+        if telemetry.get("branch_id"):
+            return telemetry["branch_id"]
+        known = self.cameras.get(camera_id)
+        if known and known["branch_id"]:
+            return known["branch_id"]
+        try:
+            source = config_store.source(camera_id)
+        except (OSError, ValueError):
+            source = None
+        return source.get("branch_id") if source else None
+
+    def telemetry(self, camera_id: str, telemetry: dict):
+        """telemetry ของ camera worker: push เฉพาะเมื่อจำนวนรถเปลี่ยน (worker ส่งทุกไม่กี่วินาที)"""
+        camera = {
+            "branch_id": self._camera_branch(camera_id, telemetry),
+            "current_parked": telemetry.get("current_parked"),
+            "total_parking_sessions": telemetry.get("total_parking_sessions"),
+            "online": True,
+        }
+        previous = self.cameras.get(camera_id)
+        self.cameras[camera_id] = camera
+        if previous == camera:
+            return
+        self._broadcast_camera(camera_id, camera)
+
+    def camera_offline(self, camera_id: str):
+        camera = self.cameras.get(camera_id)
+        if camera is None or not camera["online"]:
+            return
+        camera = self.cameras[camera_id] = {**camera, "current_parked": None, "online": False}
+        self._broadcast_camera(camera_id, camera)
+
+    def _broadcast_camera(self, camera_id: str, camera: dict):
+        for client in self.clients:
+            if client.matches(camera["branch_id"]):
+                client.put({"type": "parked", "camera_id": camera_id, **camera,
+                            "current_parked_total": self._parked_count(client)})
+
+    # --- clients ---
+    async def subscribe(self, branch_prefix: Optional[str] = None) -> KpiClient:
+        """client ใหม่: ข้อความแรกในคิวคือ snapshot (สร้างตอนส่ง จึงเป็น state ล่าสุดเสมอ)"""
+        await self.ensure_seeded()
+        client = KpiClient(branch_prefix, self.client_queue_messages)
+        client.resync()
+        self.clients.add(client)
+        return client
+
+    def set_filter(self, client: KpiClient, branch_prefix: Optional[str]):
+        client.branch_prefix = branch_prefix or None
+        client.resync()
+
+    def unsubscribe(self, client: KpiClient):
+        self.clients.discard(client)
+
+    async def next_message(self, client: KpiClient) -> dict:
+        message = await client.queue.get()
+        if message["type"] == "resync":
+            message = self.snapshot(client)
+        self.messages_total += 1
+        return message
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self.clients),
+            "seeded": self._seeded,
+            "ongoing_violations": len(self.ongoing),
+            "cameras": len(self.cameras),
+            "events_total": self.events_total,
+            "messages_total": self.messages_total,
+            "resyncs": sum(c.resyncs for c in self.clients),
+        }
+
+
+kpi_hub = KpiHub(settings.KPI_CLIENT_QUEUE_MESSAGES, settings.KPI_MAX_EVENTS_PER_MESSAGE)
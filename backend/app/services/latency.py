@@ -0,0 +1,144 @@
+# app/services/latency.py
+"""
+In-memory latency histograms per hop (capture -> inference -> tracking -> event -> upload -> DB insert / broadcast).
+
+Workers stamp each frame at capture (see AI/aicar/latency.py) and send the stamps with events and frames;
+the ingest and frame endpoints record the remaining hops here. Hops that have an SLO configured are checked
+on every sample and a warning is logged (at most once per `alert_interval_s` per hop) when it is breached.
+
+The frame endpoints are reachable without an API key, so worker hop names are limited to WORKER_HOPS and
+at most `max_cameras` cameras get their own histograms; anything else cannot grow the registry.
+"""
+import bisect
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# bucket upper bounds in milliseconds (the last bucket is +inf)
+DEFAULT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# hops that FrameTrace.mark() records inside the worker (AI/aicar/camera_worker_process.py, frame_uplink.py)
+WORKER_HOPS = frozenset({"inference", "tracking", "event", "annotate", "encode"})
+
+
+class LatencyHistogram:
+    def __init__(self, buckets_ms: Iterable[float] = DEFAULT_BUCKETS_MS):
+        self.bounds = list(buckets_ms)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect.bisect_left(self.bounds, value_ms)] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (max observed value for the overflow bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for idx, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return float(self.bounds[idx]) if idx < len(self.bounds) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.quantile(0.50),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": {
+                **{f"le_{b}": c for b, c in zip(self.bounds, self.counts)},
+                "le_inf": self.counts[-1],
+            },
+        }
+
+
+class LatencyRegistry:
+    def __init__(self, slos_ms: Optional[Dict[str, float]] = None, alert_interval_s: float = 60.0,
+                 max_cameras: int = 256):
+        self.slos_ms = dict(slos_ms or {})
+        self.alert_interval_s = alert_interval_s
+        self.max_cameras = max_cameras
+        self.untracked_camera_samples = 0
+        self._hops: Dict[str, LatencyHistogram] = {}
+        self._per_camera: Dict[str, Dict[str, LatencyHistogram]] = {}
+        self._breaches: Dict[str, int] = {}
+        self._last_alert: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, hop: str, value_ms: float, camera_id: Optional[str] = None):
+        if value_ms is None or value_ms < 0:
+            return
+        with self._lock:
+            self._hops.setdefault(hop, LatencyHistogram()).observe(value_ms)
+            if camera_id:
+                camera_hops = self._per_camera.get(camera_id)
+                if camera_hops is None and len(self._per_camera) < self.max_cameras:
+                    camera_hops = self._per_camera[camera_id] = {}
+                if camera_hops is not None:
+                    camera_hops.setdefault(hop, LatencyHistogram()).observe(value_ms)
+                else:
+                    self.untracked_camera_samples += 1
+            slo = self.slos_ms.get(hop)
+            breached = slo is not None and value_ms > slo
+            if breached:
+                self._breaches[hop] = self._breaches.get(hop, 0) + 1
+                now = time.monotonic()
+                should_alert = now - self._last_alert.get(hop, 0.0) >= self.alert_interval_s
+                if should_alert:
+                    self._last_alert[hop] = now
+        if breached and should_alert:
+            logger.warning(f"[SLO] '{hop}' latency {value_ms:.0f} ms exceeded SLO of {slo:.0f} ms (camera_id={camera_id}).")
+
+    def record_since(self, hop: str, start_wall_ts: Optional[float], camera_id: Optional[str] = None, now: Optional[float] = None):
+        """Records (now - start_wall_ts) for a wall-clock timestamp sent by a worker."""
+        if start_wall_ts is None:
+            return
+        self.record(hop, ((now or time.time()) - start_wall_ts) * 1000.0, camera_id)
+
+    def record_worker_hops(self, hops_ms: Optional[Dict[str, float]], camera_id: Optional[str] = None):
+        if not isinstance(hops_ms, dict):
+            return
+        for hop, value_ms in hops_ms.items():
+            if hop in WORKER_HOPS:
+                self.record(f"worker_{hop}", float(value_ms), camera_id)
+
+    def snapshot(self, camera_id: Optional[str] = None) -> dict:
+        with self._lock:
+            hops = self._per_camera.get(camera_id, {}) if camera_id else self._hops
+            data = {hop: hist.to_dict() for hop, hist in hops.items()}
+            slos = {
+                hop: {
+                    "slo_ms": slo,
+                    "breaches": self._breaches.get(hop, 0),
+                    "p99_ms": self._hops[hop].quantile(0.99) if hop in self._hops else None,
+                }
+                for hop, slo in self.slos_ms.items()
+            }
+            cameras = sorted(self._per_camera.keys())
+            untracked = self.untracked_camera_samples
+        return {"hops": data, "slos": slos, "cameras": cameras, "untracked_camera_samples": untracked}
+
+
+def _build_registry() -> LatencyRegistry:
+    from app.core.config import settings
+    return LatencyRegistry(slos_ms={
+        "violation_detect_to_visible": settings.LATENCY_SLO_VIOLATION_MS,
+        "frame_capture_to_broadcast": settings.LATENCY_SLO_FRAME_MS,
+    }, max_cameras=settings.LATENCY_MAX_CAMERAS)
+
+
+latency_registry = _build_registry()
@@ -0,0 +1,135 @@
+# app/services/log_stream.py
+"""
+Log ของ AI process (stdout / stderr) ที่ส่งไปยัง console บนหน้าเว็บ (/ws/ai-logs)
+
+- อ่าน pipe ทีละ chunk (สูงสุด LOG_READ_CHUNK_BYTES ต่อครั้ง) แทนการเรียก thread pool ทุกบรรทัด
+- รวมบรรทัดที่เข้ามาแล้วส่งเป็นข้อความเดียว (คั่นด้วย \\n) ทุก LOG_BATCH_INTERVAL_MS
+- เก็บ LOG_RING_LINES บรรทัดล่าสุดไว้ใน ring buffer: console ที่เพิ่งเปิดได้ log ย้อนหลังทันที
+- client แต่ละคนมีคิวและ sender ของตัวเอง (ไม่มี lock กลางระหว่าง send) client ที่รับไม่ทัน
+  คิวเต็มก็ทิ้ง batch เก่าสุดของ client นั้น (นับเป็น dropped_lines) คนอื่นไม่ต้องรอ
+"""
+import asyncio
+import codecs
+import locale
+import os
+import time
+from collections import deque
+from typing import Deque, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+
+class LogClient:
+    def __init__(self, max_batches: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_batches)
+        self.dropped_lines = 0
+
+    def put(self, text: str, lines: int):
+        if self.queue.full():
+            _, dropped = self.queue.get_nowait()
+            self.dropped_lines += dropped
+        self.queue.put_nowait((text, lines))
+
+
+class LogStream:
+    def __init__(self, ring_lines: int, batch_interval_s: float, client_queue_batches: int,
+                 read_chunk_bytes: int, replay_batch_lines: int = 500):
+        self.ring: Deque[str] = deque(maxlen=ring_lines)
+        self.batch_interval_s = batch_interval_s
+        self.client_queue_batches = client_queue_batches
+        self.read_chunk_bytes = read_chunk_bytes
+        self.replay_batch_lines = replay_batch_lines
+        self.clients: Set[LogClient] = set()
+        self._pending: List[str] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.lines_total = 0
+        self.batches_total = 0
+        self.dropped_lines = 0
+        self._rate: Deque[Tuple[float, int]] = deque()   # (เวลา, จำนวนบรรทัด) ของ batch ใน 10 วินาทีล่าสุด
+
+    def publish(self, *lines: str):
+        """เพิ่มบรรทัดเข้าคิวส่ง (ส่งจริงใน batch ถัดไป)"""
+        self._pending.extend(lines)
+        self.lines_total += len(lines)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def read_pipe(self, stream, name: str):
+        """อ่าน pipe ของ AI process (binary) ทีละ chunk จนปิด แล้วแยกเป็นบรรทัด"""
+        loop = asyncio.get_running_loop()
+        fd = stream.fileno()
+        decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))(errors="replace")
+        tail = ""
+        while True:
+            chunk = await loop.run_in_executor(None, os.read, fd, self.read_chunk_bytes)
+            if not chunk:
+                break
+            lines = (tail + decoder.decode(chunk)).split("\n")
+            tail = lines.pop()
+            if lines:
+                self.publish(*(f"[{name}] {line.rstrip()}" for line in lines))
+        tail += decoder.decode(b"", final=True)
+        if tail:
+            self.publish(f"[{name}] {tail.rstrip()}")
+        self.publish(f"[{name}] -- stream closed --")
+
+    def _flush(self):
+        lines, self._pending = self._pending, []
+        # เข้า ring buffer ตอนส่ง: client ที่เพิ่ง subscribe ได้แต่ละบรรทัดครั้งเดียว (จาก replay หรือ batch)
+        self.ring.extend(lines)
+        text = "\n".join(lines)
+        for client in self.clients:
+            before = client.dropped_lines
+            client.put(text, len(lines))
+            self.dropped_lines += client.dropped_lines - before
+        self.batches_total += 1
+        now = time.monotonic()
+        self._rate.append((now, len(lines)))
+        while self._rate and self._rate[0][0] < now - 10.0:
+            self._rate.popleft()
+
+    async def run(self):
+        """ส่ง batch ทุก batch_interval_s (เฉพาะเมื่อมีบรรทัดใหม่)"""
+        self._wakeup = asyncio.Event()
+        if self._pending:
+            self._wakeup.set()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await asyncio.sleep(self.batch_interval_s)
+            if self._pending:
+                self._flush()
+
+    def subscribe(self) -> LogClient:
+        """client ใหม่: คิวเริ่มด้วย log ย้อนหลังจาก ring buffer (ก่อน batch ถัดไปเสมอ)"""
+        client = LogClient(self.client_queue_batches + len(self.ring) // self.replay_batch_lines + 1)
+        history = list(self.ring)
+        for start in range(0, len(history), self.replay_batch_lines):
+            part = history[start:start + self.replay_batch_lines]
+            client.put("\n".join(part), len(part))
+        self.clients.add(client)
+        return client
+
+    def unsubscribe(self, client: LogClient):
+        self.clients.discard(client)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        recent = [(t, n) for t, n in self._rate if t >= now - 10.0]
+        return {
+            "clients": len(self.clients),
+            "lines_total": self.lines_total,
+            "batches_total": self.batches_total,
+            "lines_per_second": round(sum(n for _, n in recent) / 10.0, 1),
+            "dropped_lines": self.dropped_lines,
+            "ring_lines": len(self.ring),
+            "pending_lines": len(self._pending),
+        }
+
+
+log_stream = LogStream(
+    settings.LOG_RING_LINES,
+    settings.LOG_BATCH_INTERVAL_MS / 1000.0,
+    settings.LOG_CLIENT_QUEUE_BATCHES,
+    settings.LOG_READ_CHUNK_BYTES,
+)
@@ -0,0 +1,146 @@
+# app/services/object_store.py
+"""
+ที่เก็บรูปภาพ (object store) แบบเปลี่ยน backend ได้ และคิวอัปโหลดที่ทำงานนอก event loop
+
+    store = get_object_store()               # S3 หรือ local ตาม settings.OBJECT_STORE_BACKEND
+    url = store.put("violations/x.jpg", data, "image/jpeg")
+
+ImageUploadQueue รันการอัปโหลดใน ThreadPoolExecutor ที่จำกัดจำนวนงานค้าง (max_pending)
+เพื่อให้ endpoint แบบ async ไม่ต้องรอ network I/O ของ S3
+"""
+import logging
+import os
+from abc import ABC, abstractmethod
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ObjectStore(ABC):
+    """Interface: เก็บ bytes ไว้ที่ key แล้วคืน URL ที่ frontend ใช้เปิดรูปได้"""
+
+    @abstractmethod
+    def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> str:
+        ...
+
+    @abstractmethod
+    def url_for(self, key: str) -> str:
+        ...
+
+
+class S3ObjectStore(ObjectStore):
+    def __init__(self, bucket: str, region: str, client=None):
+        if client is None:
+            import boto3
+            client = boto3.client("s3", region_name=region)
+        self.bucket = bucket
+        self.region = region
+        self.client = client
+
+    def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> str:
+        extra = {"ContentType": content_type} if content_type else {}
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, **extra)
+        return self.url_for(key)
+
+    def url_for(self, key: str) -> str:
+        return f"https://{self.bucket}.s3.{self.region}.amazonaws.com/{key}"
+
+
+class LocalObjectStore(ObjectStore):
+    """เก็บไฟล์ลงดิสก์ (root_dir/key) และเสิร์ฟผ่าน StaticFiles ที่ mount ไว้ที่ base_url"""
+
+    def __init__(self, root_dir: str, base_url: str):
+        self.root_dir = Path(root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.base_url = base_url.rstrip("/")
+
+    def put(self, key: str, data: bytes, content_type: Optional[str] = None) -> str:
+        path = self.root_dir / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return self.url_for(key)
+
+    def url_for(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+
+class ImageUploadQueue:
+    """
+    Bounded upload pool. submit() คืน False ทันทีถ้ามีงานค้างครบ max_pending แล้ว
+    (ผู้เรียกตัดสินใจเองว่าจะอัปโหลดแบบรอผล หรือข้ามรูปนั้นไป)
+    """
+
+    def __init__(self, store: ObjectStore, max_workers: int = 4, max_pending: int = 64):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="image-upload")
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, key: str, data: bytes, content_type: Optional[str],
+               on_uploaded: Optional[Callable[[str], None]] = None) -> bool:
+        if not self._slots.acquire(blocking=False):
+            return False
+        with self._lock:
+            self.pending += 1
+        self._executor.submit(self._run, key, data, content_type, on_uploaded)
+        return True
+
+    def upload_now(self, key: str, data: bytes, content_type: Optional[str],
+                   on_uploaded: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        """อัปโหลดใน thread ปัจจุบัน (ใช้ตอนคิวเต็ม ผ่าน run_in_threadpool)"""
+        return self._upload(key, data, content_type, on_uploaded)
+
+    def _upload(self, key, data, content_type, on_uploaded) -> Optional[str]:
+        """อัปโหลด 1 รูปและนับ completed / failed (ทั้งผ่านคิวและแบบรอผล)"""
+        try:
+            url = self.store.put(key, data, content_type)
+            if on_uploaded:
+                on_uploaded(url)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            logger.error(f"Failed to upload image '{key}': {e}")
+            return None
+        with self._lock:
+            self.completed += 1
+        logger.info(f"Image uploaded. URL: {url}")
+        return url
+
+    def _run(self, key, data, content_type, on_uploaded):
+        try:
+            self._upload(key, data, content_type, on_uploaded)
+        finally:
+            with self._lock:
+                self.pending -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": self.pending, "completed": self.completed, "failed": self.failed}
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+def get_object_store() -> ObjectStore:
+    backend = settings.OBJECT_STORE_BACKEND.lower()
+    if backend == "local":
+        return LocalObjectStore(settings.LOCAL_MEDIA_DIR, settings.LOCAL_MEDIA_URL)
+    if backend == "s3":
+        return S3ObjectStore(settings.S3_BUCKET_NAME, settings.S3_REGION)
+    raise ValueError(f"Unknown OBJECT_STORE_BACKEND '{settings.OBJECT_STORE_BACKEND}' (expected 's3' or 'local').")
+
+
+object_store = get_object_store()
+image_uploads = ImageUploadQueue(object_store, settings.IMAGE_UPLOAD_WORKERS, settings.IMAGE_UPLOAD_MAX_PENDING)
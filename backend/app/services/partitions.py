@@ -0,0 +1,169 @@
+# app/services/partitions.py
+"""
+Monthly range partitions ของ parking_violations (Postgres, PARTITION BY RANGE (timestamp))
+
+- ensure_partitions: สร้าง partition ของเดือนปัจจุบันและล่วงหน้า N เดือน และ default partition
+  (แถวที่ timestamp อยู่นอกทุก partition) ถ้า default มีแถวของเดือนที่กำลังสร้างจะย้ายเข้า partition ใหม่
+- apply_retention: partition ที่เก่ากว่า retention -> DETACH -> export ไป archive (violation_archive) -> DROP
+  ถ้าล้มกลางทาง (detach แล้วแต่ยังไม่ drop) รอบถัดไปจะทำต่อจากตารางที่ค้างอยู่
+"""
+import asyncio
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import database
+from app.services.violation_archive import archive
+
+logger = logging.getLogger(__name__)
+
+PARENT = "parking_violations"
+DEFAULT_PARTITION = f"{PARENT}_default"
+_NAME_RE = re.compile(rf"^{PARENT}_p(\d{{4}})_(\d{{2}})$")
+_MAINTENANCE_LOCK_KEY = 0x70617274   # pg advisory lock: ให้มี maintenance ทำงานทีละ process
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month:%Y_%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = _NAME_RE.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def _bound(month: date) -> datetime:
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+
+
+def is_partitioned(db: Session) -> bool:
+    if db.bind.dialect.name != "postgresql":
+        return False
+    return db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:parent)"
+    ), {"parent": PARENT}).first() is not None
+
+
+def list_partitions(db: Session) -> List[str]:
+    return list(db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:parent) ORDER BY c.relname"
+    ), {"parent": PARENT}).scalars())
+
+
+def _detached_leftovers(db: Session) -> List[str]:
+    """partition ที่ detach แล้วแต่ยังไม่ได้ archive / drop (เช่น process ตายระหว่าง retention)"""
+    attached = set(list_partitions(db))
+    names = db.execute(text(
+        "SELECT tablename FROM pg_tables WHERE schemaname = current_schema() AND tablename LIKE :pattern"
+    ), {"pattern": f"{PARENT}\\_p%"}).scalars()
+    return sorted(n for n in names if partition_month(n) and n not in attached)
+
+
+def create_partition(db: Session, month: date):
+    """สร้าง partition ของเดือน month (ย้ายแถวของเดือนนั้นจาก default partition ถ้ามี) ไม่ commit"""
+    name, start, end = partition_name(month), _bound(month), _bound(add_months(month, 1))
+    db.execute(text(f'CREATE TABLE "{name}" (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+    if DEFAULT_PARTITION in list_partitions(db):
+        db.execute(text(
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE timestamp >= :start AND timestamp < :end RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM moved'
+        ), {"start": start, "end": end})
+    db.execute(text(
+        f"ALTER TABLE {PARENT} ATTACH PARTITION \"{name}\" FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+
+
+def ensure_partitions(db: Session, months_ahead: int) -> List[str]:
+    """สร้าง partition ที่ยังไม่มีตั้งแต่เดือนปัจจุบันถึงล่วงหน้า months_ahead เดือน แล้ว commit"""
+    if not is_partitioned(db):
+        return []
+    existing = set(list_partitions(db))
+    this_month = datetime.now(timezone.utc).date().replace(day=1)
+    created = []
+    try:
+        if DEFAULT_PARTITION not in existing:
+            db.execute(text(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF {PARENT} DEFAULT'))
+            created.append(DEFAULT_PARTITION)
+        for n in range(months_ahead + 1):
+            month = add_months(this_month, n)
+            if partition_name(month) not in existing:
+                create_partition(db, month)
+                created.append(partition_name(month))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if created:
+        logger.info(f"Created parking_violations partitions: {created}")
+    return created
+
+
+def archive_partition(db: Session, name: str):
+    """DETACH -> export -> DROP (export สำเร็จและบันทึก manifest แล้วเท่านั้นจึง drop)"""
+    month = partition_month(name)
+    if name in list_partitions(db):
+        db.execute(text(f'ALTER TABLE {PARENT} DETACH PARTITION "{name}"'))
+        db.commit()
+    archive.export_table(db, name, _bound(month), _bound(add_months(month, 1)))
+    db.commit()   # ปิด transaction ของการอ่าน
+    db.execute(text(f'DROP TABLE "{name}"'))
+    db.commit()
+
+
+def apply_retention(db: Session, retention_months: int) -> List[str]:
+    """ย้าย partition ที่ทั้งเดือนเก่ากว่า retention_months ไป archive"""
+    if retention_months <= 0 or not is_partitioned(db):
+        return []
+    cutoff = add_months(datetime.now(timezone.utc).date().replace(day=1), -retention_months)
+    candidates = _detached_leftovers(db) + list_partitions(db)
+    archived = []
+    for name in candidates:
+        month = partition_month(name)
+        if month is not None and add_months(month, 1) <= cutoff:
+            archive_partition(db, name)
+            archived.append(name)
+    if archived:
+        logger.info(f"Archived parking_violations partitions older than {cutoff}: {archived}")
+    return archived
+
+
+def run_maintenance(months_ahead: int, retention_months: int) -> dict:
+    if database.engine.dialect.name != "postgresql":
+        return {"created": [], "archived": []}
+    # advisory lock ผูกกับ connection: ใช้ connection เดียวตลอดทั้งรอบ
+    with database.engine.connect() as conn:
+        locked = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": _MAINTENANCE_LOCK_KEY}).scalar()
+        conn.commit()
+        if not locked:
+            logger.info("Partition maintenance is running elsewhere; skipping.")
+            return {"created": [], "archived": []}
+        db = Session(bind=conn)
+        try:
+            created = ensure_partitions(db, months_ahead)
+            archived = apply_retention(db, retention_months)
+            return {"created": created, "archived": archived}
+        finally:
+            db.close()
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _MAINTENANCE_LOCK_KEY})
+            conn.commit()
+
+
+async def run_maintenance_loop(interval_s: int, months_ahead: int, retention_months: int):
+    """Background task: สร้าง partition ล่วงหน้าและทำ retention ทุก interval_s วินาที"""
+    while True:
+        try:
+            await run_in_threadpool(run_maintenance, months_ahead, retention_months)
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}")
+        await asyncio.sleep(interval_s)
@@ -0,0 +1,424 @@
+# app/services/response_cache.py
+"""
+Response cache สำหรับ endpoint อ่านข้อมูลของ dashboard (/parking_violations/summary, /all_branches, /events)
+
+- key = ชื่อ endpoint + query parameters ที่ normalize แล้ว (ใส่ค่า default, เรียงชื่อ)
+- แต่ละ entry จำขอบเขตข้อมูลที่ครอบคลุม (branch prefix + ช่วงวันที่) เพื่อให้ ingest / PATCH
+  ล้างเฉพาะ entry ที่ row นั้นมีผลจริง แทนการล้างทั้งหมด
+- ETag คำนวณจากเนื้อหา จึงตอบ 304 ได้แม้ entry ถูกล้างแล้วคำนวณใหม่ได้ผลเท่าเดิม
+- backend: in-process (ค่าเริ่มต้น) หรือ Redis (ตั้ง RESPONSE_CACHE_REDIS_URL) เมื่อรันหลาย worker
+  ทุก method ของ backend เป็น async (Redis ใช้ redis.asyncio ไม่ block event loop ของ ingest)
+- ทุก invalidate ถูกบันทึกใน log (ลำดับ + row ที่โดน) ไว้ใน backend เดียวกับ entry: ผลที่คำนวณคร่อม invalidate
+  ถูกทิ้งเฉพาะเมื่อ invalidate นั้นโดน scope ของผลนั้นจริง และเห็นกันทุก process เมื่อใช้ Redis
+- backend ล่ม (เช่น Redis ต่อไม่ได้) ไม่ทำให้ request ล้ม: get = miss, set ข้าม, invalidate ไม่สำเร็จ
+  = ไม่อ่าน cache จนกว่า entry ที่อาจค้างจะหมดอายุ
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app.api.responses import dumps
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# จำนวน invalidate ล่าสุดที่จำไว้ ผลที่คำนวณนานจนมี invalidate เกินจากนี้ระหว่างคำนวณจะไม่ถูกเก็บ
+INVALIDATION_LOG_SIZE = 1024
+
+# row ที่โดน invalidate: (branch_id, วันที่) วันที่ None = ทุกช่วงวันที่; ทั้ง list เป็น None = clear ทั้งหมด
+Touched = Optional[List[Tuple[Optional[str], Optional[date]]]]
+
+
+@dataclass
+class CacheScope:
+    """ขอบเขตข้อมูลของ response: None = ไม่จำกัด"""
+    branch_prefix: Optional[str] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+    def touches(self, branch_id: Optional[str], day: date) -> bool:
+        if self.branch_prefix and not (branch_id or "").startswith(self.branch_prefix):
+            return False
+        # เผื่อ 1 วันทั้งสองข้าง: timestamp เป็น UTC แต่การกรองช่วงวันที่ใช้ timezone ของ DB session
+        if self.start_date and day + timedelta(days=1) < self.start_date:
+            return False
+        if self.end_date and day - timedelta(days=1) > self.end_date:
+            return False
+        return True
+
+    def to_dict(self) -> dict:
+        return {
+            "branch_prefix": self.branch_prefix,
+            "start_date": self.start_date.isoformat() if self.start_date else None,
+            "end_date": self.end_date.isoformat() if self.end_date else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CacheScope":
+        return cls(
+            branch_prefix=data.get("branch_prefix"),
+            start_date=date.fromisoformat(data["start_date"]) if data.get("start_date") else None,
+            end_date=date.fromisoformat(data["end_date"]) if data.get("end_date") else None,
+        )
+
+
+def touches_any(scope: CacheScope, touched: Touched) -> bool:
+    if touched is None:
+        return True
+    for branch_id, day in touched:
+        if day is None:
+            if not scope.branch_prefix or (branch_id or "").startswith(scope.branch_prefix):
+                return True
+        elif scope.touches(branch_id, day):
+            return True
+    return False
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    etag: str
+    scope: CacheScope
+    expires_at: float
+
+
+class InMemoryBackend:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._invalidations: "deque[Tuple[int, Touched]]" = deque(maxlen=INVALIDATION_LOG_SIZE)
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    async def set(self, key: str, entry: CacheEntry) -> int:
+        evicted = 0
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    async def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    async def generation(self) -> int:
+        return self._generation
+
+    async def invalidations_since(self, generation: int) -> Optional[List[Touched]]:
+        """row ที่ถูก invalidate หลัง generation (None = log ไม่ครอบคลุมแล้ว ให้ถือว่าเก่า)"""
+        with self._lock:
+            recent = [touched for seq, touched in self._invalidations if seq > generation]
+            if len(recent) != self._generation - generation:
+                return None
+            return recent
+
+    async def invalidate(self, touched: Touched) -> int:
+        with self._lock:
+            # บันทึก log ก่อนลบ: ผลที่ set ไปแล้วถูกลบที่นี่ ผลที่ set หลังจากนี้เห็น log
+            self._generation += 1
+            self._invalidations.append((self._generation, touched))
+            stale = [key for key, entry in self._entries.items() if touches_any(entry.scope, touched)]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    async def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._invalidations.append((self._generation, None))
+            self._entries.clear()
+
+    async def size(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """
+    ใช้ร่วมกันระหว่างหลาย process (TTL ให้ Redis จัดการ)
+
+    scope ของทุก entry เก็บซ้ำไว้ใน hash INDEX_KEY (field = key ของ entry, value = scope + เวลาหมดอายุ)
+    invalidate จึงอ่าน hash เดียวแล้วลบเฉพาะ key ที่โดนใน pipeline เดียว ไม่ต้อง SCAN + GET ทีละ key
+    field ของ entry ที่หมดอายุแล้วถูกลบออกจาก hash ไปพร้อมกัน hash จึงไม่โตตาม key ที่ไม่มีใคร invalidate
+
+    ลำดับ invalidate (GENERATION_KEY) และ log (LOG_KEY, sorted set ตามลำดับ) อยู่ใน Redis
+    ทุก process จึงรู้ว่ามี invalidate ระหว่างที่ตัวเองคำนวณผลหรือไม่
+    """
+
+    PREFIX = "rc:"
+    INDEX_KEY = "rc-index"
+    GENERATION_KEY = "rc-generation"
+    LOG_KEY = "rc-invalidations"
+    # set ครบเท่านี้ครั้งแล้วลบ field ที่หมดอายุจาก index (กรณีไม่มี ingest มาเรียก invalidate นาน ๆ)
+    PRUNE_EVERY_SETS = 256
+
+    def __init__(self, url: str, ttl_s: float):
+        import redis.asyncio as redis  # optional dependency
+        self.client = redis.Redis.from_url(url)
+        self.ttl_ms = int(ttl_s * 1000)
+        self._sets = 0
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        raw = await self.client.get(self.PREFIX + key)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return CacheEntry(data["body"].encode("utf-8"), data["etag"], CacheScope.from_dict(data["scope"]), 0.0)
+
+    async def set(self, key: str, entry: CacheEntry) -> int:
+        scope = entry.scope.to_dict()
+        payload = json.dumps({"body": entry.body.decode("utf-8"), "etag": entry.etag, "scope": scope})
+        ttl_ms = max(1, int((entry.expires_at - time.monotonic()) * 1000)) if entry.expires_at else self.ttl_ms
+        # เวลาหมดอายุเป็น wall clock (ms) เพราะ index ใช้ร่วมกันหลาย process
+        expires_ms = int(time.time() * 1000) + ttl_ms
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(self.PREFIX + key, payload, px=ttl_ms)
+            pipe.hset(self.INDEX_KEY, key, json.dumps({"scope": scope, "expires_ms": expires_ms}))
+            await pipe.execute()
+        self._sets += 1
+        if self._sets % self.PRUNE_EVERY_SETS == 0:
+            await self._delete_matching(lambda scope: False)
+        return 0
+
+    async def delete(self, key: str):
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.delete(self.PREFIX + key)
+            pipe.hdel(self.INDEX_KEY, key)
+            await pipe.execute()
+
+    async def generation(self) -> int:
+        return int(await self.client.get(self.GENERATION_KEY) or 0)
+
+    async def invalidations_since(self, generation: int) -> Optional[List[Touched]]:
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.get(self.GENERATION_KEY)
+            pipe.zrangebyscore(self.LOG_KEY, f"({generation}", "+inf")
+            current, members = await pipe.execute()
+        # log ถูกตัดไปแล้ว หรือ Redis ถูกล้าง (ลำดับย้อนกลับ): ถือว่าเก่า
+        if len(members) != int(current or 0) - generation:
+            return None
+        recent = []
+        for member in members:
+            rows = json.loads(member)["rows"]
+            recent.append(None if rows is None else [(branch_id, date.fromisoformat(day) if day else None) for branch_id, day in rows])
+        return recent
+
+    async def _delete_matching(self, predicate: Callable[[CacheScope], bool]) -> int:
+        """ลบ entry ที่ scope ตรง predicate และ field ของ entry ที่หมดอายุแล้วออกจาก index"""
+        index = await self.client.hgetall(self.INDEX_KEY)
+        now_ms = int(time.time() * 1000)
+        stale, expired = [], []
+        for field, raw in index.items():
+            data = json.loads(raw)
+            if data["expires_ms"] <= now_ms:
+                expired.append(field)
+            elif predicate(CacheScope.from_dict(data["scope"])):
+                stale.append(field)
+        if not stale and not expired:
+            return 0
+        async with self.client.pipeline(transaction=False) as pipe:
+            if stale:
+                pipe.delete(*(self.PREFIX.encode() + field for field in stale))
+            pipe.hdel(self.INDEX_KEY, *(stale + expired))
+            results = await pipe.execute()
+        return results[0] if stale else 0
+
+    async def invalidate(self, touched: Touched) -> int:
+        # บันทึก log ก่อนลบ: ผลที่ set ไปแล้วถูกลบที่นี่ ผลที่ set หลังจากนี้เห็น log
+        generation = await self.client.incr(self.GENERATION_KEY)
+        rows = None if touched is None else [(branch_id, day.isoformat() if day else None) for branch_id, day in touched]
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zadd(self.LOG_KEY, {json.dumps({"seq": generation, "rows": rows}): generation})
+            pipe.zremrangebyrank(self.LOG_KEY, 0, -INVALIDATION_LOG_SIZE - 1)
+            await pipe.execute()
+        return await self._delete_matching(lambda scope: touches_any(scope, touched))
+
+    async def clear(self):
+        await self.invalidate(None)
+
+    async def size(self) -> int:
+        # รวม field ของ entry ที่หมดอายุแล้วแต่ยังไม่ถูกลบจาก index
+        return await self.client.hlen(self.INDEX_KEY)
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl_s: float, enabled: bool = True):
+        self.backend = backend
+        self.ttl_s = ttl_s
+        self.enabled = enabled
+        # ttl ที่ยาวที่สุดที่เคยใช้ (รวม cached_count): backend ล้มเหลวแล้วเลี่ยง cache นานเท่านี้
+        # (entry ที่ invalidate ไม่สำเร็จหมดอายุหมดแล้ว และไม่ต้องรอ timeout ของ backend ทุก request)
+        self._max_ttl_s = ttl_s
+        self._bypass_until = 0.0
+        self._stats_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "invalidated": 0, "evicted": 0,
+                      "stale_discarded": 0, "backend_errors": 0}
+
+    def _count(self, name: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def _bypassed(self) -> bool:
+        return time.monotonic() < self._bypass_until
+
+    def _backend_failed(self, operation: str, error: Exception):
+        self._bypass_until = time.monotonic() + self._max_ttl_s
+        self._count("backend_errors")
+        logger.warning(f"Response cache {operation} failed; bypassing the cache for {self._max_ttl_s:.0f}s: {error}")
+
+    @staticmethod
+    def make_key(endpoint: str, params: Dict[str, Any]) -> str:
+        normalized = {k: (v.isoformat() if isinstance(v, (date, datetime)) else v) for k, v in params.items() if v is not None}
+        return endpoint + "?" + json.dumps(normalized, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+    @staticmethod
+    def make_etag(body: bytes) -> str:
+        return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+    async def _lookup(self, key: str) -> Optional[CacheEntry]:
+        if not self.enabled or self._bypassed():
+            return None
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            self._backend_failed("get", e)
+            return None
+
+    async def _generation(self) -> Optional[int]:
+        """ลำดับ invalidate ก่อนเริ่มคำนวณ (None = ไม่เก็บผลนี้)"""
+        if not self.enabled or self._bypassed():
+            return None
+        try:
+            return await self.backend.generation()
+        except Exception as e:
+            self._backend_failed("generation", e)
+            return None
+
+    async def _store(self, key: str, entry: CacheEntry, generation: Optional[int]):
+        """
+        เก็บผลที่คำนวณจากข้อมูล ณ generation: set ก่อนแล้วค่อยตรวจ log
+        invalidate ที่บันทึก log หลังการตรวจนี้จะลบ entry เอง ที่บันทึกก่อนหน้าเห็นใน log แล้วลบทิ้งที่นี่
+        """
+        if generation is None:
+            return
+        try:
+            evicted = await self.backend.set(key, entry)
+            recent = await self.backend.invalidations_since(generation)
+            if recent is None or any(touches_any(entry.scope, touched) for touched in recent):
+                await self.backend.delete(key)
+                self._count("stale_discarded")
+                return
+            self._count("evicted", evicted)
+        except Exception as e:
+            self._backend_failed("set", e)
+
+    async def respond(self, request: Request, endpoint: str, params: Dict[str, Any], scope: CacheScope,
+                      producer: Callable[[], Awaitable[Any]]) -> Response:
+        """คืน response จาก cache ถ้ามี ไม่งั้นเรียก producer แล้วเก็บผล; ตอบ 304 ถ้า If-None-Match ตรง"""
+        key = self.make_key(endpoint, params)
+        entry = await self._lookup(key)
+        if entry is not None:
+            self._count("hits")
+        else:
+            self._count("misses")
+            generation = await self._generation()
+            result = await producer()
+            body = dumps(result)
+            entry = CacheEntry(body, self.make_etag(body), scope, time.monotonic() + self.ttl_s)
+            await self._store(key, entry, generation)
+
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and entry.etag in [tag.strip() for tag in if_none_match.split(",")]:
+            self._count("not_modified")
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    async def cached_count(self, endpoint: str, params: Dict[str, Any], scope: CacheScope, ttl_s: float,
+                           producer: Callable[[], Awaitable[int]]) -> int:
+        """
+        จำนวนรายการ (COUNT ที่แพง) เก็บใน backend เดียวกับ response และล้างด้วย invalidate_rows ตาม scope เดียวกัน
+        body ที่สร้างใหม่หลัง ingest จึงไม่ได้ total เก่าที่ยังไม่หมดอายุ
+        """
+        self._max_ttl_s = max(self._max_ttl_s, ttl_s)
+        key = self.make_key("count:" + endpoint, params)
+        entry = await self._lookup(key)
+        if entry is not None:
+            return int(entry.body)
+        generation = await self._generation()
+        total = await producer()
+        body = str(total).encode("ascii")
+        await self._store(key, CacheEntry(body, "", scope, time.monotonic() + ttl_s), generation)
+        return total
+
+    async def _invalidate(self, touched: Touched):
+        try:
+            removed = await self.backend.invalidate(touched)
+        except Exception as e:
+            # entry ที่ควรถูกล้างอาจยังค้างใน backend: _backend_failed ให้เลี่ยง cache จนกว่าจะหมดอายุ
+            self._backend_failed("invalidate", e)
+            return
+        if removed:
+            self._count("invalidated", removed)
+
+    async def invalidate_rows(self, rows: Iterable[Tuple[Optional[str], Optional[datetime]]]):
+        """
+        ล้าง entry ที่ครอบคลุม row (branch_id, timestamp) ที่เพิ่ง insert / แก้ไข (timestamp None = ทุกช่วงวันที่)
+        ไม่ raise: เรียกหลัง commit แล้ว cache ล้มเหลวต้องไม่ทำให้ ingest ตอบ error
+        """
+        touched = list({(branch_id, ts.date() if ts else None) for branch_id, ts in rows})
+        if touched:
+            await self._invalidate(touched)
+
+    async def clear(self):
+        await self._invalidate(None)
+
+    async def snapshot(self) -> dict:
+        try:
+            entries = await self.backend.size()
+        except Exception as e:
+            self._backend_failed("size", e)
+            entries = None
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else None
+        stats["entries"] = entries
+        stats["ttl_s"] = self.ttl_s
+        stats["enabled"] = self.enabled
+        stats["bypassed"] = self._bypassed()
+        return stats
+
+
+def _build_cache() -> ResponseCache:
+    backend = InMemoryBackend(settings.RESPONSE_CACHE_MAX_ENTRIES)
+    if settings.RESPONSE_CACHE_REDIS_URL:
+        try:
+            backend = RedisBackend(settings.RESPONSE_CACHE_REDIS_URL, settings.RESPONSE_CACHE_TTL_S)
+        except ImportError:
+            logger.warning("RESPONSE_CACHE_REDIS_URL is set but the 'redis' package is not installed; using in-process cache.")
+    return ResponseCache(backend, settings.RESPONSE_CACHE_TTL_S, settings.RESPONSE_CACHE_ENABLED)
+
+
+response_cache = _build_cache()
@@ -0,0 +1,208 @@
+# app/services/rollup.py
+"""
+ดูแลตาราง parking_hourly_rollup (ยอดรวมรายชั่วโมงต่อ branch_id / camera_id)
+
+- Incremental: ingest / PATCH คำนวณส่วนต่าง (delta) ของแต่ละ row แล้ว upsert
+  `col = col + delta` ใน transaction เดียวกับข้อมูลดิบ
+- Rebuild: คำนวณใหม่จาก parking_violations ทั้งหมดหรือเฉพาะช่วงเวลา ใช้ทั้ง backfill ครั้งแรก
+  และ compaction เป็นระยะ (แก้ drift ถ้ามีการแก้ข้อมูลดิบตรง ๆ)
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import database
+from app.services.violation_archive import archive
+
+logger = logging.getLogger(__name__)
+
+Rollup = database.DBParkingHourlyRollup
+Violation = database.DBParkingViolation
+
+KEY_COLUMNS = ("branch_id", "camera_id", "hour")
+COUNTER_COLUMNS = (
+    "session_count", "violation_count", "normal_count", "ongoing_count",
+    "violation_duration_sum", "violation_duration_count", "normal_duration_sum", "normal_duration_count",
+)
+
+RollupKey = Tuple[str, str, datetime]
+
+
+def _get(row, name):
+    return row.get(name) if isinstance(row, dict) else getattr(row, name, None)
+
+
+def _hour(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def contribution(row) -> Dict[str, float]:
+    """ค่าที่ raw row หนึ่งแถวเพิ่มเข้าไปใน rollup (dict ของ COUNTER_COLUMNS)"""
+    is_violation = _get(row, "is_violation")
+    duration = _get(row, "duration_minutes")
+    has_duration = duration is not None
+    return {
+        "session_count": 1,
+        "violation_count": 1 if is_violation is True else 0,
+        "normal_count": 1 if is_violation is False else 0,
+        "ongoing_count": 1 if is_violation is True and _get(row, "exit_time") is None else 0,
+        "violation_duration_sum": duration if is_violation is True and has_duration else 0.0,
+        "violation_duration_count": 1 if is_violation is True and has_duration else 0,
+        "normal_duration_sum": duration if is_violation is False and has_duration else 0.0,
+        "normal_duration_count": 1 if is_violation is False and has_duration else 0,
+    }
+
+
+def rollup_key(row) -> RollupKey:
+    return (_get(row, "branch_id") or "", _get(row, "camera_id") or "", _hour(_get(row, "timestamp")))
+
+
+class RollupDeltas:
+    """สะสม delta ต่อ key ก่อนส่ง upsert ครั้งเดียว"""
+
+    def __init__(self):
+        self.deltas: Dict[RollupKey, Dict[str, float]] = {}
+        self.branches: Dict[RollupKey, Optional[str]] = {}
+
+    def add(self, row, sign: int = 1):
+        key = rollup_key(row)
+        acc = self.deltas.setdefault(key, dict.fromkeys(COUNTER_COLUMNS, 0))
+        for col, value in contribution(row).items():
+            acc[col] += sign * value
+        if _get(row, "branch") is not None:
+            self.branches[key] = _get(row, "branch")
+
+    def add_change(self, before: dict, after):
+        """ส่วนต่างของ row เดิม (snapshot ก่อนแก้) กับ row หลังแก้"""
+        self.add(before, -1)
+        self.add(after, 1)
+
+    def rows(self):
+        out = []
+        for key in sorted(self.deltas):   # ลำดับคงที่ ลดโอกาส deadlock ระหว่าง transaction
+            acc = self.deltas[key]
+            if not any(acc.values()):
+                continue
+            out.append({**dict(zip(KEY_COLUMNS, key)), "branch": self.branches.get(key), **acc})
+        return out
+
+
+def snapshot(row) -> dict:
+    """เก็บค่าที่ rollup ใช้ไว้ก่อนแก้ row (ใช้กับ add_change)"""
+    return {name: _get(row, name) for name in
+            ("branch_id", "camera_id", "timestamp", "branch", "is_violation", "exit_time", "duration_minutes")}
+
+
+def _upsert_statement(dialect_name: str, rows):
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stmt = insert(Rollup).values(rows)
+    set_ = {col: getattr(Rollup, col) + getattr(stmt.excluded, col) for col in COUNTER_COLUMNS}
+    set_["branch"] = func.coalesce(stmt.excluded.branch, Rollup.branch)
+    set_["updated_at"] = func.now()
+    return stmt.on_conflict_do_update(index_elements=list(KEY_COLUMNS), set_=set_)
+
+
+async def apply_deltas(db: AsyncSession, deltas: RollupDeltas):
+    """Upsert delta ลง rollup (ไม่ commit: ให้ commit พร้อมกับข้อมูลดิบ)"""
+    rows = deltas.rows()
+    if rows:
+        await db.execute(_upsert_statement(db.bind.dialect.name, rows))
+
+
+# --- Rebuild / backfill / compaction ---
+def _aggregate_select(start: Optional[datetime], end: Optional[datetime]):
+    is_violation = Violation.is_violation == True
+    is_normal = Violation.is_violation == False
+    has_duration = Violation.duration_minutes.isnot(None)
+    hour = func.date_trunc("hour", Violation.timestamp)
+    query = select(
+        func.coalesce(Violation.branch_id, "").label("branch_id"),
+        func.coalesce(Violation.camera_id, "").label("camera_id"),
+        hour.label("hour"),
+        func.max(Violation.branch).label("branch"),
+        func.count().label("session_count"),
+        func.count().filter(is_violation).label("violation_count"),
+        func.count().filter(is_normal).label("normal_count"),
+        func.count().filter(is_violation, Violation.exit_time.is_(None)).label("ongoing_count"),
+        func.coalesce(func.sum(Violation.duration_minutes).filter(is_violation), 0.0).label("violation_duration_sum"),
+        func.count().filter(is_violation, has_duration).label("violation_duration_count"),
+        func.coalesce(func.sum(Violation.duration_minutes).filter(is_normal), 0.0).label("normal_duration_sum"),
+        func.count().filter(is_normal, has_duration).label("normal_duration_count"),
+    ).where(Violation.timestamp.isnot(None))
+    if start is not None:
+        query = query.where(Violation.timestamp >= start)
+    if end is not None:
+        query = query.where(Violation.timestamp < end)
+    return query.group_by(text("1"), text("2"), text("3"))
+
+
+def rebuild_hourly_rollup(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+    """
+    คำนวณ rollup ใหม่จากข้อมูลดิบในช่วง [start, end) (ไม่ระบุ = ทั้งหมด) แล้ว commit
+    start / end ควรตรงต้นชั่วโมง เพื่อไม่ให้ตัดครึ่งชั่วโมงที่ต้องคำนวณใหม่
+    ระหว่าง rebuild จะล็อก rollup ไม่ให้ ingest upsert แทรก (Postgres) จนกว่าจะ commit
+    """
+    if db.bind.dialect.name != "postgresql":
+        raise RuntimeError("rebuild_hourly_rollup requires PostgreSQL (date_trunc).")
+    # ข้อมูลดิบก่อน archived_until ถูกย้ายไป archive แล้ว: เก็บยอดรวมของช่วงนั้นไว้ ไม่คำนวณใหม่
+    archived_until = archive.archived_until()
+    if archived_until is not None and (start is None or start < archived_until):
+        start = archived_until
+        if end is not None and end <= start:
+            return 0
+    columns = [*KEY_COLUMNS, "branch", *COUNTER_COLUMNS]
+    try:
+        db.execute(text("LOCK TABLE parking_hourly_rollup IN SHARE ROW EXCLUSIVE MODE"))
+        stale = delete(Rollup)
+        if start is not None:
+            stale = stale.where(Rollup.hour >= start)
+        if end is not None:
+            stale = stale.where(Rollup.hour < end)
+        db.execute(stale)
+        result = db.execute(postgresql.insert(Rollup).from_select(columns, _aggregate_select(start, end)))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logger.info(f"Hourly rollup rebuilt for [{start or '-inf'}, {end or '+inf'}): {result.rowcount} rows.")
+    return result.rowcount
+
+
+def backfill_if_empty(db: Session) -> bool:
+    """ใช้ตอน startup: ถ้า rollup ยังว่างแต่มีข้อมูลดิบ ให้สร้างจากข้อมูลทั้งหมด"""
+    if db.bind.dialect.name != "postgresql":
+        return False
+    has_rollup = db.execute(select(Rollup.branch_id).limit(1)).first() is not None
+    has_raw = db.execute(select(Violation.id).limit(1)).first() is not None
+    if has_rollup or not has_raw:
+        return False
+    logger.info("Hourly rollup is empty; backfilling from parking_violations...")
+    rebuild_hourly_rollup(db)
+    return True
+
+
+def compact_recent(lookback_hours: int) -> int:
+    end = _hour(datetime.now(timezone.utc)) + timedelta(hours=1)
+    start = end - timedelta(hours=lookback_hours + 1)
+    db = database.SessionLocal()
+    try:
+        return rebuild_hourly_rollup(db, start, end)
+    finally:
+        db.close()
+
+
+async def run_compaction_loop(interval_s: int, lookback_hours: int):
+    """Background task: rebuild ช่วง lookback_hours ล่าสุดทุก interval_s วินาที"""
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            await run_in_threadpool(compact_recent, lookback_hours)
+        except Exception as e:
+            logger.error(f"Hourly rollup compaction failed: {e}")
@@ -0,0 +1,124 @@
+# app/services/snapshots.py
+"""
+ภาพนิ่งจากกล้องสำหรับหน้าแก้ไข ROI (/video-frame/{camera_id})
+
+- ถ้า camera worker ของกล้องนั้นเชื่อมต่อ /ws/ingest อยู่ ขอเฟรมดิบขนาดเต็ม (ไม่มี overlay) จาก worker
+  ไม่ต้องเปิด RTSP ซ้ำ (กล้องหลายรุ่นจำกัดจำนวน stream พร้อมกัน)
+- ไม่งั้นเปิด source เองใน thread pool (ไม่ block event loop)
+- เก็บผลต่อกล้องไว้ SNAPSHOT_TTL_S วินาที และ request ที่มาพร้อมกันรอผลของการดึงครั้งเดียวกัน (single-flight)
+- ภาพย่อ (width) ย่อจากภาพใน cache แล้วเก็บไว้ด้วย; พิกัด ROI ต้องอิงภาพขนาดเต็มเสมอ
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services.frame_hub import frame_hub
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotError(Exception):
+    pass
+
+
+@dataclass
+class Snapshot:
+    data: bytes
+    source: str            # "pipeline" | "direct"
+    taken_at: float        # epoch seconds
+    variants: Dict[int, bytes] = field(default_factory=dict)
+
+
+def grab_frame(source_path: str, skip: int) -> bytes:
+    """เปิด source อ่านข้าม skip เฟรม แล้ว encode เฟรมสุดท้ายเป็น JPEG (blocking: เรียกใน thread pool)"""
+    cap = cv2.VideoCapture(source_path, cv2.CAP_FFMPEG)
+    try:
+        if not cap.isOpened():
+            raise SnapshotError(f"Could not open video source from path/url: {source_path}")
+        frame = None
+        for _ in range(max(1, skip)):
+            ret, current = cap.read()
+            if ret:
+                frame = current
+    finally:
+        cap.release()
+    if frame is None:
+        raise SnapshotError("Could not read video frame after skipping frames.")
+    ok, buffer = cv2.imencode(".jpeg", frame)
+    if not ok:
+        raise SnapshotError("Could not encode video frame.")
+    return buffer.tobytes()
+
+
+def downscale(jpeg: bytes, width: int) -> bytes:
+    image = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise SnapshotError("Could not decode cached snapshot.")
+    height, original_width = image.shape[:2]
+    if width >= original_width:
+        return jpeg
+    resized = cv2.resize(image, (width, max(1, height * width // original_width)), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode(".jpeg", resized, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+    if not ok:
+        raise SnapshotError("Could not encode downscaled snapshot.")
+    return buffer.tobytes()
+
+
+class SnapshotService:
+    def __init__(self, ttl_s: float, uplink_timeout_s: float):
+        self.ttl_s = ttl_s
+        self.uplink_timeout_s = uplink_timeout_s
+        self._cache: Dict[str, Snapshot] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def _take(self, camera_id: str, source_path: Optional[str], skip: int) -> Snapshot:
+        feed = frame_hub.get(camera_id)
+        data = await feed.request_snapshot(self.uplink_timeout_s) if feed is not None else None
+        if data is not None:
+            return Snapshot(data, "pipeline", time.time())
+        if not source_path:
+            raise SnapshotError(f"Video source not found for camera_id: {camera_id}")
+        logger.debug(f"[{camera_id}] No snapshot from camera worker, reading {source_path} directly.")
+        data = await run_in_threadpool(grab_frame, source_path, skip)
+        return Snapshot(data, "direct", time.time())
+
+    async def _take_and_store(self, camera_id: str, source_path: Optional[str], skip: int) -> Snapshot:
+        snapshot = await self._take(camera_id, source_path, skip)
+        self._cache[camera_id] = snapshot
+        return snapshot
+
+    def _finished(self, camera_id: str, task: asyncio.Task):
+        self._inflight.pop(camera_id, None)
+        if not task.cancelled():
+            task.exception()   # ผู้รอหลุดไปหมดแล้วก็ไม่ต้องเตือน "exception was never retrieved"
+
+    async def get(self, camera_id: str, source_path: Optional[str], skip: int = 30,
+                  refresh: bool = False) -> Snapshot:
+        cached = self._cache.get(camera_id)
+        if cached is not None and not refresh and time.time() - cached.taken_at < self.ttl_s:
+            return cached
+
+        # ดึงใน task แยก: client ที่เริ่มดึงหลุดไปก็ไม่ยกเลิกผลของคนอื่นที่รออยู่
+        task = self._inflight.get(camera_id)
+        if task is None:
+            task = asyncio.create_task(self._take_and_store(camera_id, source_path, skip))
+            self._inflight[camera_id] = task
+            task.add_done_callback(lambda t: self._finished(camera_id, t))
+        return await asyncio.shield(task)
+
+    async def variant(self, snapshot: Snapshot, width: Optional[int]) -> bytes:
+        if not width:
+            return snapshot.data
+        if width not in snapshot.variants:
+            snapshot.variants[width] = await run_in_threadpool(downscale, snapshot.data, width)
+        return snapshot.variants[width]
+
+
+snapshot_service = SnapshotService(settings.SNAPSHOT_TTL_S, settings.SNAPSHOT_UPLINK_TIMEOUT_S)
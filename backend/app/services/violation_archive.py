@@ -0,0 +1,333 @@
+# app/services/violation_archive.py
+"""
+Archive ของ parking_violations ที่พ้นช่วง retention (ดู app/services/partitions.py)
+
+- 1 ไฟล์ต่อเดือน: Parquet (zstd) ถ้ามี pyarrow ไม่งั้น CSV gzip
+- manifest.json เก็บช่วงเวลา จำนวนแถว และ sha256 ของแต่ละไฟล์ เขียนแบบ atomic (tmp + os.replace)
+- count_violations() / page_violations() ให้ /events แบ่งหน้าช่วงเวลาเก่าได้โดยไม่โหลดทั้งเดือนเข้าหน่วยความจำ:
+  อ่านทีละไฟล์จากใหม่ไปเก่า ข้ามไฟล์ที่อยู่นอกช่วงหรืออยู่ก่อน offset ทั้งไฟล์ (จำนวนแถวจาก manifest / นับแล้ว cache)
+  และข้าม row group ของ Parquet ด้วยสถิติ min/max ของ timestamp
+- iter_violations() อ่านแบบ stream จากเก่าไปใหม่ (export และหน้าก่อนหน้าของ /events)
+"""
+import csv
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (
+    "id", "car_id", "timestamp", "branch", "branch_id", "camera_id", "event_type", "current_park",
+    "entry_time", "exit_time", "duration_minutes", "is_violation", "total_parking_sessions", "image_url",
+)
+_INT_COLUMNS = {"id", "car_id", "current_park", "total_parking_sessions"}
+_TIME_COLUMNS = {"timestamp", "entry_time", "exit_time"}
+
+
+def parquet_schema():
+    import pyarrow as pa
+    ts = pa.timestamp("us", tz="UTC")
+    types = {"timestamp": ts, "entry_time": ts, "exit_time": ts, "duration_minutes": pa.float64(), "is_violation": pa.bool_()}
+    return pa.schema([(c, pa.int64() if c in _INT_COLUMNS else types.get(c, pa.string())) for c in COLUMNS])
+
+
+def _parse_csv_value(column: str, value: str):
+    if value == "":
+        return None
+    if column in _INT_COLUMNS:
+        return int(value)
+    if column in _TIME_COLUMNS:
+        return datetime.fromisoformat(value)
+    if column == "duration_minutes":
+        return float(value)
+    if column == "is_violation":
+        return value == "t"
+    return value
+
+
+def csv_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class ViolationArchive:
+    def __init__(self, root_dir: str, fmt: str = "parquet"):
+        self.root_dir = root_dir
+        self.fmt = fmt
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._manifest_cache = (None, [])   # (mtime, entries)
+        self._count_cache: "OrderedDict[tuple, int]" = OrderedDict()   # ไฟล์ archive ไม่เปลี่ยน: จำจำนวนแถวต่อไฟล์ + filter
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.root_dir, "manifest.json")
+
+    def _resolve_format(self) -> str:
+        if self.fmt == "parquet":
+            try:
+                import pyarrow  # noqa: F401  (optional dependency)
+                return "parquet"
+            except ImportError:
+                logger.warning("pyarrow is not installed; archiving parking_violations as CSV gzip instead of Parquet.")
+        return "csv.gz"
+
+    # --- manifest ---
+    def entries(self) -> List[dict]:
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            if self._manifest_cache[0] != mtime:
+                with open(self.manifest_path, encoding="utf-8") as f:
+                    self._manifest_cache = (mtime, json.load(f)["archives"])
+            return list(self._manifest_cache[1])
+
+    def _write_manifest(self, entries: List[dict]):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"archives": sorted(entries, key=lambda e: e["start"])}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def archived_until(self) -> Optional[datetime]:
+        """ขอบบนของช่วงที่ย้ายไป archive แล้ว (ข้อมูลก่อนเวลานี้อยู่ในไฟล์ ไม่ใช่ในฐานข้อมูล)"""
+        ends = [datetime.fromisoformat(e["end"]) for e in self.entries()]
+        return max(ends) if ends else None
+
+    # --- export ---
+    def export_table(self, db: Session, table: str, start: datetime, end: datetime) -> dict:
+        """
+        เขียนทุกแถวของ table (partition ที่ detach แล้ว) เป็นไฟล์ archive แล้วเพิ่มลง manifest
+        อ่านแบบ stream ทีละ chunk จึงไม่โหลดทั้งเดือนเข้าหน่วยความจำ
+        """
+        os.makedirs(self.root_dir, exist_ok=True)
+        fmt = self._resolve_format()
+        file_name = f"{table}.{fmt}"
+        path = os.path.join(self.root_dir, file_name)
+        tmp_path = path + ".tmp"
+        result = db.execute(
+            text(f'SELECT {", ".join(COLUMNS)} FROM "{table}" ORDER BY timestamp, id').execution_options(yield_per=20000)
+        )
+        rows = 0
+        if fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            schema = parquet_schema()
+            with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+                for chunk in result.partitions():
+                    writer.write_table(pa.Table.from_pylist([dict(zip(COLUMNS, r)) for r in chunk], schema=schema))
+                    rows += len(chunk)
+        else:
+            with gzip.open(tmp_path, "wt", encoding="utf-8", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(COLUMNS)
+                for chunk in result.partitions():
+                    writer.writerows([csv_value(v) for v in r] for r in chunk)
+                    rows += len(chunk)
+
+        digest = hashlib.sha256()
+        with open(tmp_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        os.replace(tmp_path, path)
+
+        entry = {
+            "partition": table, "start": start.isoformat(), "end": end.isoformat(), "rows": rows,
+            "file": file_name, "format": fmt, "sha256": digest.hexdigest(),
+            "archived_at": datetime.now(timezone.utc).isoformat(),
+        }
+        with self._write_lock:
+            entries = [e for e in self.entries() if e["partition"] != table]
+            self._write_manifest(entries + [entry])
+        logger.info(f"Archived {rows} rows of {table} to {path}")
+        return entry
+
+    # --- read ---
+    @staticmethod
+    def _matches(row: dict, start: Optional[datetime], end: Optional[datetime], branch_prefix: Optional[str],
+                 is_violation_only: bool, before: Optional[Tuple[datetime, int]] = None,
+                 after: Optional[Tuple[datetime, int]] = None) -> bool:
+        ts = row["timestamp"]
+        if (start is not None and ts < start) or (end is not None and ts >= end):
+            return False
+        if branch_prefix and not (row["branch_id"] or "").startswith(branch_prefix):
+            return False
+        if is_violation_only and not row["is_violation"]:
+            return False
+        if before is not None and (ts, row["id"]) >= before:
+            return False
+        if after is not None and (ts, row["id"]) <= after:
+            return False
+        return True
+
+    @staticmethod
+    def _entry_overlaps(entry: dict, start: Optional[datetime], end: Optional[datetime]) -> bool:
+        if end is not None and datetime.fromisoformat(entry["start"]) >= end:
+            return False
+        if start is not None and datetime.fromisoformat(entry["end"]) <= start:
+            return False
+        return True
+
+    def _row_groups(self, entry: dict, start: Optional[datetime], end: Optional[datetime]):
+        """(ParquetFile, [(index, min ts, max ts)]) ของ row group ที่อาจมีแถวในช่วง [start, end)"""
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(os.path.join(self.root_dir, entry["file"]))
+        ts_index = parquet_file.schema_arrow.get_field_index("timestamp")
+        groups = []
+        for i in range(parquet_file.metadata.num_row_groups):
+            stats = parquet_file.metadata.row_group(i).column(ts_index).statistics
+            low, high = (stats.min, stats.max) if stats is not None and stats.has_min_max else (None, None)
+            if low is not None and ((end is not None and low >= end) or (start is not None and high < start)):
+                continue
+            groups.append((i, low, high))
+        return parquet_file, groups
+
+    def _read_file(self, entry: dict, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   after: Optional[Tuple[datetime, int]] = None) -> Iterator[dict]:
+        """อ่านไฟล์ archive ทีละ batch / row group จากเก่าไปใหม่ (ไฟล์เขียนเรียง timestamp, id อยู่แล้ว)"""
+        if entry["format"] == "parquet":
+            parquet_file, groups = self._row_groups(entry, start, end)
+            for i, _, high in groups:
+                if after is not None and high is not None and high < after[0]:
+                    continue
+                yield from parquet_file.read_row_group(i).to_pylist()
+        else:
+            with gzip.open(os.path.join(self.root_dir, entry["file"]), "rt", encoding="utf-8", newline="") as f:
+                reader = csv.reader(f)
+                header = next(reader)
+                for values in reader:
+                    yield {c: _parse_csv_value(c, v) for c, v in zip(header, values)}
+
+    def iter_violations(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        branch_prefix: Optional[str] = None, is_violation_only: bool = False,
+                        after: Optional[Tuple[datetime, int]] = None) -> Iterator[dict]:
+        """แถวใน archive ที่อยู่ในช่วง [start, end) (และใหม่กว่า after) เรียง (timestamp, id) จากเก่าไปใหม่ อ่านแบบ stream"""
+        for entry in self.entries():
+            if not self._entry_overlaps(entry, start, end):
+                continue
+            if after is not None and datetime.fromisoformat(entry["end"]) <= after[0]:
+                continue
+            for row in self._read_file(entry, start, end, after):
+                if self._matches(row, start, end, branch_prefix, is_violation_only, after=after):
+                    yield row
+
+    def _count_entry(self, entry: dict, start: Optional[datetime], end: Optional[datetime],
+                     branch_prefix: Optional[str], is_violation_only: bool) -> int:
+        entry_start, entry_end = datetime.fromisoformat(entry["start"]), datetime.fromisoformat(entry["end"])
+        covers_entry = (start is None or start <= entry_start) and (end is None or end >= entry_end)
+        if covers_entry and not branch_prefix and not is_violation_only:
+            return entry["rows"]
+        cache_key = (entry["sha256"], start if not covers_entry else None, end if not covers_entry else None,
+                     branch_prefix, is_violation_only)
+        with self._lock:
+            if cache_key in self._count_cache:
+                self._count_cache.move_to_end(cache_key)
+                return self._count_cache[cache_key]
+        total = 0
+        if entry["format"] == "parquet":
+            parquet_file, groups = self._row_groups(entry, start, end)
+            for i, low, high in groups:
+                inside = low is not None and (start is None or low >= start) and (end is None or high < end)
+                if inside and not branch_prefix and not is_violation_only:
+                    total += parquet_file.metadata.row_group(i).num_rows
+                    continue
+                rows = parquet_file.read_row_group(i, columns=["id", "timestamp", "branch_id", "is_violation"]).to_pylist()
+                total += sum(1 for row in rows if self._matches(row, start, end, branch_prefix, is_violation_only))
+        else:
+            total = sum(1 for row in self._read_file(entry) if self._matches(row, start, end, branch_prefix, is_violation_only))
+        with self._lock:
+            self._count_cache[cache_key] = total
+            while len(self._count_cache) > settings.ARCHIVE_COUNT_CACHE_SIZE:
+                self._count_cache.popitem(last=False)
+        return total
+
+    def count_violations(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                         branch_prefix: Optional[str] = None, is_violation_only: bool = False) -> int:
+        return sum(
+            self._count_entry(entry, start, end, branch_prefix, is_violation_only)
+            for entry in self.entries() if self._entry_overlaps(entry, start, end)
+        )
+
+    def _page_entry(self, entry: dict, skip: int, take: int, start, end, branch_prefix, is_violation_only,
+                    before: Optional[Tuple[datetime, int]]) -> List[dict]:
+        """แถวที่ตรงเงื่อนไขของไฟล์เดียว จากใหม่ไปเก่า: ข้าม skip แถวแรกแล้วเอา take แถว"""
+        rows: List[dict] = []
+        if entry["format"] == "parquet":
+            parquet_file, groups = self._row_groups(entry, start, end)
+            for i, low, _ in reversed(groups):
+                if before is not None and low is not None and low > before[0]:
+                    continue
+                for row in reversed(parquet_file.read_row_group(i).to_pylist()):
+                    if not self._matches(row, start, end, branch_prefix, is_violation_only, before=before):
+                        continue
+                    if skip:
+                        skip -= 1
+                        continue
+                    rows.append(row)
+                    if len(rows) >= take:
+                        return rows
+            return rows
+        # CSV gzip อ่านย้อนหลังไม่ได้: นับแถวที่ตรงก่อน แล้วอ่านรอบสองเก็บเฉพาะหน้าต่างที่ต้องการ
+        matched = sum(1 for row in self._read_file(entry)
+                      if self._matches(row, start, end, branch_prefix, is_violation_only, before=before))
+        first, last = max(0, matched - skip - take), matched - skip
+        index = 0
+        for row in self._read_file(entry):
+            if not self._matches(row, start, end, branch_prefix, is_violation_only, before=before):
+                continue
+            if first <= index < last:
+                rows.append(row)
+            index += 1
+            if index >= last:
+                break
+        rows.reverse()
+        return rows
+
+    def page_violations(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        branch_prefix: Optional[str] = None, is_violation_only: bool = False,
+                        offset: int = 0, limit: int = 50,
+                        before: Optional[Tuple[datetime, int]] = None) -> list:
+        """
+        แถวใน archive เรียง (timestamp, id) จากใหม่ไปเก่าเหมือน /events: ข้าม offset แถวแล้วคืนไม่เกิน limit แถว
+        before = (timestamp, id) ของ cursor: เฉพาะแถวที่เก่ากว่า (ใช้แทน offset)
+        หน่วยความจำไม่เกิน 1 row group / limit แถว ไม่ว่าช่วงเวลาที่ขอจะยาวแค่ไหน
+        """
+        rows: List[dict] = []
+        if limit <= 0:
+            return rows
+        entries = sorted((e for e in self.entries() if self._entry_overlaps(e, start, end)),
+                         key=lambda e: e["start"], reverse=True)
+        for entry in entries:
+            if before is not None and datetime.fromisoformat(entry["start"]) > before[0]:
+                continue
+            if before is None and offset:
+                matched = self._count_entry(entry, start, end, branch_prefix, is_violation_only)
+                if offset >= matched:
+                    offset -= matched
+                    continue
+            rows += self._page_entry(entry, offset, limit - len(rows), start, end, branch_prefix, is_violation_only, before)
+            offset = 0
+            if len(rows) >= limit:
+                break
+        return [SimpleNamespace(**row) for row in rows]
+
+
+archive = ViolationArchive(settings.ARCHIVE_DIR, settings.ARCHIVE_FORMAT)
@@ -0,0 +1,153 @@
+# app/services/violation_export.py
+"""
+Export เหตุการณ์ parking_violations แบบ stream (CSV / NDJSON / Parquet) สำหรับ /parking_violations/events/export
+
+- อ่านฐานข้อมูลด้วย server-side cursor ทีละ EXPORT_CHUNK_ROWS แถว (ไม่สร้าง ORM object / Pydantic model ต่อแถว)
+  แล้ว encode ส่งออกทีละ chunk; StreamingResponse รอส่ง chunk ก่อนหน้าเสร็จก่อนจึงอ่านต่อ
+  หน่วยความจำจึงขึ้นกับขนาด chunk ไม่ใช่จำนวนแถวทั้งหมด
+- ช่วงเวลาที่ย้ายไป archive แล้วอ่านจากไฟล์ก่อน (เก่ากว่าทุกแถวในฐานข้อมูล) ผลรวมเรียง (timestamp, id) จากเก่าไปใหม่
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from app import database
+from app.core.config import settings
+from app.services.violation_archive import COLUMNS, archive, csv_value, parquet_schema
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class CsvEncoder:
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode("utf-8")
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def begin(self) -> bytes:
+        self._writer.writerow(COLUMNS)
+        return self._drain()
+
+    def encode(self, rows: Sequence[tuple]) -> bytes:
+        self._writer.writerows([csv_value(v) for v in row] for row in rows)
+        return self._drain()
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class NdjsonEncoder:
+    def begin(self) -> bytes:
+        return b""
+
+    def encode(self, rows: Sequence[tuple]) -> bytes:
+        return "".join(
+            json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False, default=lambda v: v.isoformat()) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _ChunkSink:
+    """file-like ให้ ParquetWriter เขียนลง แล้วดึง byte ที่เขียนแล้วออกไปส่งทีละ row group"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class ParquetEncoder:
+    """1 chunk = 1 row group; footer ส่งตอน finish()"""
+
+    def __init__(self):
+        import pyarrow as pa  # optional dependency
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self._schema = parquet_schema()
+        self._sink = _ChunkSink()
+        self._writer = pq.ParquetWriter(self._sink, self._schema, compression="zstd")
+
+    def begin(self) -> bytes:
+        return self._sink.drain()
+
+    def encode(self, rows: Sequence[tuple]) -> bytes:
+        columns = list(zip(*rows))
+        self._writer.write_table(self._pa.Table.from_arrays(
+            [self._pa.array(values, type=field.type) for values, field in zip(columns, self._schema)],
+            schema=self._schema,
+        ))
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+def make_encoder(fmt: str):
+    """ImportError ถ้าขอ parquet แต่ไม่ได้ติดตั้ง pyarrow"""
+    return {"csv": CsvEncoder, "ndjson": NdjsonEncoder, "parquet": ParquetEncoder}[fmt]()
+
+
+def _chunks(rows: Iterable[dict], size: int) -> Iterator[List[tuple]]:
+    chunk = []
+    for row in rows:
+        chunk.append(tuple(row[c] for c in COLUMNS))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def stream_events(encoder, statement, archive_range: Optional[Tuple[datetime, Optional[datetime], Optional[str], bool]] = None
+                        ) -> AsyncIterator[bytes]:
+    """
+    statement: select(คอลัมน์ตาม COLUMNS) ที่ใส่ filter และ order_by (timestamp, id) แล้ว
+    archive_range: (start, end, branch_prefix, is_violation_only) ของแถวที่ต้องอ่านจาก archive ก่อน
+    ใช้ session ของตัวเอง เพราะ session ของ request ถูกปิดก่อน response แบบ stream จะส่งจบ
+    """
+    chunk_rows = settings.EXPORT_CHUNK_ROWS
+    yield encoder.begin()
+    if archive_range is not None:
+        async for chunk in iterate_in_threadpool(_chunks(archive.iter_violations(*archive_range), chunk_rows)):
+            yield await run_in_threadpool(encoder.encode, chunk)
+    async with database.AsyncSessionLocal() as db:
+        result = await db.stream(statement.execution_options(yield_per=chunk_rows))
+        async for chunk in result.partitions():
+            yield await run_in_threadpool(encoder.encode, chunk)
+    yield encoder.finish()
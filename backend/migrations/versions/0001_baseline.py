@@ -0,0 +1,98 @@
+"""baseline: tables as created by create_db_tables() before migrations
+
+ฐานข้อมูลเดิมที่สร้างด้วย create_all มีตารางอยู่แล้ว: migration นี้จะข้ามตารางที่มีอยู่
+จึงรัน `alembic upgrade head` ได้ทั้งฐานข้อมูลใหม่และเดิม
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001_baseline"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _create_table(name, *columns, indexes=()):
+    if sa.inspect(op.get_bind()).has_table(name):
+        return
+    op.create_table(name, *columns)
+    for column in indexes:
+        op.create_index(f"ix_{name}_{column}", name, [column])
+
+
+def upgrade():
+    _create_table(
+        "parking_violations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("car_id", sa.Integer(), nullable=True),
+        sa.Column("timestamp", sa.DateTime(timezone=True)),
+        sa.Column("branch", sa.String()),
+        sa.Column("branch_id", sa.String()),
+        sa.Column("camera_id", sa.String()),
+        sa.Column("event_type", sa.String()),
+        sa.Column("current_park", sa.Integer(), nullable=True),
+        sa.Column("entry_time", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("exit_time", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("duration_minutes", sa.Float()),
+        sa.Column("is_violation", sa.Boolean()),
+        sa.Column("total_parking_sessions", sa.Integer(), nullable=True),
+        sa.Column("image_url", sa.String(), nullable=True),
+        indexes=("id", "car_id", "timestamp", "branch", "branch_id", "camera_id"),
+    )
+    _create_table(
+        "parking_hourly_rollup",
+        sa.Column("branch_id", sa.String(), primary_key=True),
+        sa.Column("camera_id", sa.String(), primary_key=True),
+        sa.Column("hour", sa.DateTime(timezone=True), primary_key=True),
+        sa.Column("branch", sa.String(), nullable=True),
+        sa.Column("session_count", sa.Integer(), nullable=False),
+        sa.Column("violation_count", sa.Integer(), nullable=False),
+        sa.Column("normal_count", sa.Integer(), nullable=False),
+        sa.Column("ongoing_count", sa.Integer(), nullable=False),
+        sa.Column("violation_duration_sum", sa.Float(), nullable=False),
+        sa.Column("violation_duration_count", sa.Integer(), nullable=False),
+        sa.Column("normal_duration_sum", sa.Float(), nullable=False),
+        sa.Column("normal_duration_count", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        indexes=("hour",),
+    )
+    _create_table(
+        "table_occupancy",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("timestamp", sa.DateTime()),
+        sa.Column("branch_id", sa.String()),
+        sa.Column("camera_id", sa.String()),
+        sa.Column("event_type", sa.String()),
+        sa.Column("table_id", sa.String()),
+        sa.Column("is_occupied", sa.Boolean()),
+        sa.Column("occupancy_start_time", sa.DateTime()),
+        sa.Column("occupancy_end_time", sa.DateTime(), nullable=True),
+        sa.Column("duration_minutes", sa.Float(), nullable=True),
+        sa.Column("current_occupant_count", sa.Integer(), nullable=True),
+        indexes=("id", "timestamp", "branch_id", "camera_id", "table_id", "occupancy_start_time"),
+    )
+    _create_table(
+        "chilled_basket_alerts",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("timestamp", sa.DateTime()),
+        sa.Column("branch_id", sa.String()),
+        sa.Column("camera_id", sa.String()),
+        sa.Column("event_type", sa.String()),
+        sa.Column("basket_id", sa.String()),
+        sa.Column("zone_id", sa.String()),
+        sa.Column("entry_time", sa.DateTime()),
+        sa.Column("exit_time", sa.DateTime(), nullable=True),
+        sa.Column("duration_minutes", sa.Float(), nullable=True),
+        sa.Column("is_alert_triggered", sa.Boolean()),
+        sa.Column("alert_reason", sa.String(), nullable=True),
+        indexes=("id", "timestamp", "branch_id", "camera_id", "basket_id", "entry_time"),
+    )
+
+
+def downgrade():
+    for name in ("chilled_basket_alerts", "table_occupancy", "parking_hourly_rollup", "parking_violations"):
+        op.drop_table(name)
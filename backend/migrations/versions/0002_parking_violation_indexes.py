@@ -0,0 +1,67 @@
+"""index set for the parking_violations hot queries
+
+- ix_pv_branch_prefix_ts: (branch_id text_pattern_ops, timestamp) สำหรับ branch_id LIKE 'prefix%' + ช่วงเวลา
+- ix_pv_ongoing: partial index ของรถที่ยังจอดเกินอยู่ (is_violation AND exit_time IS NULL)
+- ix_pv_ts_id_cover: keyset (timestamp, id) ของ /events + INCLUDE คอลัมน์ที่ใช้ aggregate รายชั่วโมง
+- ix_rollup_hour_cover: hour INCLUDE ยอดรวม สำหรับ chart / KPI จาก parking_hourly_rollup
+แทน index คอลัมน์เดียวของ timestamp / branch_id / hour ที่ index ใหม่ครอบคลุมแล้ว
+
+Postgres: สร้างแบบ CONCURRENTLY จึงไม่ล็อกการ insert ระหว่างสร้าง
+
+Revision ID: 0002_parking_violation_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0002_parking_violation_indexes"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+PV_COVER_INCLUDE = ["branch_id", "camera_id", "branch", "is_violation", "exit_time", "duration_minutes"]
+ROLLUP_COVER_INCLUDE = [
+    "branch_id", "branch", "session_count", "violation_count", "ongoing_count",
+    "violation_duration_sum", "violation_duration_count", "normal_duration_sum", "normal_duration_count",
+]
+
+
+def upgrade():
+    pg = op.get_bind().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        op.create_index("ix_pv_branch_prefix_ts", "parking_violations", ["branch_id", "timestamp"],
+                        postgresql_ops={"branch_id": "text_pattern_ops"}, postgresql_concurrently=pg, if_not_exists=True)
+        op.create_index("ix_pv_ongoing", "parking_violations", ["branch_id", "timestamp"],
+                        postgresql_ops={"branch_id": "text_pattern_ops"},
+                        postgresql_where="is_violation AND exit_time IS NULL",
+                        sqlite_where="is_violation AND exit_time IS NULL",
+                        postgresql_concurrently=pg, if_not_exists=True)
+        op.create_index("ix_pv_ts_id_cover", "parking_violations", ["timestamp", "id"],
+                        postgresql_include=PV_COVER_INCLUDE, postgresql_concurrently=pg, if_not_exists=True)
+        op.create_index("ix_rollup_hour_cover", "parking_hourly_rollup", ["hour"],
+                        postgresql_include=ROLLUP_COVER_INCLUDE, postgresql_concurrently=pg, if_not_exists=True)
+
+        op.drop_index("ix_parking_violations_timestamp", "parking_violations",
+                      postgresql_concurrently=pg, if_exists=True)
+        op.drop_index("ix_parking_violations_branch_id", "parking_violations",
+                      postgresql_concurrently=pg, if_exists=True)
+        op.drop_index("ix_parking_hourly_rollup_hour", "parking_hourly_rollup",
+                      postgresql_concurrently=pg, if_exists=True)
+
+    if pg:
+        op.execute("ANALYZE parking_violations")
+        op.execute("ANALYZE parking_hourly_rollup")
+
+
+def downgrade():
+    pg = op.get_bind().dialect.name == "postgresql"
+    with op.get_context().autocommit_block():
+        op.create_index("ix_parking_violations_timestamp", "parking_violations", ["timestamp"],
+                        postgresql_concurrently=pg, if_not_exists=True)
+        op.create_index("ix_parking_violations_branch_id", "parking_violations", ["branch_id"],
+                        postgresql_concurrently=pg, if_not_exists=True)
+        op.create_index("ix_parking_hourly_rollup_hour", "parking_hourly_rollup", ["hour"],
+                        postgresql_concurrently=pg, if_not_exists=True)
+        for name, table in (("ix_rollup_hour_cover", "parking_hourly_rollup"), ("ix_pv_ts_id_cover", "parking_violations"),
+                            ("ix_pv_ongoing", "parking_violations"), ("ix_pv_branch_prefix_ts", "parking_violations")):
+            op.drop_index(name, table, postgresql_concurrently=pg, if_exists=True)
@@ -0,0 +1,118 @@
+"""monthly range partitioning of parking_violations
+
+แปลง parking_violations เป็น PARTITION BY RANGE (timestamp) รายเดือน (Postgres เท่านั้น)
+1. เปลี่ยนชื่อตารางเดิมเป็น parking_violations_legacy
+2. สร้างตารางแม่แบบ partitioned (primary key (id, timestamp)) + partition ทุกเดือนที่มีข้อมูลถึงล่วงหน้า 3 เดือน + default
+3. คัดลอกข้อมูล (timestamp ว่างใช้ entry_time หรือเวลาปัจจุบันแทน) แล้ว drop ตารางเดิม
+ล็อกการเขียนตลอด migration: ควรรันช่วงที่ไม่มี ingest
+
+Revision ID: 0003_partition_violations
+Revises: 0002_parking_violation_indexes
+Create Date: 2026-10-19
+"""
+from datetime import date, datetime, timezone
+
+from alembic import op
+
+revision = "0003_partition_violations"
+down_revision = "0002_parking_violation_indexes"
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    "id, car_id, timestamp, branch, branch_id, camera_id, event_type, current_park, "
+    "entry_time, exit_time, duration_minutes, is_violation, total_parking_sessions, image_url"
+)
+COLUMN_DDL = """
+    id integer NOT NULL DEFAULT nextval('parking_violations_id_seq'),
+    car_id integer,
+    timestamp timestamptz NOT NULL,
+    branch varchar,
+    branch_id varchar,
+    camera_id varchar,
+    event_type varchar,
+    current_park integer,
+    entry_time timestamptz,
+    exit_time timestamptz,
+    duration_minutes double precision,
+    is_violation boolean,
+    total_parking_sessions integer,
+    image_url varchar
+"""
+INDEXES = (
+    "CREATE INDEX ix_parking_violations_id ON parking_violations (id)",
+    "CREATE INDEX ix_parking_violations_car_id ON parking_violations (car_id)",
+    "CREATE INDEX ix_parking_violations_branch ON parking_violations (branch)",
+    "CREATE INDEX ix_parking_violations_camera_id ON parking_violations (camera_id)",
+    "CREATE INDEX ix_pv_branch_prefix_ts ON parking_violations (branch_id text_pattern_ops, timestamp)",
+    "CREATE INDEX ix_pv_ongoing ON parking_violations (branch_id text_pattern_ops, timestamp) "
+    "WHERE is_violation AND exit_time IS NULL",
+    "CREATE INDEX ix_pv_ts_id_cover ON parking_violations (timestamp, id) "
+    "INCLUDE (branch_id, camera_id, branch, is_violation, exit_time, duration_minutes)",
+)
+PREMAKE_MONTHS = 3
+
+
+def _add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _bound(month: date) -> str:
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc).isoformat()
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    if bind.exec_driver_sql("SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'parking_violations'::regclass").first():
+        return   # สร้างด้วย create_all ของเวอร์ชันที่ partition แล้ว
+
+    op.execute("LOCK TABLE parking_violations IN ACCESS EXCLUSIVE MODE")
+    op.execute("ALTER TABLE parking_violations RENAME TO parking_violations_legacy")
+    op.execute("ALTER TABLE parking_violations_legacy RENAME CONSTRAINT parking_violations_pkey TO parking_violations_legacy_pkey")
+    for (name,) in bind.exec_driver_sql(
+        "SELECT indexname FROM pg_indexes WHERE tablename = 'parking_violations_legacy' AND indexname <> 'parking_violations_legacy_pkey'"
+    ).all():
+        op.execute(f'DROP INDEX "{name}"')
+
+    op.execute(f"CREATE TABLE parking_violations ({COLUMN_DDL}, PRIMARY KEY (id, timestamp)) PARTITION BY RANGE (timestamp)")
+    op.execute("ALTER SEQUENCE parking_violations_id_seq OWNED BY parking_violations.id")
+
+    oldest = bind.exec_driver_sql(
+        "SELECT min(COALESCE(timestamp, entry_time)) AT TIME ZONE 'UTC' FROM parking_violations_legacy"
+    ).scalar()
+    this_month = datetime.now(timezone.utc).date().replace(day=1)
+    month = min(oldest.date().replace(day=1), this_month) if oldest else this_month
+    last = _add_months(this_month, PREMAKE_MONTHS)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE parking_violations_p{month:%Y_%m} PARTITION OF parking_violations "
+            f"FOR VALUES FROM ('{_bound(month)}') TO ('{_bound(_add_months(month, 1))}')"
+        )
+        month = _add_months(month, 1)
+    op.execute("CREATE TABLE parking_violations_default PARTITION OF parking_violations DEFAULT")
+
+    op.execute(
+        f"INSERT INTO parking_violations ({COLUMNS}) "
+        f"SELECT {COLUMNS.replace('timestamp,', 'COALESCE(timestamp, entry_time, now()),', 1)} FROM parking_violations_legacy"
+    )
+    op.execute("DROP TABLE parking_violations_legacy")
+    for ddl in INDEXES:
+        op.execute(ddl)
+    op.execute("ANALYZE parking_violations")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    op.execute("ALTER TABLE parking_violations RENAME TO parking_violations_partitioned")
+    op.execute("ALTER TABLE parking_violations_partitioned RENAME CONSTRAINT parking_violations_pkey TO parking_violations_partitioned_pkey")
+    op.execute(f"CREATE TABLE parking_violations ({COLUMN_DDL}, PRIMARY KEY (id))")
+    op.execute(f"INSERT INTO parking_violations ({COLUMNS}) SELECT {COLUMNS} FROM parking_violations_partitioned")
+    op.execute("ALTER SEQUENCE parking_violations_id_seq OWNED BY parking_violations.id")
+    op.execute("DROP TABLE parking_violations_partitioned CASCADE")
+    for ddl in INDEXES:
+        op.execute(ddl)
@@ -0,0 +1,142 @@
+# backend/scripts/bench_api.py
+"""
+วัด requests/sec และ p50/p99 ของ endpoint หลักภายใต้โหลดแบบ dashboard หลายคนพร้อมกัน
+(ยิง /summary, /all_branches, /events) ผสมกับ worker ที่ POST /api/analytics/ ไปพร้อม ๆ กัน
+
+    python scripts/bench_api.py --duration 30 --dashboards 50 --ingest-workers 8 --save async.json
+    python scripts/bench_api.py --compare sync.json async.json
+
+รันครั้งหนึ่งกับ backend เวอร์ชันเดิม (sync Session) และอีกครั้งกับเวอร์ชัน async แล้วใช้ --compare ดูผลต่าง
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import httpx
+
+DASHBOARD_ENDPOINTS = {
+    "summary": "/parking_violations/summary",
+    "all_branches": "/parking_violations/all_branches",
+    "events": "/parking_violations/events",
+}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")
+
+
+def make_ingest_payload(i: int) -> str:
+    now = datetime.now(timezone.utc).isoformat()
+    return json.dumps({
+        "parking_violation": {
+            "timestamp": now, "branch": "bench", "branch_id": f"9{i % 50:04d}", "camera_id": f"cam_{i % 4}",
+            "event_type": "parking_violation", "car_id": i, "current_park": 1, "entry_time": now,
+            "duration_minutes": 3.0 + (i % 30), "is_violation": i % 3 == 0, "total_parking_sessions": i,
+        }
+    })
+
+
+async def run(args) -> dict:
+    samples = {name: [] for name in (*DASHBOARD_ENDPOINTS, "ingest")}
+    errors = {name: 0 for name in samples}
+    deadline = time.perf_counter() + args.duration
+    end_date = date.today()
+    params = {
+        "summary": {"start_date": (end_date - timedelta(days=args.range_days - 1)).isoformat(), "end_date": end_date.isoformat()},
+        "all_branches": {"page": 1, "limit": 10},
+        "events": {"page": 1, "limit": 50},
+    }
+
+    limits = httpx.Limits(max_connections=args.dashboards + args.ingest_workers)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30, limits=limits) as client:
+        async def dashboard(idx):
+            names = list(DASHBOARD_ENDPOINTS)
+            n = idx
+            while time.perf_counter() < deadline:
+                name = names[n % len(names)]
+                n += 1
+                start = time.perf_counter()
+                try:
+                    r = await client.get(DASHBOARD_ENDPOINTS[name], params=params[name])
+                    ok = r.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                samples[name].append((time.perf_counter() - start) * 1000.0)
+                errors[name] += 0 if ok else 1
+
+        async def ingest(idx):
+            i = idx
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    r = await client.post("/api/analytics/", headers={"X-API-Key": args.api_key},
+                                          data={"data": make_ingest_payload(i)})
+                    ok = r.status_code == 201
+                except httpx.HTTPError:
+                    ok = False
+                samples["ingest"].append((time.perf_counter() - start) * 1000.0)
+                errors["ingest"] += 0 if ok else 1
+                i += args.ingest_workers
+
+        await asyncio.gather(*(dashboard(i) for i in range(args.dashboards)),
+                             *(ingest(i) for i in range(args.ingest_workers)))
+
+    return {
+        name: {
+            "requests": len(values),
+            "rps": round(len(values) / args.duration, 1),
+            "p50_ms": round(percentile(values, 0.50), 1),
+            "p99_ms": round(percentile(values, 0.99), 1),
+            "errors": errors[name],
+        }
+        for name, values in samples.items()
+    }
+
+
+def print_table(results: dict, title: str):
+    print(f"\n{title}")
+    print(f"{'endpoint':<14}{'requests':>10}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['requests']:>10}{r['rps']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['errors']:>8}")
+
+
+def compare(path_a: str, path_b: str):
+    with open(path_a, encoding="utf-8") as f:
+        a = json.load(f)
+    with open(path_b, encoding="utf-8") as f:
+        b = json.load(f)
+    print(f"{'endpoint':<14}{'rps A':>10}{'rps B':>10}{'p99 A':>10}{'p99 B':>10}")
+    for name in a:
+        if name in b:
+            print(f"{name:<14}{a[name]['rps']:>10}{b[name]['rps']:>10}{a[name]['p99_ms']:>10}{b[name]['p99_ms']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard + ingest load benchmark")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY", "nemo1234"))
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--dashboards", type=int, default=50, help="concurrent dashboard clients")
+    parser.add_argument("--ingest-workers", type=int, default=8, help="concurrent ingest clients")
+    parser.add_argument("--range-days", type=int, default=7)
+    parser.add_argument("--save", type=str, default=None, help="write results as JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("A_JSON", "B_JSON"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = asyncio.run(run(args))
+    print_table(results, f"{args.dashboards} dashboards + {args.ingest_workers} ingest workers, {args.duration:.0f}s")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
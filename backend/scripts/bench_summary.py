@@ -0,0 +1,99 @@
+# backend/scripts/bench_summary.py
+"""
+วัดจำนวน query และเวลาของ /parking_violations/summary ต่อหน่วยเวลา (group_by_unit) บนข้อมูลที่ seed ไว้
+และตรวจว่าผลลัพธ์เท่ากันระหว่าง backend สองเวอร์ชัน
+
+    cd backend
+    python scripts/seed_parking_violations.py --rows 10000000
+    python scripts/bench_summary.py --repeat 5
+    python scripts/bench_summary.py --compare-url http://localhost:8001 http://localhost:8000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import event  # noqa: E402
+
+from app import database  # noqa: E402
+from app.api.routers.parking import build_violation_summary  # noqa: E402
+
+CASES = [
+    ("hour", 0),
+    ("day", 6),
+    ("week", 6),
+    ("month", 29),
+    ("week_range", 90),
+    ("month_range", 364),
+]
+
+
+def case_params(unit: str, span_days: int, branch_id=None) -> dict:
+    end = date.today()
+    return {
+        "branch_id": branch_id,
+        "start_date": end - timedelta(days=span_days),
+        "end_date": end,
+        "group_by_unit": unit,
+    }
+
+
+async def bench(repeat: int, branch_id):
+    counter = {"n": 0}
+
+    @event.listens_for(database.async_engine.sync_engine, "before_cursor_execute")
+    def _count(*_):
+        counter["n"] += 1
+
+    print(f"{'group_by_unit':<14}{'days':>6}{'queries':>9}{'median ms':>11}{'max ms':>9}")
+    for unit, span in CASES:
+        timings, queries = [], 0
+        for _ in range(repeat):
+            async with database.AsyncSessionLocal() as db:
+                counter["n"] = 0
+                start = time.perf_counter()
+                await build_violation_summary(db=db, **case_params(unit, span, branch_id))
+                timings.append((time.perf_counter() - start) * 1000.0)
+                queries = counter["n"]
+        print(f"{unit:<14}{span + 1:>6}{queries:>9}{statistics.median(timings):>11.1f}{max(timings):>9.1f}")
+    await database.async_engine.dispose()
+
+
+def compare(url_a: str, url_b: str, branch_id):
+    import httpx
+
+    mismatches = 0
+    for unit, span in CASES:
+        params = {k: (v.isoformat() if isinstance(v, date) else v) for k, v in case_params(unit, span, branch_id).items() if v is not None}
+        a = httpx.get(f"{url_a}/parking_violations/summary", params=params, timeout=300).json()
+        b = httpx.get(f"{url_b}/parking_violations/summary", params=params, timeout=300).json()
+        same = a == b
+        mismatches += 0 if same else 1
+        print(f"{unit:<14} {'OK' if same else 'DIFF'}")
+        if not same:
+            print("  A:", json.dumps(a, ensure_ascii=False)[:400])
+            print("  B:", json.dumps(b, ensure_ascii=False)[:400])
+    sys.exit(1 if mismatches else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parking summary endpoint")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--branch-id", type=str, default=None)
+    parser.add_argument("--compare-url", nargs=2, metavar=("URL_A", "URL_B"))
+    args = parser.parse_args()
+
+    if args.compare_url:
+        compare(*args.compare_url, args.branch_id)
+    else:
+        asyncio.run(bench(args.repeat, args.branch_id))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# backend/scripts/check_query_plans.py
+"""
+ตรวจว่า query ของ router ที่อ่าน parking_violations / parking_hourly_rollup ใช้ index (ไม่มี Seq Scan)
+บนฐานข้อมูลที่ seed แล้ว: เรียก handler จริง เก็บ SQL + parameter ที่ส่งออกไป แล้ว EXPLAIN ทีละ statement
+
+    cd backend
+    alembic upgrade head
+    python scripts/seed_parking_violations.py --rows 1000000
+    python scripts/check_query_plans.py            # exit 1 ถ้ามี query ที่ไม่ใช้ index
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import event, text  # noqa: E402
+
+from app import database  # noqa: E402
+from app.api.routers import parking  # noqa: E402
+
+CHECKED_TABLES = ("parking_violations", "parking_hourly_rollup")
+
+
+def checked(relation: str) -> bool:
+    # partition ของ parking_violations ชื่อ parking_violations_pYYYY_MM / parking_violations_default
+    return any(relation == t or relation.startswith(t + "_") for t in CHECKED_TABLES)
+
+
+def cases(branch_id: str):
+    today = date.today()
+    week = {"start_date": today - timedelta(days=6), "end_date": today}
+    month = {"start_date": today - timedelta(days=29), "end_date": today}
+    return [
+        ("list branch prefix", lambda db: parking.get_parking_violations(skip=0, limit=100, branch_id=branch_id, db=db)),
+        ("summary 7d", lambda db: parking.build_violation_summary(db, None, group_by_unit="day", **week)),
+        ("summary 7d branch", lambda db: parking.build_violation_summary(db, branch_id, group_by_unit="day", **week)),
+        ("summary 30d hour", lambda db: parking.build_violation_summary(db, None, group_by_unit="hour", **month)),
+        ("all_branches 30d", lambda db: parking.build_violating_branches(db, 1, 10, **month)),
+        ("events 7d branch", lambda db: parking.build_violation_events(db, branch_id=branch_id, **week)),
+        ("events 7d violations", lambda db: parking.build_violation_events(db, page=20, is_violation_only=True, **week)),
+        ("events in progress", lambda db: parking.build_violation_events(db, branch_id=branch_id, in_progress_only=True)),
+        ("events in progress all", lambda db: parking.build_violation_events(db, in_progress_only=True)),
+        ("events first page", lambda db: parking.build_violation_events(db, cursor=None, page=1, include_total=False)),
+    ]
+
+
+def walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from walk(child)
+
+
+async def check(branch_id: str, verbose: bool) -> int:
+    captured = []
+
+    @event.listens_for(database.async_engine.sync_engine, "before_cursor_execute")
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("EXPLAIN"):
+            captured.append((statement, parameters))
+
+    failures = 0
+    async with database.AsyncSessionLocal() as db:
+        # partition ว่าง (เดือนล่วงหน้า / default) planner เลือก Seq Scan เสมอและไม่มีต้นทุน: ไม่นับ
+        empty = set((await db.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass('parking_violations') AND c.relpages = 0"
+        ))).scalars())
+        for name, call in cases(branch_id):
+            captured.clear()
+            await call(db)
+            for n, (statement, parameters) in enumerate(list(captured), start=1):
+                result = await db.connection()
+                raw = (await result.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters)).scalar()
+                plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+                nodes = [p for p in walk(plan) if checked(p.get("Relation Name", ""))]
+                seq = [p["Relation Name"] for p in nodes if p["Node Type"] == "Seq Scan" and p["Relation Name"] not in empty]
+                used = sorted({p["Index Name"] for p in walk(plan) if p.get("Index Name")})
+                status = "FAIL" if seq else "ok"
+                failures += 1 if seq else 0
+                print(f"{status:<5}{name} #{n}: indexes={used or '-'}" + (f" seq_scan={seq}" if seq else ""))
+                if verbose or seq:
+                    print("      " + " ".join(statement.split())[:300])
+    await database.async_engine.dispose()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN the parking router queries and require index access")
+    parser.add_argument("--branch-id", default="10001", help="branch prefix used for filtered cases")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+    failures = asyncio.run(check(args.branch_id, args.verbose))
+    print(f"\n{failures} statement(s) without index access" if failures else "\nAll statements use an index.")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
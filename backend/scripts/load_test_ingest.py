@@ -0,0 +1,92 @@
+# backend/scripts/load_test_ingest.py
+"""
+Load test สำหรับ POST /api/analytics/ : ยิง violation พร้อมรูปพร้อมกันหลาย request
+แล้ววัดว่า event loop ของ backend ค้างหรือไม่ โดย ping /health ถี่ ๆ ระหว่างทดสอบ
+(ถ้า loop ถูก block ด้วย S3/DB เวลา /health จะพุ่งตาม)
+
+    OBJECT_STORE_BACKEND=local uvicorn app.main:app            # ฝั่ง backend
+    python scripts/load_test_ingest.py --requests 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+
+def make_payload(i: int) -> str:
+    now = datetime.now(timezone.utc).isoformat()
+    return json.dumps({
+        "parking_violation": {
+            "timestamp": now, "branch": "load-test", "branch_id": "99999", "camera_id": f"cam_{i % 4}",
+            "event_type": "parking_violation", "car_id": i, "current_park": 1, "entry_time": now,
+            "duration_minutes": 16.0, "is_violation": True, "total_parking_sessions": i,
+        }
+    })
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")
+
+
+async def probe_health(client: httpx.AsyncClient, stop: asyncio.Event, samples: list, interval: float):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            await client.get("/health")
+            samples.append((time.perf_counter() - start) * 1000.0)
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(interval)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Concurrent violation ingest load test")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY", "nemo1234"))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--image-kb", type=int, default=150)
+    parser.add_argument("--probe-interval", type=float, default=0.02)
+    args = parser.parse_args()
+
+    image = os.urandom(args.image_kb * 1024)
+    sem = asyncio.Semaphore(args.concurrency)
+    post_ms, errors = [], 0
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        async def post_one(i):
+            nonlocal errors
+            async with sem:
+                start = time.perf_counter()
+                r = await client.post(
+                    "/api/analytics/", headers={"X-API-Key": args.api_key},
+                    data={"data": make_payload(i)}, files={"image": (f"{i}.jpg", image, "image/jpeg")},
+                )
+                post_ms.append((time.perf_counter() - start) * 1000.0)
+                if r.status_code != 201:
+                    errors += 1
+
+        stop, health_ms = asyncio.Event(), []
+        probe = asyncio.create_task(probe_health(client, stop, health_ms, args.probe_interval))
+        started = time.perf_counter()
+        await asyncio.gather(*(post_one(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+        uploads = (await client.get("/api/metrics/uploads")).json()
+
+    print(f"{args.requests} posts in {elapsed:.2f}s ({args.requests / elapsed:.1f} req/s), errors={errors}")
+    print(f"POST   p50={percentile(post_ms, 0.5):.1f} ms  p99={percentile(post_ms, 0.99):.1f} ms")
+    print(f"/health p50={percentile(health_ms, 0.5):.1f} ms  p99={percentile(health_ms, 0.99):.1f} ms  "
+          f"max={max(health_ms, default=float('nan')):.1f} ms  (n={len(health_ms)}, mean={statistics.fmean(health_ms) if health_ms else float('nan'):.1f})")
+    print(f"upload queue: {uploads}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
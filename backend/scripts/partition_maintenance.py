@@ -0,0 +1,77 @@
+# backend/scripts/partition_maintenance.py
+"""
+จัดการ monthly partitions ของ parking_violations ด้วยมือ (ปกติ backend ทำเองทุก PARTITION_MAINTENANCE_INTERVAL_S)
+
+    cd backend
+    python scripts/partition_maintenance.py --list
+    python scripts/partition_maintenance.py --premake 6 --retention-months 12
+    python scripts/partition_maintenance.py --verify-archive           # ตรวจ sha256 / จำนวนแถวของไฟล์ใน manifest
+"""
+import argparse
+import hashlib
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import text  # noqa: E402
+
+from app import database  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.services import partitions  # noqa: E402
+from app.services.violation_archive import archive  # noqa: E402
+
+
+def list_partitions():
+    db = database.SessionLocal()
+    try:
+        if not partitions.is_partitioned(db):
+            print("parking_violations is not partitioned (run `alembic upgrade head`).")
+            return
+        for name in partitions.list_partitions(db):
+            rows = db.execute(text(f'SELECT count(*) FROM "{name}"')).scalar()
+            print(f"{name:<36}{rows:>12,}")
+    finally:
+        db.close()
+    for entry in archive.entries():
+        print(f"{entry['partition']:<36}{entry['rows']:>12,}  archived -> {entry['file']}")
+
+
+def verify_archive() -> bool:
+    ok = True
+    for entry in archive.entries():
+        path = os.path.join(archive.root_dir, entry["file"])
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        rows = sum(1 for _ in archive.iter_violations(datetime.fromisoformat(entry["start"]),
+                                                      datetime.fromisoformat(entry["end"])))
+        good = digest.hexdigest() == entry["sha256"] and rows == entry["rows"]
+        ok = ok and good
+        print(f"{entry['file']:<44} rows={rows:<10} {'OK' if good else 'MISMATCH'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create / archive monthly parking_violations partitions")
+    parser.add_argument("--list", action="store_true", help="show partitions and archived months")
+    parser.add_argument("--premake", type=int, default=settings.PARTITION_PREMAKE_MONTHS)
+    parser.add_argument("--retention-months", type=int, default=settings.PARTITION_RETENTION_MONTHS)
+    parser.add_argument("--verify-archive", action="store_true")
+    args = parser.parse_args()
+
+    if args.list:
+        list_partitions()
+    elif args.verify_archive:
+        sys.exit(0 if verify_archive() else 1)
+    else:
+        result = partitions.run_maintenance(args.premake, args.retention_months)
+        print(f"created: {result['created'] or '-'}")
+        print(f"archived: {result['archived'] or '-'}")
+
+
+if __name__ == "__main__":
+    main()
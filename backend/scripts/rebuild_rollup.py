@@ -0,0 +1,68 @@
+# backend/scripts/rebuild_rollup.py
+"""
+Backfill / คำนวณ parking_hourly_rollup ใหม่จาก parking_violations
+
+    cd backend
+    python scripts/rebuild_rollup.py                                 # ทั้งหมด
+    python scripts/rebuild_rollup.py --start 2025-01-01 --end 2025-02-01
+    python scripts/rebuild_rollup.py --verify                        # เทียบยอดรวม rollup กับข้อมูลดิบ
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import func, select  # noqa: E402
+
+from app import database  # noqa: E402
+from app.services import rollup  # noqa: E402
+from app.services.violation_archive import archive  # noqa: E402
+
+
+def verify(db):
+    # ช่วงที่ย้ายไป archive แล้วมีแต่ยอดรวมใน rollup: เทียบเฉพาะช่วงที่ยังอยู่ในฐานข้อมูล
+    since = archive.archived_until()
+    raw_query = select(
+        func.count(),
+        func.count().filter(database.DBParkingViolation.is_violation == True),
+        func.count().filter(database.DBParkingViolation.is_violation == True, database.DBParkingViolation.exit_time.is_(None)),
+    )
+    agg_query = select(
+        func.coalesce(func.sum(database.DBParkingHourlyRollup.session_count), 0),
+        func.coalesce(func.sum(database.DBParkingHourlyRollup.violation_count), 0),
+        func.coalesce(func.sum(database.DBParkingHourlyRollup.ongoing_count), 0),
+    )
+    if since is not None:
+        raw_query = raw_query.where(database.DBParkingViolation.timestamp >= since)
+        agg_query = agg_query.where(database.DBParkingHourlyRollup.hour >= since)
+    raw = db.execute(raw_query).one()
+    agg = db.execute(agg_query).one()
+    for name, r, a in zip(("sessions", "violations", "ongoing"), raw, agg):
+        print(f"{name:<11} raw={r:<12} rollup={a:<12} {'OK' if r == a else 'MISMATCH'}")
+    return tuple(raw) == tuple(agg)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the hourly parking rollup")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None, help="ISO datetime (inclusive)")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None, help="ISO datetime (exclusive)")
+    parser.add_argument("--verify", action="store_true", help="only compare totals")
+    args = parser.parse_args()
+
+    database.create_db_tables()
+    db = database.SessionLocal()
+    try:
+        if not args.verify:
+            started = time.perf_counter()
+            rows = rollup.rebuild_hourly_rollup(db, args.start, args.end)
+            print(f"Rebuilt {rows:,} rollup rows in {time.perf_counter() - started:.1f}s")
+        sys.exit(0 if verify(db) else 1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# backend/scripts/seed_parking_violations.py
+"""
+สร้างข้อมูล parking_violations ปริมาณมาก (ค่าเริ่มต้น 10M rows) ด้วย COPY เพื่อใช้วัดประสิทธิภาพ query
+ข้อมูลสุ่มแบบกำหนด seed ได้ จึงสร้างชุดเดิมซ้ำได้ทุกครั้ง
+
+    cd backend
+    python scripts/seed_parking_violations.py --rows 10000000 --days 365 --branches 500
+    python scripts/seed_parking_violations.py --rows 100000 --truncate
+"""
+import argparse
+import io
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app import database  # noqa: E402
+
+COLUMNS = (
+    "car_id", "timestamp", "branch", "branch_id", "camera_id", "event_type", "current_park",
+    "entry_time", "exit_time", "duration_minutes", "is_violation", "total_parking_sessions", "image_url",
+)
+
+
+def generate_rows(rng: random.Random, count: int, start: datetime, days: int, branches: int, ongoing_ratio: float):
+    span_s = days * 86400
+    for i in range(count):
+        branch_no = rng.randrange(branches)
+        entry = start + timedelta(seconds=rng.randrange(span_s))
+        duration = rng.expovariate(1 / 12.0)
+        is_violation = duration > 15.0
+        ongoing = is_violation and rng.random() < ongoing_ratio
+        exit_time = "" if ongoing else (entry + timedelta(minutes=duration)).isoformat()
+        timestamp = entry + timedelta(minutes=15) if is_violation else entry + timedelta(minutes=duration)
+        yield (
+            str(i % 5000), timestamp.isoformat(), f"สาขา {branch_no:05d}", f"{10000 + branch_no:05d}",
+            f"cam_{rng.randrange(4) + 1}", "parking_violation", str(rng.randrange(10)),
+            entry.isoformat(), exit_time, f"{duration:.2f}", "t" if is_violation else "f", str(i), "",
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed parking_violations for benchmarks")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--branches", type=int, default=500)
+    parser.add_argument("--ongoing-ratio", type=float, default=0.01)
+    parser.add_argument("--chunk", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--truncate", action="store_true", help="empty the table first")
+    args = parser.parse_args()
+
+    database.create_db_tables()
+    rng = random.Random(args.seed)
+    start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(days=args.days)
+    rows = generate_rows(rng, args.rows, start, args.days, args.branches, args.ongoing_ratio)
+
+    raw = database.engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        if args.truncate:
+            cur.execute("TRUNCATE parking_violations RESTART IDENTITY")
+        started = time.perf_counter()
+        written = 0
+        while written < args.rows:
+            buf = io.StringIO()
+            n = 0
+            for row in rows:
+                buf.write("\t".join(row))
+                buf.write("\n")
+                n += 1
+                if n >= args.chunk:
+                    break
+            if not n:
+                break
+            buf.seek(0)
+            cur.copy_expert(f"COPY parking_violations ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT text, NULL '')", buf)
+            raw.commit()
+            written += n
+            print(f"  {written:>12,} rows  ({written / (time.perf_counter() - started):,.0f} rows/s)")
+        cur.execute("ANALYZE parking_violations")
+        raw.commit()
+    finally:
+        raw.close()
+    print(f"Seeded {written:,} rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,8 @@
 import {
   ViolationSummaryResponse,
   PaginatedViolationEventsResponse,
-  PaginatedTopBranchResponse
+  PaginatedTopBranchResponse,
+  KpiStreamMessage
 } from '../types/parkingViolation';
 
 
@@ -100,4 +101,51 @@ export const fetchViolationEvents = async (page: number, limit: number, filters:
 
   // ใช้ handleResponse แทนการตรวจสอบ response.ok และ .json() ทันที
     return handleResponse(response);
-};
\ No newline at end of file
+};
+
+/**
+ * เชื่อมต่อ KPI สด (/api/ws/kpi): ได้ snapshot ก่อน แล้วตามด้วย delta ที่ backend push มาเมื่อมีข้อมูลใหม่
+ * ใช้แทนการ poll summary ซ้ำ ๆ (เชื่อมต่อใหม่เองเมื่อหลุด)
+ * @param branchId - prefix ของรหัสสาขาที่ต้องการติดตาม (ว่าง = ทุกสาขา)
+ * @returns ฟังก์ชันสำหรับปิดการเชื่อมต่อ
+ */
+export const connectKpiStream = (
+  branchId: string | undefined,
+  onMessage: (message: KpiStreamMessage) => void,
+  reconnectIntervalMs = 3000
+): (() => void) => {
+  const wsBase = API_BASE_URL.replace(/^http/, 'ws').replace(/\/$/, '');
+  const query = branchId ? `?branch_id=${encodeURIComponent(branchId)}` : '';
+  let ws: WebSocket | null = null;
+  let keepAlive: number | undefined;
+  let reconnectTimer: number | undefined;
+  let closed = false;
+
+  const connect = () => {
+    ws = new WebSocket(`${wsBase}/api/ws/kpi${query}`);
+    ws.onopen = () => {
+      keepAlive = window.setInterval(() => {
+        if (ws?.readyState === WebSocket.OPEN) ws.send('ping');
+      }, 20000);
+    };
+    ws.onmessage = (ev) => {
+      try {
+        onMessage(JSON.parse(ev.data as string));
+      } catch (e) {
+        console.warn('[KPI] Malformed message:', e);
+      }
+    };
+    ws.onclose = () => {
+      if (keepAlive) window.clearInterval(keepAlive);
+      if (!closed) reconnectTimer = window.setTimeout(connect, reconnectIntervalMs);
+    };
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    if (reconnectTimer) window.clearTimeout(reconnectTimer);
+    if (keepAlive) window.clearInterval(keepAlive);
+    ws?.close();
+  };
+};
@@ -137,8 +137,10 @@ const AILogConsole: React.FC = () => {
     };
 
     ws.onmessage = (ev) => {
+      // backend รวมหลายบรรทัดไว้ในข้อความเดียว (คั่นด้วย \n)
+      const lines = (ev.data as string).split("\n");
       setLogs((prev) => {
-        const next = [...prev, ev.data as string];
+        const next = [...prev, ...lines];
         if (next.length > 2000) next.splice(0, next.length - 2000);
         return next;
       });
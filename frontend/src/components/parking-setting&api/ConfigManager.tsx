@@ -1281,7 +1281,9 @@ performance_settings:
                       onChange={(value) => updateConfig('brightness_method', value)}
                       options={[
                         { value: 'clahe', label: 'CLAHE' },
-                        { value: 'histogram', label: 'Histogram' }
+                        { value: 'histogram', label: 'Histogram' },
+                        { value: 'gamma', label: 'Gamma (LUT)' },
+                        { value: 'auto', label: 'Auto (ตามความสว่าง/เวลา)' }
                       ]}
                     />
                   </div>
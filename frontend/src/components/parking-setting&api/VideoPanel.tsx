@@ -250,6 +250,8 @@ const VideoPanel: React.FC<VideoPanelProps> = ({
   const wsRef = useRef<WebSocket | null>(null);
   const [connected, setConnected] = useState(false);
   const reconnectTimer = useRef<number | null>(null);
+  // แผงวิดีโออยู่ในจอและแท็บเปิดอยู่หรือไม่ (แจ้ง backend: ซ่อนอยู่ = รับภาพย่อความถี่ต่ำแทนภาพสด)
+  const visibleRef = useRef(true);
   // --- 🔽 3. เพิ่ม State สำหรับจัดการโหมดเต็มจอ 🔽 ---
   const [isFullScreen, setIsFullScreen] = useState(false);
 
@@ -330,7 +332,12 @@ const VideoPanel: React.FC<VideoPanelProps> = ({
     wsRef.current = ws;
     ws.binaryType = "blob";
 
-    ws.onopen = () => { setConnected(true); };
+    ws.onopen = () => {
+      setConnected(true);
+      if (!visibleRef.current) {
+        ws.send(JSON.stringify({ type: "visibility", visible: false }));
+      }
+    };
     ws.onmessage = (event) => {
       if (event.data instanceof Blob) {
         const url = URL.createObjectURL(event.data);
@@ -354,6 +361,30 @@ const VideoPanel: React.FC<VideoPanelProps> = ({
     return () => { cleanupWs(); };
   }, [connect, cleanupWs]);
 
+  // แจ้ง backend เมื่อแผงวิดีโอเลื่อนออกนอกจอหรือแท็บถูกซ่อน (worker จะลดเหลือภาพย่อ)
+  useEffect(() => {
+    const container = containerRef.current;
+    let inViewport = true;
+    const report = () => {
+      const visible = inViewport && document.visibilityState === "visible";
+      if (visible === visibleRef.current) return;
+      visibleRef.current = visible;
+      if (wsRef.current?.readyState === WebSocket.OPEN) {
+        wsRef.current.send(JSON.stringify({ type: "visibility", visible }));
+      }
+    };
+    const observer = new IntersectionObserver((entries) => {
+      inViewport = entries.some((entry) => entry.isIntersecting);
+      report();
+    });
+    if (container) observer.observe(container);
+    document.addEventListener("visibilitychange", report);
+    return () => {
+      observer.disconnect();
+      document.removeEventListener("visibilitychange", report);
+    };
+  }, []);
+
   // --- 🔽 4. เพิ่มฟังก์ชันสำหรับสลับโหมดเต็มจอ 🔽 ---
   const handleToggleFullScreen = useCallback(() => {
     if (!document.fullscreenElement) {
@@ -1,6 +1,7 @@
 // frontend/src/pages/DashboardOverviewPage.tsx
 import React, { useState, useEffect, useCallback } from 'react';
 import { DashboardData, fetchDashboardData } from '../api/analytics';
+import { connectKpiStream } from '../api/parkingApiService';
 import OverallSystemPerformanceWidget from '../components/widgets/OverallSystemPerformanceWidget';
 import TopBranchesByAlertsWidget from '../components/widgets/TopBranchesByAlertsWidget';
 import ParkingViolationWidget from '../components/widgets/ParkingViolationWidget';
@@ -16,6 +17,7 @@ interface DashboardOverviewPageProps {
 const DashboardOverviewPage: React.FC<DashboardOverviewPageProps> = ({ timeSelection, branchQuery  }) => {
   const [dashboardData, setDashboardData] = useState<DashboardData | null>(null);
   const [loading, setLoading] = useState(true);
+  const [liveOngoing, setLiveOngoing] = useState<number | null>(null);
 
   const fetchData = useCallback(async () => {
     setLoading(true);
@@ -41,10 +43,18 @@ const DashboardOverviewPage: React.FC<DashboardOverviewPageProps> = ({ timeSelec
 
   useEffect(() => {
     fetchData();
-    const interval = setInterval(fetchData, 30000); // Poll every 30 seconds
-    return () => clearInterval(interval);
   }, [fetchData]);
 
+  useEffect(() => {
+    // รถที่กำลังจอดเกิน: backend push มาเมื่อมี event ใหม่ / รถออก แทนการ poll ทุก 30 วินาที
+    setLiveOngoing(null);
+    return connectKpiStream(branchQuery || undefined, (message) => {
+      if (message.type === 'snapshot' || message.type === 'ongoing') {
+        setLiveOngoing(message.ongoing_violations);
+      }
+    });
+  }, [branchQuery]);
+
   if (loading) {
     return (
       <div className="flex items-center justify-center h-full py-20">
@@ -76,7 +86,9 @@ const DashboardOverviewPage: React.FC<DashboardOverviewPageProps> = ({ timeSelec
 
       {/* Bottom Row Widgets */}
       <div className="grid grid-cols-1 lg:grid-cols-3 gap-2">
-        <ParkingViolationWidget data={dashboardData.parkingViolation} />
+        <ParkingViolationWidget
+          data={{ ...dashboardData.parkingViolation, currentOverdueCars: liveOngoing ?? dashboardData.parkingViolation.currentOverdueCars }}
+        />
         <TableOccupancyWidget data={dashboardData.tableOccupancy} />
         <ChilledBasketAlertWidget data={dashboardData.chilledBasketAlert} />
       </div>
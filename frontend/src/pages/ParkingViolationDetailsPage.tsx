@@ -3,7 +3,7 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { ParkingViolationEvent, ViolationSummaryResponse } from '../types/parkingViolation';
-import { fetchViolationSummary, fetchViolationEvents, ChartGroupByUnit, ViolationFilters } from '../api/parkingApiService';
+import { fetchViolationSummary, fetchViolationEvents, connectKpiStream, ChartGroupByUnit, ViolationFilters } from '../api/parkingApiService';
 import { TimeSelection } from '../types/time';
 import { getDateRangeFromSelection } from '../utils/dateUtils';
 
@@ -28,7 +28,18 @@ export const ParkingViolationDetailsPage: React.FC<ParkingViolationDetailsPagePr
   const [currentPage, setCurrentPage] = useState(1);
   const [totalPages, setTotalPages] = useState(0);
   const [activeTab, setActiveTab] = useState<'in-progress' | 'violations' | 'all'>('all'); // Default เป็น all
+  const [liveOngoing, setLiveOngoing] = useState<number | null>(null); // รถที่กำลังจอดเกิน (push จาก /api/ws/kpi)
   const navigate = useNavigate();
+
+  useEffect(() => {
+    // ยอดรถที่กำลังจอดเกินอัปเดตตาม ingest โดยไม่ต้อง poll summary
+    setLiveOngoing(null);
+    return connectKpiStream(branchQuery || undefined, (message) => {
+      if (message.type === 'snapshot' || message.type === 'ongoing') {
+        setLiveOngoing(message.ongoing_violations);
+      }
+    });
+  }, [branchQuery]);
   
 
   useEffect(() => {
@@ -104,7 +115,7 @@ export const ParkingViolationDetailsPage: React.FC<ParkingViolationDetailsPagePr
         setSummaryData(summary);
         // อัปเดต events และ totalPages
         setEventsData(paginatedEvents.events);
-        setTotalPages(paginatedEvents.total_pages);
+        setTotalPages(paginatedEvents.total_pages ?? 1);
         
       } catch (err: any) {
         console.error('Error fetching data:', err);
@@ -158,7 +169,7 @@ export const ParkingViolationDetailsPage: React.FC<ParkingViolationDetailsPagePr
       {summaryData ? (
         // ถ้ามี summaryData ให้แสดงผลข้อมูลทั้งหมด
         <>
-          <KpiCards data={summaryData.kpi} />
+          <KpiCards data={{ ...summaryData.kpi, ongoingViolations: liveOngoing ?? summaryData.kpi.ongoingViolations }} />
           
           <div className="grid grid-cols-1 lg:grid-cols-3 gap-6">
             <div className="lg:col-span-2 bg-white p-6 rounded-lg shadow">
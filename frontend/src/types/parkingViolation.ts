@@ -57,9 +57,37 @@ export interface PaginatedTopBranchResponse {
 }
 
 export interface PaginatedViolationEventsResponse {
-  total_items: number;
-  total_pages: number;
-  current_page: number;
+  // null in cursor mode unless include_total=true
+  total_items: number | null;
+  total_pages: number | null;
+  current_page: number | null;
   events: ParkingViolationEvent[];
+  next_cursor?: string | null;
+  prev_cursor?: string | null;
+}
+
+
+// --- KPI สดจาก /api/ws/kpi ---
+export interface KpiOngoingViolation {
+  id: number;
+  branch_id: string | null;
+  branch: string | null;
+  camera_id: string | null;
+  car_id: number | null;
+  timestamp: string | null;
+  entry_time: string | null;
+}
+
+export interface KpiCameraStatus {
+  branch_id: string | null;
+  current_parked: number | null;
+  total_parking_sessions: number | null;
+  online: boolean;
 }
 
+export type KpiStreamMessage =
+  | { type: 'snapshot'; branch_id: string | null; ongoing_violations: number; ongoing: KpiOngoingViolation[];
+      current_parked: number; cameras: Record<string, KpiCameraStatus>; server_time: number }
+  | { type: 'events'; events: Array<Record<string, any>>; count: number }
+  | { type: 'ongoing'; added: KpiOngoingViolation[]; removed: number[]; ongoing_violations: number }
+  | ({ type: 'parked'; camera_id: string; current_parked_total: number } & KpiCameraStatus);